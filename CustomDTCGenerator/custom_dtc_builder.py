@@ -4,26 +4,57 @@ import sys
 import time
 import datetime
 import re
-
-PDFEnabled = True
-
-# Try to import Reportlab
-try:
-    from reportlab.lib.pagesizes import letter
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet
-    from reportlab.lib import colors
-    from reportlab.lib.styles import ParagraphStyle
-    from reportlab.platypus import Paragraph
-except Exception as e:
-    PDFEnabled = False
-    print(f"Failed to import Report Lab due to: {e}")
+import argparse
+import getpass
+import bisect
+import copy
+import itertools
+import shutil
+import hashlib
+import importlib
+import importlib.util
+
+# Sibling modules (dtc_render_pdf, ...) import this file as custom_dtc_builder. When it is run as a
+# script it is __main__, so register it under its own name too, otherwise they would get a second copy.
+sys.modules.setdefault("custom_dtc_builder", sys.modules[__name__])
+
+# ReportLab is only imported when a PDF is actually rendered (see RENDERERS), here we just check it is installed
+PDFEnabled = importlib.util.find_spec("reportlab") is not None
+if not PDFEnabled:
+    print("Failed to import Report Lab due to: No module named 'reportlab'")
     print("Print to PDF will be disabled, if you wish to use print to PDF please run install.py")
 
+import dtc_storage
+import dtc_trace
+
 # JSON storage
 JSON_FILE = "custom_dtcs.json"
 
-authorOS = os.getlogin()
+# Storage mode (editable, or set DTC_STORAGE):
+#   "json"    - rewrite the whole catalog file on every change
+#   "journal" - append each change to custom_dtcs.json.journal, compacted into the catalog file later
+#   "sqlite"  - indexed SQLite database custom_dtcs.db, migrated from custom_dtcs.json on first use
+STORAGE_MODE = os.environ.get("DTC_STORAGE", "json")
+_stores = {}
+_catalogs = {}
+_search_indexes = {}  # SQLite mode, when the editor pages from the database instead of a DTCCatalog
+_bases = {}           # (mode, file) -> (version of the file when loaded/saved, its entries then)
+
+# What to do when a save finds a DTC that someone else changed too (JSON and journal storage):
+# "ask" (menu default), "mine", "theirs" or "fail" (command line default, nothing is saved)
+ON_CONFLICT = "ask"
+
+_author = None
+
+def author_name():
+    # Looked up on first use (PDF metadata). os.getlogin() fails without a controlling terminal (cron, CI, pipes)
+    global _author
+    if _author is None:
+        try:
+            _author = os.getlogin()
+        except OSError:
+            _author = getpass.getuser()
+    return _author
 
 # Repo Information
 repo_link = "https://github.com/IronwoodRestorations/IronwoodRestorationsPublic/tree/main/CustomDTCGenerator"
@@ -48,26 +79,456 @@ CATEGORIES = {
     "x47xx": "Miscellaneous Custom Functions"
 }
 
-def clear_screen():
-    os.system('cls' if os.name == 'nt' else 'clear')
+# Reverse lookups, description -> key
+HEADER_KEYS = {v: k for k, v in HEADERS.items()}
+CATEGORY_KEYS = {v: k for k, v in CATEGORIES.items()}
+
+# Output renderers: format -> (module, function, file extension). The module is imported the first
+# time that format is exported. Every renderer is called as
+#   function(dtcs, project_name, color_choice, output_path, **options) -> output_path
+# with dtcs in export order (any iterable). Add your own with register_renderer().
+RENDERERS = {
+    "pdf": ("dtc_render_pdf", "export_pdf", "pdf"),
+    "csv": ("dtc_renderers", "render_csv", "csv"),
+    "md": ("dtc_renderers", "render_markdown", "md"),
+    "jsonl": ("dtc_renderers", "render_jsonl", "jsonl"),
+    "html": ("dtc_render_html", "export_html", "html"),
+}
+# Formats that also write a folder of files next to the output (not kept in the render cache)
+SITE_FORMATS = {"html"}
 
-def load_dtcs():
-    #Load DTC data from JSON file.
-    print("Loading DTC(s) from custom_dtcs.json")
-    time.sleep(1)
+# Full-screen (curses) browser for picking DTCs, False keeps the numbered pages
+CURSES_BROWSER = True
+
+# Cold-start budget (ms) for importing this script, checked by the startup-time command
+STARTUP_BUDGET_MS = 50
+
+def clear_screen():
+    if os.name == 'nt':
+        os.system('cls')
+    else:
+        # Same as `clear` without starting a process for it
+        print("\033[H\033[2J\033[3J", end="", flush=True)
+
+def load_dtcs(quiet=False, lazy=False, track=False):
+    #Load DTC data from JSON file. quiet skips the status messages and pauses (headless use).
+    #lazy returns a page-at-a-time view in SQLite mode.
+    #track remembers what was loaded, so a later save can merge other people's changes (see save_dtcs).
+    if not quiet:
+        print(f"Loading DTC(s) from {JSON_FILE}")
+        dtc_trace.pause(1)
+    key = (STORAGE_MODE, JSON_FILE)
+    if STORAGE_MODE == "sqlite":
+        store = get_store()
+        if lazy:
+            return store.lazy_list()
+        with dtc_trace.stage("load", storage="sqlite"):
+            dtcs = store.load()
+            dtc_trace.note(entries=len(dtcs))
+        return dtcs
+    if STORAGE_MODE == "journal":
+        store = get_store()
+        with dtc_storage.FileLock(JSON_FILE), dtc_trace.stage("load", storage="journal"):
+            version = store.signature()
+            dtcs = store.load()
+            dtc_trace.note(entries=len(dtcs))
+        if track:
+            _bases[key] = (version, list(dtcs))
+        return dtcs
     if not os.path.exists(JSON_FILE):
-        print("Loaded DTC(s) sucessfully")
-        time.sleep(1)
+        if not quiet:
+            print("Loaded DTC(s) sucessfully")
+            dtc_trace.pause(1)
+        if track:
+            _bases[key] = (None, [])
         return []
-    with open(JSON_FILE, "r") as f:
-        return json.load(f)
+    with dtc_trace.stage("load.read"):
+        with open(JSON_FILE, "rb") as f:
+            raw = f.read()
+    with dtc_trace.stage("load.parse", bytes=len(raw)):
+        dtcs = json.loads(raw)
+        dtc_trace.note(entries=len(dtcs))
+    if track:
+        _bases[key] = (hashlib.sha1(raw).hexdigest(), list(dtcs))
+    return dtcs
+
+def save_dtcs(data, quiet=False):
+    #Save DTC data to JSON file. Written to a temp file and swapped in so a crash never leaves half a file.
+    #Holds the catalog lock while saving and merges in changes other processes saved since data was loaded.
+    if not quiet:
+        print(f"Saving DTC(s) to {JSON_FILE}")
+        dtc_trace.pause(1)
+    if STORAGE_MODE == "sqlite":
+        with dtc_trace.stage("save", storage="sqlite", entries=len(data)):
+            get_store().replace_all(data)
+        return
+    key = (STORAGE_MODE, JSON_FILE)
+    with dtc_storage.FileLock(JSON_FILE), dtc_trace.stage("save", storage=STORAGE_MODE, entries=len(data)):
+        merge_saved_changes(data)
+        if STORAGE_MODE == "journal":
+            get_store().compact(data)
+            version = get_store().signature()
+        else:
+            with dtc_trace.stage("save.encode"):
+                raw = json.dumps(data, indent=4).encode("utf-8")
+            with dtc_trace.stage("save.write", bytes=len(raw)):
+                dtc_storage.atomic_write_bytes(JSON_FILE, raw)
+            version = hashlib.sha1(raw).hexdigest()
+        if key in _bases:
+            _bases[key] = (version, list(data))
+
+def merge_saved_changes(data):
+    # If someone else saved the catalog since this process loaded it, merge their changes into data
+    # (in place) with a three-way merge per DTC code. Call with the catalog lock held.
+    key = (STORAGE_MODE, JSON_FILE)
+    if key not in _bases:
+        return  # not loaded for editing here, the save simply replaces the file
+    if STORAGE_MODE == "journal":
+        _skip_own_compaction(get_store(), key)
+    version, base = _bases[key]
+    if STORAGE_MODE == "journal":
+        if get_store().signature() == version:
+            return
+        theirs = get_store().load()
+    else:
+        raw = b""
+        if os.path.exists(JSON_FILE):
+            with open(JSON_FILE, "rb") as f:
+                raw = f.read()
+        if (hashlib.sha1(raw).hexdigest() if raw else None) == version:
+            return
+        theirs = json.loads(raw) if raw.strip() else []
+
+    conflicts = []
+    def resolve(code, mine, theirs):
+        if ON_CONFLICT == "fail":
+            conflicts.append(code)
+        elif ON_CONFLICT == "mine" or ON_CONFLICT == "ask" and ask_conflict(code, mine, theirs) == "M":
+            return mine
+        return theirs
+    merged = dtc_storage.merge_catalogs(base, data, theirs, resolve)
+    if conflicts:
+        raise dtc_storage.ConflictError(conflicts)
+    data[:] = merged
+    if key in _catalogs:
+        _catalogs[key] = DTCCatalog(data)
+    _search_indexes.pop(key, None)
+    print(f"Merged in changes saved to {JSON_FILE} by someone else.")
+
+def _conflict_summary(dtc):
+    if dtc is None:
+        return "(deleted)"
+    fixes = "; ".join(dtc.get("possible_fixes", []))
+    return (f"{dtc.get('title', '')} | {dtc.get('description', '')} | fixes: {fixes or '-'} | "
+            f"pinpoint: {dtc.get('pinpoint_test', '')}")
+
+def ask_conflict(code, mine, theirs):
+    # Both this session and someone else changed the same DTC. Returns "M" (keep mine) or "T".
+    print(f"\nDTC {code} was changed by someone else while you were editing it.")
+    print(f"  Yours:  {_conflict_summary(mine)}")
+    print(f"  Theirs: {_conflict_summary(theirs)}")
+    while True:
+        choice = input("Keep [M]ine or [T]heirs? ").strip().upper()
+        if choice in ("M", "T"):
+            return choice
+        print("Please enter M or T.")
+
+def sqlite_path():
+    return os.path.splitext(JSON_FILE)[0] + ".db"
+
+def get_store():
+    # Journal or SQLite store for the current catalog, opened once per session
+    key = (STORAGE_MODE, JSON_FILE)
+    if key not in _stores:
+        if STORAGE_MODE == "sqlite":
+            is_new = not os.path.exists(sqlite_path())
+            store = dtc_storage.SQLiteStore(sqlite_path(), dtc_sort_key)
+            if is_new and os.path.exists(JSON_FILE):
+                count = store.import_json(JSON_FILE)
+                print(f"Migrated {count} DTC(s) from {JSON_FILE} to {sqlite_path()}")
+        else:
+            store = dtc_storage.JournalStore(JSON_FILE)
+        _stores[key] = store
+    return _stores[key]
+
+def _skip_own_compaction(store, key):
+    # A background compaction this process ran rewrote the journal files but not the entries, so the
+    # loaded version still holds. Call with the catalog lock held.
+    if key in _bases:
+        version = store.compacted_since(_bases[key][0])
+        if version is not None:
+            _bases[key] = (version, _bases[key][1])
+
+def persist_change(dtcs, op, index, quiet=False):
+    # Persist one change already made to the in-memory list: op is "append", "set" or "delete".
+    # Journal and SQLite modes write just that entry instead of rewriting the catalog.
+    record = {"op": op, "index": index}
+    if op != "delete":
+        record["dtc"] = dtcs[index]
+    persist_changes(dtcs, [record], quiet)
+
+def persist_changes(dtcs, records, quiet=False, compact=True):
+    # Persist a batch of change records (see dtc_storage) already made to the in-memory list, all in
+    # one write. Returns True if the catalog was merged with someone else's changes and saved whole
+    # instead, which can move entries around in dtcs. compact=False keeps a journal from compacting.
+    if STORAGE_MODE == "json":
+        save_dtcs(dtcs, quiet)
+        return False
+    if STORAGE_MODE == "sqlite":
+        get_store().apply_many(records)
+        return False
+    key = (STORAGE_MODE, JSON_FILE)
+    store = get_store()
+    with dtc_storage.FileLock(JSON_FILE):
+        _skip_own_compaction(store, key)
+        if key in _bases and store.signature() != _bases[key][0]:
+            # Someone else wrote to the catalog since it was loaded, so the index may point at a
+            # different DTC in their version. Merge and write a new snapshot instead.
+            save_dtcs(dtcs, quiet=True)
+            return True
+        store.append_many(records, compact)
+        if key in _bases:
+            _bases[key] = (store.signature(), list(dtcs))
+    return False
+
+class DTCCatalog:
+    # In-memory catalog for one session. Keeps the entries in storage order (what persist_change
+    # indexes into), a code -> position index and the PDF export order, all updated in place.
+    def __init__(self, dtcs):
+        self.dtcs = dtcs
+        self._seqs = []       # stable id for each position, so the sort order survives edits
+        self._by_seq = {}
+        self._order = []      # sorted [(dtc_sort_key, seq)]
+        self._next_seq = 0
+        self._search = None   # full-text index, built on first search
+        self._codes = None    # code-space allocator, built on first use
+        for dtc in dtcs:
+            seq = self._track(dtc)
+            self._seqs.append(seq)
+            self._order.append((dtc_sort_key(dtc), seq))
+        self._order.sort()
+        self._index_codes()
+
+    def _track(self, dtc):
+        seq = self._next_seq
+        self._next_seq += 1
+        self._by_seq[seq] = dtc
+        return seq
+
+    def _index_codes(self):
+        # First entry wins if an older file has duplicate codes
+        self._positions = {}
+        for i, dtc in enumerate(self.dtcs):
+            self._positions.setdefault(dtc.get("code"), i)
+
+    def __len__(self):
+        return len(self.dtcs)
+
+    def has(self, code):
+        return code in self._positions
+
+    def index_of(self, code):
+        return self._positions.get(code)
+
+    def get(self, code):
+        index = self._positions.get(code)
+        return None if index is None else self.dtcs[index]
+
+    def add(self, dtc):
+        # Returns the new entry's position, rejects a code that is already used
+        if dtc["code"] in self._positions:
+            raise ValueError(f"DTC {dtc['code']} already exists")
+        seq = self._track(dtc)
+        self.dtcs.append(dtc)
+        self._seqs.append(seq)
+        self._positions[dtc["code"]] = len(self.dtcs) - 1
+        bisect.insort(self._order, (dtc_sort_key(dtc), seq))
+        if self._search is not None:
+            self._search.add(seq, dtc)
+        if self._codes is not None:
+            self._codes.mark(dtc["code"])
+        return len(self.dtcs) - 1
+
+    def replace(self, index, dtc):
+        # Swap in an edited entry at position index
+        old = self.dtcs[index]
+        if dtc["code"] != old["code"] and dtc["code"] in self._positions:
+            raise ValueError(f"DTC {dtc['code']} already exists")
+        seq = self._seqs[index]
+        self._order.pop(bisect.bisect_left(self._order, (dtc_sort_key(old), seq)))
+        bisect.insort(self._order, (dtc_sort_key(dtc), seq))
+        self._by_seq[seq] = dtc
+        self.dtcs[index] = dtc
+        if dtc["code"] != old["code"]:
+            if self._positions.get(old["code"]) == index:
+                # A later entry with the same code (older files can have duplicates) takes over
+                del self._positions[old["code"]]
+                later = next((i for i in range(index + 1, len(self.dtcs))
+                              if self.dtcs[i].get("code") == old["code"]), None)
+                if later is not None:
+                    self._positions[old["code"]] = later
+            self._positions[dtc["code"]] = index
+        if self._search is not None:
+            self._search.update(seq, dtc)
+        if self._codes is not None:
+            self._codes.release(old["code"])
+            self._codes.mark(dtc["code"])
+
+    def remove(self, index):
+        dtc = self.dtcs.pop(index)
+        seq = self._seqs.pop(index)
+        self._order.pop(bisect.bisect_left(self._order, (dtc_sort_key(dtc), seq)))
+        del self._by_seq[seq]
+        self._index_codes()
+        if self._search is not None:
+            self._search.remove(seq)
+        if self._codes is not None:
+            self._codes.release(dtc["code"])
+        return dtc
+
+    def sorted_dtcs(self):
+        # PDF export order, no re-sort needed
+        return [self._by_seq[seq] for _, seq in self._order]
+
+    def allocator(self):
+        # Built once, then kept up to date by add/replace/remove
+        if self._codes is None:
+            import dtc_codes
+            self._codes = dtc_codes.CodeAllocator(dtc.get("code") for dtc in self.dtcs)
+        return self._codes
+
+    def search_index(self):
+        # Built once, then kept up to date by add/replace/remove
+        if self._search is None:
+            import dtc_search
+            self._search = dtc_search.SearchIndex()
+            self._search.build(zip(self._seqs, self.dtcs))
+        return self._search
+
+    def search(self, query, limit=25):
+        # Positions of the best matches for a full-text query
+        results = self.search_index().search(query, limit)
+        return [self._positions[self._by_seq[seq]["code"]] for seq, _ in results]
+
+def get_catalog(quiet=False):
+    # The session catalog, loaded on first use
+    key = (STORAGE_MODE, JSON_FILE)
+    if key not in _catalogs:
+        dtcs = load_dtcs(quiet, track=True)
+        # Indexing sorts the catalog into export order
+        with dtc_trace.stage("index", entries=len(dtcs)):
+            _catalogs[key] = DTCCatalog(dtcs)
+    return _catalogs[key]
+
+def forget_catalogs():
+    # Drop every session catalog (with its search index and merge base), the next use loads from storage
+    _catalogs.clear()
+    _search_indexes.clear()
+    _bases.clear()
+
+def reload_catalog(quiet=False):
+    _catalogs.pop((STORAGE_MODE, JSON_FILE), None)
+    _search_indexes.pop((STORAGE_MODE, JSON_FILE), None)
+    return get_catalog(quiet)
+
+def search_dtcs(query, limit=25):
+    # Positions (storage order, same as load_dtcs) of the best matches for a search query.
+    # SQLite mode without a loaded catalog indexes the rows as they stream from the database.
+    key = (STORAGE_MODE, JSON_FILE)
+    if STORAGE_MODE == "sqlite" and key not in _catalogs:
+        if key not in _search_indexes:
+            import dtc_search
+            index = dtc_search.SearchIndex()
+            index.build(enumerate(get_store().iter_all()))
+            _search_indexes[key] = index
+        return [position for position, _ in _search_indexes[key].search(query, limit)]
+    return get_catalog(quiet=True).search(query, limit)
+
+def next_free_code(header_key, cat_key):
+    # Lowest unused code in a header/category block, None if all 100 are used
+    return get_catalog(quiet=True).allocator().next_free(header_key, cat_key)
+
+def code_in_use(code):
+    # SQLite mode answers from the code index without loading the catalog
+    if STORAGE_MODE == "sqlite" and (STORAGE_MODE, JSON_FILE) not in _catalogs:
+        return bool(get_store().query(code=code))
+    return get_catalog(quiet=True).has(code)
+
+def export_order_dtcs(quiet=False):
+    # DTCs in PDF export order
+    if STORAGE_MODE == "sqlite" and (STORAGE_MODE, JSON_FILE) not in _catalogs:
+        if not quiet:
+            print(f"Loading DTC(s) from {JSON_FILE}")
+            dtc_trace.pause(1)
+        with dtc_trace.stage("load.sorted", storage="sqlite"):
+            dtcs = get_store().load_sorted()
+            dtc_trace.note(entries=len(dtcs))
+        return dtcs
+    return get_catalog(quiet).sorted_dtcs()
+
+def iter_export_dtcs():
+    # Export order as a generator, SQLite mode streams rows from the database
+    if STORAGE_MODE == "sqlite" and (STORAGE_MODE, JSON_FILE) not in _catalogs:
+        return get_store().iter_sorted()
+    return iter(get_catalog(quiet=True).sorted_dtcs())
+
+def add_dtc(new_dtc, quiet=False):
+    # Add to the session catalog and persist, raises ValueError for a duplicate code
+    catalog = get_catalog(quiet)
+    index = catalog.add(new_dtc)
+    try:
+        persist_change(catalog.dtcs, "append", index, quiet)
+    except BaseException:
+        # Not saved (lock timeout, merge conflict), so out of the session too: later changes are
+        # saved by position and must match the file
+        catalog.remove(index)
+        raise
+
+def replace_dtc(dtcs, index, dtc, quiet=False):
+    # Store an edited copy of dtcs[index], raises ValueError if its new code is already used
+    catalog = _catalogs.get((STORAGE_MODE, JSON_FILE))
+    old = dtcs[index]
+    if catalog is not None:
+        catalog.replace(index, dtc)
+    elif dtc["code"] != old["code"] and code_in_use(dtc["code"]):
+        raise ValueError(f"DTC {dtc['code']} already exists")
+    if (STORAGE_MODE, JSON_FILE) in _search_indexes:
+        _search_indexes[(STORAGE_MODE, JSON_FILE)].update(index, dtc)
+    dtcs[index] = dtc
+    try:
+        persist_change(dtcs, "set", index, quiet)
+    except BaseException:
+        # Not saved, put the entry back as it was (see add_dtc)
+        if catalog is not None:
+            catalog.replace(index, old)
+        if (STORAGE_MODE, JSON_FILE) in _search_indexes:
+            _search_indexes[(STORAGE_MODE, JSON_FILE)].update(index, old)
+        dtcs[index] = old
+        raise
+
+def compact_storage(dtcs=None):
+    # Fold the journal into the catalog file (journal mode only). dtcs, the catalog as this process
+    # has it, is written as it is if nobody else changed the catalog since, instead of reading it back.
+    if STORAGE_MODE != "journal":
+        return
+    key = (STORAGE_MODE, JSON_FILE)
+    store = get_store()
+    with dtc_storage.FileLock(JSON_FILE):
+        _skip_own_compaction(store, key)
+        if dtcs is not None and key in _bases and store.signature() == _bases[key][0]:
+            store.compact(dtcs)
+            _bases[key] = (store.signature(), list(dtcs))
+        else:
+            store.compact()
 
-def save_dtcs(data):
-    #Save DTC data to JSON file.
-    print("Saving DTC(s) to custom_dtcs.json")
-    time.sleep(1)
-    with open(JSON_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+def close_storage():
+    # Finish background compaction / close databases before exiting
+    for store in _stores.values():
+        if isinstance(store, dtc_storage.JournalStore):
+            store.wait()
+        else:
+            store.close()
+    _stores.clear()
 
 def create_dtc():
     # Interactive DTC creation
@@ -110,9 +571,21 @@ def create_dtc():
             print("Please enter a valid number.")
 
     # --- Step 3: Build the code ---
-    # Header + 4 (custom) + prefix digits
-    code_number = input(f"Enter 2-digit code for {prefix} (e.g., 01 for {prefix[:3]}01): ").zfill(2)
-    full_code = f"{header}4{prefix[:2]}{code_number}"  # Example: U4A01
+    # Header + 4 (custom) + category digit + number, Enter takes the next free number
+    next_code = next_free_code(header, prefix)
+    hint = f", Enter for {next_code}" if next_code else ", this category is full"
+    while True:
+        code_number = input(f"Enter 2-digit code for {prefix} (e.g., 01 for {prefix[:3]}01{hint}): ").strip()
+        if not code_number and next_code:
+            full_code = next_code
+            break
+        if not code_number.isdigit() or len(code_number) > 2:
+            print("Please enter a number from 00 to 99.")
+            continue
+        full_code = make_code(header, prefix, code_number)  # Example: U4101
+        if not code_in_use(full_code):
+            break
+        print(f"DTC {full_code} already exists. Try another code.")
 
     # --- Step 4: Collect details ---
     clear_screen()
@@ -142,22 +615,57 @@ def create_dtc():
         "pinpoint_test": pinpoint
     }
 
-    dtcs = load_dtcs()
-    dtcs.append(new_dtc)
-    save_dtcs(dtcs)
+    try:
+        add_dtc(new_dtc)
+    except (ValueError, TimeoutError) as e:
+        print(f"\n{e}\n")
+        input("Press Enter to return to the menu...")
+        return
 
     print(f"\n✅ DTC {full_code} saved successfully!\n")
     input("Press Enter to return to the menu...")
 
-def select_dtc_paginated(dtcs, page_size=25):
+def search_prompt(dtcs, text, page_size=25):
+    # Jump straight to a typed code, otherwise list the best search matches to pick from.
+    # Returns a position in dtcs, or None to go back to the page list.
+    results = search_dtcs(text, page_size)
+    if results and dtcs[results[0]].get("code", "").upper() == text.strip().upper():
+        return results[0]
+    clear_screen()
+    print(f"=== Search: {text} ({len(results)} match{'es' if len(results) != 1 else ''}) ===\n")
+    if not results:
+        print("No DTCs match. Try fewer or shorter words.")
+        input("\nPress Enter to continue...")
+        return None
+    for i, position in enumerate(results, start=1):
+        print(f"{i}. {dtcs[position].get('code')} - {dtcs[position].get('title', 'Untitled')}")
+    while True:
+        choice = input("\nSelect DTC by number (blank to go back): ").strip()
+        if not choice:
+            return None
+        if choice.isdigit() and 1 <= int(choice) <= len(results):
+            return results[int(choice) - 1]
+        print("Invalid selection. Try again.")
+
+def select_dtc(dtcs, title="Select DTC", page_size=25):
+    # Position in dtcs of the DTC the user picks, None if cancelled. The full-screen browser
+    # (dtc_browse.py) where the terminal supports it, numbered pages otherwise.
+    if CURSES_BROWSER:
+        import dtc_browse
+        if dtc_browse.available():
+            return dtc_browse.browse(dtcs, title)
+    return select_dtc_paginated(dtcs, page_size, title)
+
+def select_dtc_paginated(dtcs, page_size=25, title="Select DTC"):
     page = 0
     total_pages = (len(dtcs) - 1) // page_size + 1
+    message = ""
 
     while True:
         clear_screen()
         start = page * page_size
         end = min(start + page_size, len(dtcs))
-        print(f"=== Edit Existing DTC (Page {page + 1}/{total_pages}) ===\n")
+        print(f"=== {title} (Page {page + 1}/{total_pages}) ===\n")
 
         for i, dtc in enumerate(dtcs[start:end], start=1):
             print(f"{i}. {dtc.get('code')} - {dtc.get('title', 'Untitled')}")
@@ -169,79 +677,46 @@ def select_dtc_paginated(dtcs, page_size=25):
             nav_options.append("N = Next page")
         nav_options.append("C = Cancel")
         print("\n" + "   ".join(nav_options))
+        if message:
+            print(f"\n{message}")
+            message = ""
 
-        choice = input("\nSelect DTC by number: ").strip().upper()
+        text = input("\nSelect DTC by number, or type a code or words to search: ").strip()
+        choice = text.upper()
         if choice == "C":
             return None
         elif choice == "N" and page < total_pages - 1:
             page += 1
         elif choice == "P" and page > 0:
             page -= 1
+        elif text and not choice.isdigit() and choice not in ("N", "P"):
+            position = search_prompt(dtcs, text, page_size)
+            if position is not None:
+                return position
+        elif choice.isdigit() and 1 <= int(choice) <= (end - start):
+            return start + int(choice) - 1
         else:
-            try:
-                choice_num = int(choice)
-                if 1 <= choice_num <= (end - start):
-                    return dtcs[start + choice_num - 1]
-                else:
-                    print("Invalid selection. Try again.")
-                    input("Press Enter to continue...")
-            except ValueError:
-                print("Invalid input. Try again.")
-                input("Press Enter to continue...")
+            # Shown above the next prompt instead of waiting for Enter
+            message = "Invalid selection. Try again."
 
 
 def edit_dtc(page_size=25):
-    dtcs = load_dtcs()
+    if STORAGE_MODE == "sqlite":
+        dtcs = load_dtcs(lazy=True)  # pages straight from the database
+    else:
+        dtcs = get_catalog().dtcs
     if not dtcs:
         clear_screen()
         print("No DTCs found. Load or create some first.\n")
         input("Press Enter to return...")
         return
 
-    # --- Paginated DTC Selection ---
-    page = 0
-    total_pages = (len(dtcs) - 1) // page_size + 1
-
-    while True:
-        clear_screen()
-        start = page * page_size
-        end = min(start + page_size, len(dtcs))
-        print(f"=== Edit Existing DTC (Page {page + 1}/{total_pages}) ===\n")
-
-        for i, dtc in enumerate(dtcs[start:end], start=1):
-            print(f"{i}. {dtc.get('code')} - {dtc.get('title', 'Untitled')}")
-
-        # Navigation options
-        nav_options = []
-        if page > 0:
-            nav_options.append("P = Previous page")
-        if page < total_pages - 1:
-            nav_options.append("N = Next page")
-        nav_options.append("C = Cancel")
-        print("\n" + "   ".join(nav_options))
-
-        choice = input("\nSelect DTC by number: ").strip().upper()
-        if choice == "C":
-            print("Edit cancelled.\n")
-            return
-        elif choice == "N" and page < total_pages - 1:
-            page += 1
-            continue
-        elif choice == "P" and page > 0:
-            page -= 1
-            continue
-        else:
-            try:
-                choice_num = int(choice)
-                if 1 <= choice_num <= (end - start):
-                    dtc = dtcs[start + choice_num - 1]
-                    break  # Selected DTC found, exit loop
-                else:
-                    print("Invalid selection. Try again.")
-                    input("Press Enter to continue...")
-            except ValueError:
-                print("Invalid input. Try again.")
-                input("Press Enter to continue...")
+    # --- DTC Selection ---
+    index = select_dtc(dtcs, "Edit Existing DTC", page_size)
+    if index is None:
+        print("Edit cancelled.\n")
+        return
+    dtc = copy.deepcopy(dtcs[index])  # edit a copy, cancelling leaves the catalog untouched
 
     # --- Start editing selected DTC ---
     clear_screen()
@@ -259,7 +734,7 @@ def edit_dtc(page_size=25):
         dtc['header'] = list(HEADERS.values())[int(header_input) - 1]
         header_key = list(HEADERS.keys())[int(header_input) - 1]
     else:
-        header_key = next((k for k, v in HEADERS.items() if v == dtc.get('header')), "U")
+        header_key = HEADER_KEYS.get(dtc.get('header'), "U")
 
     # --- Edit category ---
     print("\nSelect new category (leave blank to keep current, 'C' to cancel):")
@@ -273,15 +748,19 @@ def edit_dtc(page_size=25):
         cat_key = list(CATEGORIES.keys())[int(category_input) - 1]
         dtc['category'] = CATEGORIES[cat_key]
     else:
-        cat_key = next((k for k, v in CATEGORIES.items() if v == dtc.get('category')), "x40xx")
+        cat_key = CATEGORY_KEYS.get(dtc.get('category'), "x40xx")
 
     # --- Edit code ---
-    code_number = input(f"\nEnter 2-digit code for this DTC (Current: {dtc.get('code', '')[-2:]}, 'C' to cancel) > ").strip()
-    if code_number.upper() == "C":
-        print("Edit cancelled.\n")
-        return
+    while True:
+        code_number = input(f"\nEnter 2-digit code for this DTC (Current: {dtc.get('code', '')[-2:]}, 'C' to cancel) > ").strip()
+        if code_number.upper() == "C":
+            print("Edit cancelled.\n")
+            return
+        if not code_number or (code_number.isdigit() and len(code_number) <= 2):
+            break
+        print("Please enter a number from 00 to 99.")
     code_number = code_number.zfill(2) if code_number else dtc.get('code', '')[-2:]
-    full_code = f"{header_key}4{cat_key[2]}{code_number}"
+    full_code = make_code(header_key, cat_key, code_number)
     dtc['code'] = full_code
 
     # --- Edit other fields ---
@@ -346,10 +825,32 @@ def edit_dtc(page_size=25):
                 print("Invalid input.")
 
     # --- Save changes ---
-    save_dtcs(dtcs)
+    try:
+        replace_dtc(dtcs, index, dtc)
+    except (ValueError, TimeoutError) as e:
+        print(f"\n{e}, changes not saved.\n")
+        input("Press Enter to return...")
+        return
     print(f"\nDTC {full_code} updated successfully!\n")
     input("Press Enter to return...")
 
+def dtc_sort_key(d):
+    # Header then numeric code, entries without a usable code go last (validate reports them)
+    header_order = ["B", "C", "P", "U"]
+    code = d.get("code") if isinstance(d, dict) else None
+    if not isinstance(code, str) or not code:
+        return (99, 99999)
+    return (
+        header_order.index(code[0]) if code[0] in header_order else 99,
+        int(code[1:]) if code[1:].isdigit() else 99999
+    )
+
+def sort_dtcs(dtcs):
+    # --- Sort DTCs by header then numeric code ---
+    with dtc_trace.stage("sort", entries=len(dtcs)):
+        dtcs.sort(key=dtc_sort_key)
+    return dtcs
+
 def print_to_pdf():
     clear_screen()
     
@@ -357,23 +858,26 @@ def print_to_pdf():
         print("Error 0x001A: PDF functionality is not enabled.")
         quit()
 
-    dtcs = load_dtcs()
+    dtcs = export_order_dtcs()
     if not dtcs:
         print("No DTCs found. Please create or load DTCs first.")
         input("Press Enter to return...")
         return
 
+    # --- Check the catalog first ---
+    # In storage order like the validate command, so "entry N" is the Nth entry in the file
+    import dtc_validate
+    if STORAGE_MODE == "sqlite" and (STORAGE_MODE, JSON_FILE) not in _catalogs:
+        report = dtc_validate.validate(get_store().iter_all())
+    else:
+        report = dtc_validate.validate(get_catalog(quiet=True).dtcs)
+    if report["errors"]:
+        dtc_validate.print_report(report, limit=20)
+        if input("\nThese entries will look wrong or stop the PDF. Export anyway? (y/n): ").strip().lower() != "y":
+            return
+
     # --- Project/Application Name ---
     project_name = input("Enter Project/Application Name: ").strip() or "Unnamed Project"
-    project_name_file = re.sub(r'[^a-zA-Z0-9_-]', '_', project_name)
-    project_name_display = project_name  # readable
-
-    # --- Sort DTCs by header then numeric code ---
-    header_order = ["B", "C", "P", "U"]
-    dtcs.sort(key=lambda d: (
-        header_order.index(d["code"][0]) if d["code"][0] in header_order else 99,
-        int(d["code"][1:]) if d["code"][1:].isdigit() else 99999
-    ))
 
     # --- Ask user for color mode ---
     print("\nSelect PDF color mode:")
@@ -382,139 +886,259 @@ def print_to_pdf():
     print("3. Color version (green highlights)")
     color_choice = input("Choice [1]: ").strip() or "1"
 
-    pdf_file = f"custom_dtcs_{project_name_file}.pdf"
-
-    # --- Links ---
-    repo_full = repo_link
-    youtube_full = youtube_link
-    youtube_display = youtube_full.replace("https://www.", "").replace("https://", "").replace("youtube.com/", "")
-
-    # --- Footer ---
-    def footer(canvas, doc):
-        canvas.saveState()
-        text_color = colors.green if color_choice=="3" else colors.black
-        style = ParagraphStyle("footer_style", fontSize=8, textColor=text_color)
-        footer_text = (
-            f"<b>{project_name_display}</b> | "
-            f"Created with Custom DTC Builder from Ironwood Restorations<br/>"
-            f"Page {canvas.getPageNumber()} | "
-            f"<a href='{repo_full}'>Github: @IronwoodRestorations</a> | "
-            f"<a href='{youtube_full}'>Youtube/TikTok: {youtube_display}</a>"
-        )
-        p = Paragraph(footer_text, style)
-        w, h = p.wrap(doc.width, doc.bottomMargin)
-        p.drawOn(canvas, doc.leftMargin, 20)
-        canvas.restoreState()
-
-    # --- Document Setup ---
-    creation_date = datetime.datetime.now()
-    doc = SimpleDocTemplate(
-        pdf_file,
-        pagesize=letter,
-        leftMargin=36,
-        rightMargin=36,
-        topMargin=36,
-        bottomMargin=36,
-        title=f"Custom DTC's: {project_name_display}",
-        author=authorOS,
-        creator="Custom DTC Builder Script",
-        creationDate=creation_date,
-        modDate=creation_date,
-        subject=f"Custom DTC list for {project_name_display}",
-        keywords=f"DTC, Custom, IronwoodRestorations, Repo: {repo_full}, YouTube: {youtube_full}"
-    )
-
-    styles = getSampleStyleSheet()
-    elements = []
-
-    # --- Main Title ---
-    elements.append(Paragraph(f"<b>Custom DTC's: {project_name_display}</b>", styles["Title"]))
-    elements.append(Spacer(1, 12))
-
-    # --- DTC Headers | Trouble Code Categories in two columns ---
-    headers_para = "<br/>".join([f"{k} – {v}" for k,v in HEADERS.items()])
-    categories_para = "<br/>".join([f"{k} – {v}" for k,v in CATEGORIES.items()])
-
-    table_data = [
-        [
-            Paragraph("<b>Custom DTC Headers</b><br/>" + headers_para, styles["Normal"]),
-            Paragraph("<b>Trouble Code Categories</b><br/>" + categories_para, styles["Normal"])
-        ]
-    ]
-    table = Table(table_data, colWidths=[doc.width/2.0]*2)
-    table.setStyle(TableStyle([
-        ('VALIGN', (0,0), (-1,-1), 'TOP'),
-        ('FONTSIZE', (0,0), (-1,-1), 9),
-        ('BOTTOMPADDING', (0,0), (-1,-1), 6),
-        ('TOPPADDING', (0,0), (-1,-1), 6)
-    ]))
-    elements.append(table)
-    elements.append(Spacer(1, 18))
-
-    # --- Combined DTC Table ---
-    elements.append(Paragraph("<b>Custom DTC's</b>", styles["Heading2"]))
-    table_data = [["Code", "Category", "Title", "Description", "Possible Fixes", "Pinpoint Test"]]
-    for dtc in dtcs:
-        fixes_str = "<br/>• " + "<br/>• ".join(dtc["possible_fixes"]) if dtc["possible_fixes"] else "-"
-        table_data.append([
-            Paragraph(dtc["code"], styles["Normal"]),
-            Paragraph(dtc["category"], styles["Normal"]),
-            Paragraph(dtc["title"], styles["Normal"]),
-            Paragraph(dtc["description"], styles["Normal"]),
-            Paragraph(fixes_str, styles["Normal"]),
-            Paragraph(dtc["pinpoint_test"], styles["Normal"]),
-        ])
-
-    col_widths = [55, 95, 95, 130, 130, 65]
-    table = Table(table_data, colWidths=col_widths, repeatRows=1)
-
-    # --- Table Styling ---
-    if color_choice=="1":  # B&W
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
-            ('TEXTCOLOR', (0,0), (-1,0), colors.black),
-            ('GRID', (0,0), (-1,-1), 0.5, colors.grey),
-            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-            ('ALIGN', (0,0), (-1,-1), 'LEFT'),
-            ('VALIGN', (0,0), (-1,-1), 'TOP'),
-            ('FONTSIZE', (0,0), (-1,-1), 8),
-            ('LEFTPADDING', (0,0), (-1,-1), 4),
-            ('RIGHTPADDING', (0,0), (-1,-1), 4),
-            ('BOTTOMPADDING', (0,0), (-1,-1), 3),
-            ('TOPPADDING', (0,0), (-1,-1), 3),
-        ]))
-    elif color_choice=="2":  # Borders only
-        table.setStyle(TableStyle([
-            ('GRID', (0,0), (-1,-1), 0.5, colors.black),
-            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-            ('ALIGN', (0,0), (-1,-1), 'LEFT'),
-            ('VALIGN', (0,0), (-1,-1), 'TOP'),
-            ('FONTSIZE', (0,0), (-1,-1), 8),
-        ]))
-    elif color_choice=="3":  # Green highlights
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0,0), (-1,0), colors.green),
-            ('TEXTCOLOR', (0,0), (-1,0), colors.white),
-            ('GRID', (0,0), (-1,-1), 0.5, colors.darkgreen),
-            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-            ('ALIGN', (0,0), (-1,-1), 'LEFT'),
-            ('VALIGN', (0,0), (-1,-1), 'TOP'),
-            ('FONTSIZE', (0,0), (-1,-1), 8),
-            ('LEFTPADDING', (0,0), (-1,-1), 4),
-            ('RIGHTPADDING', (0,0), (-1,-1), 4),
-            ('BOTTOMPADDING', (0,0), (-1,-1), 3),
-            ('TOPPADDING', (0,0), (-1,-1), 3),
-        ]))
-
-    elements.append(table)
-
-    # --- Build PDF ---
-    doc.build(elements, onFirstPage=footer, onLaterPages=footer)
+    # Very large catalogs are rendered as a stream of table chunks
+    pdf_file = render("pdf", dtcs, project_name, color_choice, stream=len(dtcs) > STREAM_EXPORT_ROWS)
 
     print(f"\nPDF generated successfully: {pdf_file}\n")
     print("Exiting after PDF generation.\n")
     sys.exit(0)
 
+def export_to_html():
+    clear_screen()
+    dtcs = export_order_dtcs()
+    if not dtcs:
+        print("No DTCs found. Please create or load DTCs first.")
+        input("Press Enter to return...")
+        return
+
+    project_name = input("Enter Project/Application Name: ").strip() or "Unnamed Project"
+    print("\nSelect color mode:")
+    print("1. Black & White (default)")
+    print("2. Colorless (only borders)")
+    print("3. Color version (green highlights)")
+    color_choice = input("Choice [1]: ").strip() or "1"
+
+    output = render("html", dtcs, project_name, color_choice)
+    print(f"\nHTML generated successfully: {output} (pages in {os.path.splitext(output)[0]}_files)")
+    print("Open it in any browser, it works offline.\n")
+    input("Press Enter to return...")
+
+def register_renderer(name, module, function, extension):
+    RENDERERS[name] = (module, function, extension)
+
+def get_renderer(fmt):
+    # Import the renderer's module on first use
+    if fmt not in RENDERERS:
+        raise ValueError(f"Unknown output format '{fmt}', expected one of: {', '.join(RENDERERS)}")
+    if fmt == "pdf" and not PDFEnabled:
+        raise RuntimeError("PDF functionality is not enabled (Error 0x001A), please run install.py")
+    module, function, _ = RENDERERS[fmt]
+    return getattr(importlib.import_module(module), function)
+
+def default_output(project_name, fmt):
+    project_name_file = re.sub(r'[^a-zA-Z0-9_-]', '_', project_name)
+    return f"custom_dtcs_{project_name_file}.{RENDERERS[fmt][2]}"
+
+def render(fmt, dtcs, project_name, color_choice="1", output=None, **options):
+    # Export dtcs (in export order) with the renderer for fmt, returns the written path
+    if output is None:
+        output = default_output(project_name, fmt)
+    renderer = get_renderer(fmt)
+    with dtc_trace.stage(f"render.{fmt}"):
+        return renderer(dtcs, project_name, color_choice, output, **options)
+
+# Streaming export: rows per table chunk, and the catalog size where print_to_pdf switches to streaming
+EXPORT_CHUNK_ROWS = 250
+STREAM_EXPORT_ROWS = 5000
+
+# Render cache: exports whose inputs haven't changed are copied from here instead of re-rendered.
+# Bump RENDER_CACHE_VERSION whenever a renderer's layout changes so old entries are not reused.
+RENDER_CACHE_DIR = ".dtc_render_cache"
+RENDER_CACHE_VERSION = 1
+RENDER_CACHE_MAX_ENTRIES = 50
+
+def render_cache_key(fmt, dtcs, project_name, color_choice, **options):
+    # Hash of everything that affects the rendered file
+    h = hashlib.sha256()
+    h.update(json.dumps({
+        "version": RENDER_CACHE_VERSION,
+        "format": fmt,
+        "project": project_name,
+        "color": color_choice,
+        "headers": HEADERS,
+        "categories": CATEGORIES,
+        "links": [repo_link, youtube_link],
+        "options": options,
+    }, sort_keys=True).encode("utf-8"))
+    for dtc in dtcs:
+        h.update(json.dumps(dtc, sort_keys=True).encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+def _prune_render_cache(cache_dir):
+    entries = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if not name.endswith(".tmp")]
+    entries.sort(key=os.path.getmtime, reverse=True)
+    for path in entries[RENDER_CACHE_MAX_ENTRIES:]:
+        os.remove(path)
+
+def render_cached(fmt, dtcs, project_name, color_choice="1", output=None, cache_dir=RENDER_CACHE_DIR, **options):
+    # render() that skips rendering when the same catalog/project/color/options were rendered before.
+    # dtcs must be a list (it is read twice). Returns (output, True if it came from the cache).
+    if output is None:
+        output = default_output(project_name, fmt)
+    if fmt in SITE_FORMATS:
+        return render(fmt, dtcs, project_name, color_choice, output, **options), False
+    key = render_cache_key(fmt, dtcs, project_name, color_choice, **options)
+    cached_file = os.path.join(cache_dir, f"{key}.{RENDERERS[fmt][2]}")
+    if os.path.exists(cached_file):
+        os.utime(cached_file)  # keep recently used entries when pruning
+        shutil.copyfile(cached_file, output)
+        return output, True
+
+    render(fmt, dtcs, project_name, color_choice, output, **options)
+    os.makedirs(cache_dir, exist_ok=True)
+    shutil.copyfile(output, cached_file + ".tmp")
+    os.replace(cached_file + ".tmp", cached_file)
+    _prune_render_cache(cache_dir)
+    return output, False
+
+def catalog_signature():
+    # mtime/size of every file backing the current catalog, changes whenever it is written
+    if STORAGE_MODE == "sqlite":
+        paths = [sqlite_path(), sqlite_path() + "-wal"]
+    else:
+        paths = [JSON_FILE, JSON_FILE + ".journal"]
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            signature.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+def watch_and_export(fmt, project_name, color_choice="1", output=None, interval=0.5, debounce=2.0,
+                     cache_dir=RENDER_CACHE_DIR, **options):
+    # Re-export whenever the catalog changes. A burst of saves triggers one rebuild once the
+    # files have been quiet for `debounce` seconds. Runs until Ctrl+C.
+    def rebuild():
+        forget_catalogs()
+        dtcs = export_order_dtcs(quiet=True)
+        if not dtcs:
+            print("No DTCs found, waiting for changes...")
+            return
+        started = time.perf_counter()
+        path, cached = render_cached(fmt, dtcs, project_name, color_choice, output, cache_dir, **options)
+        state = "unchanged, reused cached render" if cached else "rendered"
+        print(f"[{datetime.datetime.now():%H:%M:%S}] {path} {state} ({time.perf_counter() - started:.1f}s)")
+
+    print(f"Watching {JSON_FILE} for changes (Ctrl+C to stop)")
+    seen = catalog_signature()
+    rebuild()
+    changed_at = None
+    try:
+        while True:
+            time.sleep(interval)
+            signature = catalog_signature()
+            if signature != seen:
+                seen = signature
+                changed_at = time.monotonic()
+            elif changed_at is not None and time.monotonic() - changed_at >= debounce:
+                changed_at = None
+                try:
+                    rebuild()
+                except Exception as e:  # e.g. caught the file mid-edit by hand, try again on the next change
+                    print(f"Export failed: {e}")
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+
+def detect_storage(path):
+    # Storage mode for a catalog path: .db files are SQLite, a .journal next to it means journal mode
+    if path.endswith(".db"):
+        return "sqlite"
+    if os.path.exists(path + ".journal"):
+        return "journal"
+    return "json"
+
+def export_job(job):
+    # Process pool worker for export_batch, never raises: returns a result dict for the summary.
+    # A job with "dtcs" (entries in export order, any iterable) renders those instead of loading "catalog".
+    global JSON_FILE, STORAGE_MODE
+    started = time.perf_counter()
+    result = {"catalog": job.get("catalog"), "project": job.get("project", "Unnamed Project"),
+              "output": job.get("output"), "count": 0, "status": "ok", "error": ""}
+    try:
+        fmt = job.get("format", "pdf")
+        get_renderer(fmt)
+        if "dtcs" in job:
+            dtcs = list(job["dtcs"])
+        else:
+            if not os.path.exists(job["catalog"]):
+                raise FileNotFoundError(f"catalog {job['catalog']} not found")
+            close_storage()
+            forget_catalogs()
+            JSON_FILE = job["catalog"]
+            STORAGE_MODE = job.get("storage") or detect_storage(JSON_FILE)
+            dtcs = export_order_dtcs(quiet=True)
+        if not dtcs:
+            raise ValueError("catalog has no DTCs")
+        result["count"] = len(dtcs)
+        options = {"stream": job.get("stream", len(dtcs) > STREAM_EXPORT_ROWS)} if fmt == "pdf" else {}
+        if job.get("cache"):
+            result["output"], cached = render_cached(fmt, dtcs, result["project"], str(job.get("color", "1")),
+                                                     job.get("output"), job.get("cache_dir", RENDER_CACHE_DIR),
+                                                     **options)
+            result["status"] = "cached" if cached else "ok"
+        else:
+            result["output"] = render(fmt, dtcs, result["project"], str(job.get("color", "1")), job.get("output"),
+                                      **options)
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        close_storage()
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+def export_batch(jobs, workers=None):
+    # Export many catalogs concurrently. Each job is a dict with "catalog", "project", "color" and
+    # "output" (optional: "format", "storage", "stream", "cache"). A failing job doesn't stop the others.
+    import concurrent.futures
+    results = [None] * len(jobs)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(export_job, job): i for i, job in enumerate(jobs)}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:  # the worker process itself died
+                job = jobs[futures[future]]
+                result = {"catalog": job.get("catalog"), "project": job.get("project", "Unnamed Project"),
+                          "output": job.get("output"), "count": 0, "status": "failed",
+                          "error": f"{type(e).__name__}: {e}", "seconds": 0.0}
+            print(f"[{result['status']}] {result['project']} ({result['catalog']}) {result['seconds']:.1f}s")
+            results[futures[future]] = result
+    return results
+
+def print_batch_summary(results, wall_seconds=None):
+    print("\n=== Batch Export Summary ===")
+    print(f"{'Status':<8} {'Time':>8} {'DTCs':>7}  {'Project':<24} Output / Error")
+    for r in results:
+        detail = r["error"] if r["status"] == "failed" else r["output"]
+        print(f"{r['status']:<8} {r['seconds']:>7.1f}s {r['count']:>7}  {r['project'][:24]:<24} {detail}")
+    failed = sum(1 for r in results if r["status"] == "failed")
+    print(f"\n{len(results) - failed} succeeded, {failed} failed, "
+          f"{sum(r['seconds'] for r in results):.1f}s total render time")
+    if wall_seconds is not None:
+        print(f"Wall time: {wall_seconds:.1f}s")
+
+def measure_startup(runs=5):
+    # Median time (ms) to import this script in a fresh interpreter, plus any heavy modules that got
+    # pulled in. That is the cost every menu session and CLI call pays before doing anything.
+    import statistics
+    import subprocess
+    probe = ("import sys, time; t = time.perf_counter(); import custom_dtc_builder; "
+             "ms = (time.perf_counter() - t) * 1000; "
+             "print(ms, ','.join(m for m in ('reportlab', 'sqlite3', 'concurrent.futures') if m in sys.modules))")
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    times, heavy = [], ""
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", probe], cwd=script_dir,
+                                capture_output=True, text=True, check=True)
+        fields = result.stdout.strip().splitlines()[-1].split()
+        times.append(float(fields[0]))
+        heavy = fields[1] if len(fields) > 1 else ""
+    return statistics.median(times), heavy
+
 def dtcMenu():
     while True:
         clear_screen()
@@ -532,7 +1156,7 @@ def dtcMenu():
         elif choice == "3":
             print("Reloading DTC's")
             time.sleep(1)
-            load_dtcs()
+            reload_catalog()
         elif choice == "4":
             break  # return to main menu
         else:
@@ -544,24 +1168,708 @@ def main():
         clear_screen()
         print("=== Custom DTC Builder ===")
         print("1. DTC Menu")
+        # Existing numbers keep their meaning in both layouts, new entries go after Exit
+        exit_choice = "3" if PDFEnabled else "2"
+        html_choice = "4" if PDFEnabled else "3"
         if PDFEnabled:
             print("2. Print to PDF")
-            print("3. Exit")
-        else:
-            print("2. Exit")
+        print(f"{exit_choice}. Exit")
+        print(f"{html_choice}. Export to HTML")
 
         choice = input("Select option: ").strip()
         if choice == "1":
             dtcMenu()
-        elif choice == "2":
-            if PDFEnabled:
-                print_to_pdf()
-            else:
-                break
-        elif choice == "3":
+        elif choice == "2" and PDFEnabled:
+            print_to_pdf()
+        elif choice == exit_choice:
             break
+        elif choice == html_choice:
+            export_to_html()
         else:
             print("Invalid choice. Try again.\n")
 
+# ===================== Headless / scripted use =====================
+
+def make_code(header_key, cat_key, code_number):
+    # Header + 4 (custom) + category digit + 2-digit number, example: U4101
+    return f"{header_key}4{cat_key[2]}{str(code_number).zfill(2)}"
+
+def _code_number(value):
+    # Accept a 1-2 digit number ("7", "07" or 7 from a change file), returned as 2 digits
+    text = str(value).strip()
+    if isinstance(value, bool) or not (text.isdigit() and text.isascii() and len(text) <= 2):
+        raise ValueError(f"Invalid number '{value}', expected 00 to 99")
+    return text.zfill(2)
+
+def parse_header(value):
+    # Accept a header letter ("P") or its description ("Powertrain")
+    if value.upper() in HEADERS:
+        return value.upper()
+    for k, v in HEADERS.items():
+        if v.lower() == value.lower():
+            return k
+    raise ValueError(f"Unknown header '{value}', expected one of: {', '.join(HEADERS)}")
+
+def parse_category(value):
+    # Accept a category key ("x41xx"), its digit ("1") or its description
+    for k, v in CATEGORIES.items():
+        if value.lower() in (k.lower(), k[2], v.lower()):
+            return k
+    raise ValueError(f"Unknown category '{value}', expected one of: {', '.join(CATEGORIES)}")
+
+CHANGE_TEXT_FIELDS = ("op", "code", "header", "category", "title", "description", "pinpoint_test")
+
+def check_change(change):
+    # Raises ValueError if a change (from a change file) isn't shaped the way apply_change reads it
+    if not isinstance(change, dict):
+        raise ValueError(f"expected an object with an 'op', got {type(change).__name__}")
+    for field in CHANGE_TEXT_FIELDS:
+        if field in change and not isinstance(change[field], str):
+            raise ValueError(f"'{field}' must be text")
+    for field in ("possible_fixes", "add_fixes"):
+        fixes = change.get(field, [])
+        if not (isinstance(fixes, list) and all(isinstance(fix, str) for fix in fixes)):
+            raise ValueError(f"'{field}' must be a list of text")
+    if "remove_fixes" in change and not (isinstance(change["remove_fixes"], list) and all(
+            isinstance(n, int) and not isinstance(n, bool) for n in change["remove_fixes"])):
+        raise ValueError("'remove_fixes' must be a list of fix numbers")
+
+def apply_change(catalog, change):
+    # Apply one add/edit/remove operation to a DTCCatalog in memory, returns the affected code
+    check_change(change)
+    op = change.get("op")
+    if op == "add":
+        header_key = parse_header(change["header"])
+        cat_key = parse_category(change["category"])
+        if change.get("number") is None:
+            # No number: next free code in the block
+            full_code = catalog.allocator().next_free(header_key, cat_key)
+            if full_code is None:
+                raise ValueError(f"No free codes left in {header_key} / {cat_key}")
+        else:
+            full_code = make_code(header_key, cat_key, _code_number(change["number"]))
+        catalog.add({
+            "code": full_code,
+            "header": HEADERS[header_key],
+            "category": CATEGORIES[cat_key],
+            "title": change.get("title", ""),
+            "description": change.get("description", ""),
+            "possible_fixes": list(change.get("possible_fixes", [])),
+            "pinpoint_test": change.get("pinpoint_test", "")
+        })
+        return full_code
+
+    index = catalog.index_of(change.get("code"))
+    if index is None:
+        raise ValueError(f"DTC {change.get('code')} not found")
+
+    if op == "remove":
+        catalog.remove(index)
+        return change["code"]
+
+    if op != "edit":
+        raise ValueError(f"Unknown operation '{op}', expected add, edit or remove")
+
+    dtc = copy.deepcopy(catalog.dtcs[index])
+    header_key = HEADER_KEYS.get(dtc.get('header'), "U")
+    cat_key = CATEGORY_KEYS.get(dtc.get('category'), "x40xx")
+    if change.get("header"):
+        header_key = parse_header(change["header"])
+        dtc["header"] = HEADERS[header_key]
+    if change.get("category"):
+        cat_key = parse_category(change["category"])
+        dtc["category"] = CATEGORIES[cat_key]
+    if change.get("number") not in (None, ""):
+        code_number = _code_number(change["number"])
+    else:
+        code_number = dtc.get("code", "")[-2:]
+    full_code = make_code(header_key, cat_key, code_number)
+    dtc["code"] = full_code
+
+    for field in ("title", "description", "pinpoint_test"):
+        if change.get(field):
+            dtc[field] = change[field]
+    if "possible_fixes" in change:
+        dtc["possible_fixes"] = list(change["possible_fixes"])
+    for fix_number in sorted(change.get("remove_fixes", []), reverse=True):
+        if not 1 <= fix_number <= len(dtc["possible_fixes"]):
+            raise ValueError(f"DTC {full_code} has no fix number {fix_number}")
+        dtc["possible_fixes"].pop(fix_number - 1)
+    dtc["possible_fixes"].extend(change.get("add_fixes", []))
+    catalog.replace(index, dtc)
+    return full_code
+
+def load_change_file(path):
+    # Change files are a JSON array of operations, or JSON Lines (one operation per line).
+    # Raises ValueError for a file that isn't either.
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            changes = []
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        changes.append(json.loads(line))
+                    except ValueError as e:
+                        raise ValueError(f"{path} line {number} is not valid JSON: {e}") from None
+            return changes
+        try:
+            changes = json.load(f)
+        except ValueError as e:
+            raise ValueError(f"{path} is not valid JSON: {e}") from None
+    if not isinstance(changes, list):
+        raise ValueError(f"{path} must hold a JSON array of changes")
+    return changes
+
+def _change_from_args(args):
+    change = {"op": args.command}
+    for field in ("code", "header", "category", "number", "title", "description"):
+        value = getattr(args, field, None)
+        if value is not None:
+            change[field] = value
+    if getattr(args, "pinpoint", None) is not None:
+        change["pinpoint_test"] = args.pinpoint
+    if args.command == "add":
+        change["possible_fixes"] = args.fix or []
+    elif args.command == "edit":
+        if args.clear_fixes:
+            change["possible_fixes"] = []
+        change["add_fixes"] = args.add_fix or []
+        change["remove_fixes"] = args.remove_fix or []
+    return change
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Custom DTC Builder. Run without a command for the interactive menu.")
+    parser.add_argument("--file", default=None, help=f"Catalog file to use (default: {JSON_FILE})")
+    parser.add_argument("--storage", choices=["json", "journal", "sqlite"], default=None,
+                        help=f"Storage mode (default: {STORAGE_MODE})")
+    parser.add_argument("--on-conflict", choices=["ask", "mine", "theirs", "fail"], default=None,
+                        help="When someone else changed the same DTC before a save: ask, keep mine, keep theirs "
+                             "or fail without saving (default: fail for commands, ask in the menu)")
+    parser.add_argument("--trace", nargs="?", const=dtc_trace.DEFAULT_TRACE_FILE, metavar="FILE",
+                        help="Time the load, save, sort and render stages and the PDF pages, written to FILE as "
+                             f"JSON on exit (default: {dtc_trace.DEFAULT_TRACE_FILE}, or set DTC_TRACE)")
+    parser.add_argument("--cprofile", metavar="FILE",
+                        help="Also run cProfile and dump its stats to FILE (or set DTC_CPROFILE)")
+    sub = parser.add_subparsers(dest="command")
+
+    add = sub.add_parser("add", help="Add a new DTC")
+    add.add_argument("--header", required=True, help="Header letter, e.g. P")
+    add.add_argument("--category", required=True, help="Category key, e.g. x41xx")
+    add.add_argument("--number", help="2-digit code number, e.g. 01 (default: the next free one)")
+    add.add_argument("--title", required=True)
+    add.add_argument("--description", default="")
+    add.add_argument("--fix", action="append", help="Possible fix (repeat for several)")
+    add.add_argument("--pinpoint", default="", help="Pinpoint test code, e.g. PP-001")
+
+    edit = sub.add_parser("edit", help="Edit an existing DTC")
+    edit.add_argument("code", help="Code of the DTC to edit, e.g. P4101")
+    edit.add_argument("--header")
+    edit.add_argument("--category")
+    edit.add_argument("--number")
+    edit.add_argument("--title")
+    edit.add_argument("--description")
+    edit.add_argument("--pinpoint")
+    edit.add_argument("--add-fix", action="append", help="Append a possible fix (repeatable)")
+    edit.add_argument("--remove-fix", action="append", type=int, help="Remove fix by number (repeatable)")
+    edit.add_argument("--clear-fixes", action="store_true", help="Remove all possible fixes first")
+
+    remove = sub.add_parser("remove", help="Remove a DTC")
+    remove.add_argument("code")
+
+    lst = sub.add_parser("list", help="List DTCs")
+    lst.add_argument("--header", help="Only list this header letter")
+    lst.add_argument("--category", help="Only list this category key")
+    lst.add_argument("--json", action="store_true", help="Print full entries as JSON")
+
+    search = sub.add_parser("search", help="Full-text search over code, title, description, fixes and pinpoint test")
+    search.add_argument("query", help="Words or code prefixes, e.g. \"door modu\"")
+    search.add_argument("--limit", type=int, default=25)
+
+    export = sub.add_parser("export", help="Export the catalog to PDF (or another format)")
+    export.add_argument("--format", choices=list(RENDERERS), default="pdf", help="Output format (default: pdf)")
+    export.add_argument("--project", default="Unnamed Project", help="Project/Application name")
+    export.add_argument("--color", choices=["1", "2", "3"], default="1",
+                        help="1 = Black & White, 2 = Colorless, 3 = Color")
+    export.add_argument("--output", help="Output file path")
+    export.add_argument("--stream", action="store_true",
+                        help="Render in bounded table chunks read lazily from the catalog (large catalogs)")
+    export.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_ROWS, help="Rows per table chunk when streaming")
+    export.add_argument("--group", choices=["header", "category"],
+                        help="Split the table into sections with headings (implies --stream)")
+    export.add_argument("--parallel", choices=["header", "category"],
+                        help="PDF only: render each header or category section in its own process and stitch them together")
+    export.add_argument("--split", action="store_true", help="With --parallel, write one PDF per section instead")
+    export.add_argument("--workers", type=int, help="Worker processes for --parallel (default: CPU count)")
+    export.add_argument("--cache", action="store_true",
+                        help=f"Skip rendering if nothing changed since a previous export (cache in {RENDER_CACHE_DIR})")
+    export.add_argument("--force", action="store_true", help="Export even if the validator finds errors in the catalog")
+    export.add_argument("--watch", action="store_true", help="Keep running and re-export whenever the catalog changes")
+    export.add_argument("--debounce", type=float, default=2.0,
+                        help="With --watch, seconds the catalog must be unchanged before re-exporting")
+
+    validate = sub.add_parser("validate", help="Check the whole catalog for problems that would break or scramble an export")
+    validate.add_argument("--json", help="Also write the report to this JSON file")
+    validate.add_argument("--workers", type=int, help="Worker processes for large catalogs (default: CPU count, 1 = none)")
+    validate.add_argument("--all", action="store_true", help="List every issue instead of the first 50")
+
+    apply = sub.add_parser("apply", help="Apply a change file of many operations with a single save")
+    apply.add_argument("change_file", help="JSON array or .jsonl file of add/edit/remove operations")
+    apply.add_argument("--dry-run", action="store_true", help="Validate the changes without saving")
+
+    imp = sub.add_parser("import", help="Import DTCs from a CSV, JSON Lines or JSON file (reference lists, vendor dumps)")
+    imp.add_argument("source", help="File to import: .csv, .tsv, .jsonl or .json, or any of them gzipped (.gz)")
+    imp.add_argument("--format", choices=["csv", "jsonl", "json"], help="File format (default: from the file name)")
+    imp.add_argument("--map", action="append", metavar="FIELD=COLUMN",
+                     help='Column to read a field from, e.g. --map title="Short Text" (repeat for more fields)')
+    imp.add_argument("--category", help="Category for rows that have none and whose code doesn't give one")
+    imp.add_argument("--fix-separator", default="|", help="Splits a text fixes column into separate fixes (default: |)")
+    imp.add_argument("--existing", choices=["skip", "replace"], default="skip",
+                     help="Rows whose code is already in the catalog with other content (default: skip)")
+    imp.add_argument("--batch-size", type=int, help="Rows per commit in journal/sqlite storage (default: 5000)")
+    imp.add_argument("--dry-run", action="store_true", help="Only compare the file with the catalog, save nothing")
+    imp.add_argument("--json", help="Also write the report to this JSON file")
+
+    sub.add_parser("compact", help="Fold the change journal into the catalog file (journal storage)")
+
+    migrate = sub.add_parser("migrate", help="Copy the JSON catalog into a SQLite database (sqlite storage)")
+    migrate.add_argument("--force", action="store_true", help="Overwrite an existing database")
+
+    compile_cmd = sub.add_parser("compile", help="Compile the catalog into a binary lookup table and C header/source for firmware")
+    compile_cmd.add_argument("--output-dir", default=".", help="Where to write the files (default: current folder)")
+    compile_cmd.add_argument("--name", default="dtc_table", help="Base name of the .bin/.h/.c files (default: dtc_table)")
+    compile_cmd.add_argument("--no-hash", action="store_true", help="Leave out the perfect hash, lookups use binary search only")
+
+    generate = sub.add_parser("generate", help="Write a synthetic catalog for testing and benchmarks")
+    generate.add_argument("--count", type=int, default=1000, help="Number of DTCs, at most 3200 (default: 1000)")
+    generate.add_argument("--output", default="synthetic_dtcs.json")
+    generate.add_argument("--seed", type=int, default=0, help="Same seed, same catalog")
+
+    bench = sub.add_parser("bench", help="Time load/save/create/edit/sort/PDF on synthetic catalogs")
+    bench.add_argument("--sizes", default="100,1000,3200",
+                       help="Comma separated catalog sizes, at most 3200 (default: 100,1000,3200)")
+    bench.add_argument("--steps", default="load,save,create,edit,sort,pdf", help="Comma separated steps to run, add memory for bytes per entry as dicts and compact")
+    bench.add_argument("--pdf-max", type=int, default=10000, help="Skip the PDF step above this many DTCs")
+    bench.add_argument("--output", help="Results file (default: bench-<date>-<time>.json)")
+    bench.add_argument("--compare", help="Previous results file to compare against")
+
+    startup = sub.add_parser("startup-time", help=f"Check the cold-start import time against the {STARTUP_BUDGET_MS} ms budget")
+    startup.add_argument("--runs", type=int, default=5)
+
+    codes = sub.add_parser("codes", help="Show how full each header/category code block is, hand out free codes or fix code layouts")
+    codes.add_argument("--header", help="Only this header (needed with --next)")
+    codes.add_argument("--category", help="Only this category (needed with --next)")
+    codes.add_argument("--next", type=int, metavar="N", help="Print the next N free codes in the block")
+    codes.add_argument("--contiguous", action="store_true", help="With --next, only a run of consecutive codes")
+    codes.add_argument("--normalize", action="store_true",
+                       help="Renumber DTCs whose code doesn't match their header and category")
+    codes.add_argument("--dry-run", action="store_true", help="With --normalize, only list the changes")
+
+    diff = sub.add_parser("diff", help="Show what changed between two catalog files")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    diff.add_argument("--json", help="Also write the change set to this JSON file")
+
+    merge = sub.add_parser("merge", help="Three-way merge of two catalogs that grew from a common ancestor")
+    merge.add_argument("base", help="Common ancestor of the two catalogs")
+    merge.add_argument("ours")
+    merge.add_argument("theirs")
+    merge.add_argument("--output", help="Where to write the merged catalog (default: over ours)")
+    merge.add_argument("--json", help="Also write the conflicts and the changes made to ours to this JSON file")
+
+    decode = sub.add_parser("decode-log", help="Count the DTCs in CAN (candump) log captures of OBD-II Mode 03/07/0A responses")
+    decode.add_argument("logs", nargs="+", help="candump log files (.log, or .gz)")
+    decode.add_argument("--custom-codes", action="store_true",
+                        help="The ECUs send this catalog's codes (first digit counted from 4): look them up in it")
+    decode.add_argument("--table", help="With --custom-codes, look codes up in a compiled table (compile command) "
+                                        "instead of the catalog")
+    decode.add_argument("--ids", help="Response CAN IDs in hex, e.g. 7E8-7EF,18DAF110 (default: all OBD-II response IDs)")
+    decode.add_argument("--json", help="Also write the report to this JSON file")
+    decode.add_argument("--no-numpy", action="store_true", help="Count without NumPy even if it is installed")
+
+    serve = sub.add_parser("serve", help="Serve lookups, search and exports over HTTP on this machine")
+    serve.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1, this machine only)")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--workers", type=int, help="Export worker processes (default: CPU count)")
+
+    batch = sub.add_parser("batch", help="Export many catalogs to PDF from a manifest, in parallel")
+    batch.add_argument("manifest", help="JSON array of {catalog, project, color, output} jobs")
+    batch.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    batch.add_argument("--cache", action="store_true", help="Skip jobs whose catalog and settings haven't changed")
+    return parser
+
+def cli(argv=None):
+    global JSON_FILE, STORAGE_MODE, ON_CONFLICT
+    args = build_parser().parse_args(argv)
+    if args.file:
+        JSON_FILE = args.file
+    if args.storage:
+        STORAGE_MODE = args.storage
+    ON_CONFLICT = args.on_conflict or ("ask" if args.command is None else "fail")
+    if args.trace or args.cprofile:
+        dtc_trace.enable(args.trace, args.cprofile)
+
+    if args.command is None:
+        main()
+        return 0
+
+    if args.command == "startup-time":
+        ms, heavy = measure_startup(args.runs)
+        print(f"Cold start: {ms:.1f} ms (budget {STARTUP_BUDGET_MS} ms)")
+        if heavy:
+            print(f"Heavy modules imported at startup: {heavy}")
+        return 0 if ms <= STARTUP_BUDGET_MS and not heavy else 1
+
+    if args.command == "generate":
+        import dtc_bench
+        try:
+            dtc_bench.write_catalog(args.output, args.count, args.seed)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return 1
+        print(f"Wrote {args.count} synthetic DTC(s) to {args.output}")
+        return 0
+
+    if args.command == "bench":
+        import dtc_bench
+        steps = args.steps.split(",")
+        unknown = [step for step in steps if step not in dtc_bench.BENCH_STEPS + dtc_bench.EXTRA_STEPS]
+        if unknown:
+            print(f"Error: unknown step(s) {', '.join(unknown)}, expected: {', '.join(dtc_bench.BENCH_STEPS + dtc_bench.EXTRA_STEPS)}")
+            return 1
+        try:
+            sizes = [int(size) for size in args.sizes.split(",")]
+            for size in sizes:
+                dtc_bench.check_size(size)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return 1
+        results = dtc_bench.run_benchmarks(sizes, steps, args.storage or STORAGE_MODE, args.pdf_max)
+        output = args.output or datetime.datetime.now().strftime("bench-%Y%m%d-%H%M%S.json")
+        dtc_storage.atomic_write_json(output, results)
+        print(f"Results saved to {output}")
+        if args.compare:
+            with open(args.compare, "r") as f:
+                dtc_bench.compare_results(json.load(f), results)
+        return 0 if all(r["status"] != "failed" for r in results["results"]) else 1
+
+    if args.command in ("diff", "merge"):
+        import dtc_diff
+        try:
+            catalogs = [dtc_diff.load_catalog(path) for path in
+                        ((args.old, args.new) if args.command == "diff" else (args.base, args.ours, args.theirs))]
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            return 1
+        if args.command == "diff":
+            changes = dtc_diff.diff_catalogs(*catalogs)
+            dtc_diff.print_diff(changes)
+            if args.json:
+                dtc_storage.atomic_write_json(args.json, changes)
+            return 0
+        resolve = {"ask": ask_conflict, "mine": lambda *_: "M", "theirs": lambda *_: "T", "fail": None}[ON_CONFLICT]
+        merged, conflicts = dtc_diff.merge3(*catalogs, resolve=resolve)
+        changes = dtc_diff.diff_catalogs(catalogs[1], merged)
+        if args.json:
+            dtc_storage.atomic_write_json(args.json, {"base": args.base, "ours": args.ours, "theirs": args.theirs,
+                                                      "conflicts": conflicts, "changes": changes})
+        for conflict in conflicts:
+            what = f"field '{conflict['field']}'" if conflict["field"] else "deleted on one side, changed on the other"
+            print(f"Conflict in {conflict['code']}: {what} (kept {conflict['kept']})")
+        if conflicts and resolve is None:
+            print(f"Error: {len(conflicts)} conflict(s), nothing was written. Pass --on-conflict mine/theirs/ask to resolve them.")
+            return 1
+        output = args.output or args.ours
+        dtc_storage.atomic_write_json(output, merged)
+        print(f"Merged into {output}: {dtc_diff.summary(changes)} compared to {args.ours}")
+        return 0
+
+    if args.command == "decode-log":
+        import dtc_logs
+        try:
+            ids = dtc_logs.parse_ids(args.ids) if args.ids else dtc_logs.DIAG_RESPONSE_IDS
+            if args.table and not args.custom_codes:
+                raise ValueError("--table needs --custom-codes, codes are only looked up for ECUs that send the catalog's codes")
+            lookup = dtc_logs.catalog_lookup(args.table) if args.custom_codes else None
+            report = dtc_logs.decode_logs(args.logs, lookup, ids, not args.no_numpy)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            return 1
+        dtc_logs.print_report(report)
+        if args.json:
+            dtc_storage.atomic_write_json(args.json, report)
+            print(f"Report saved to {args.json}")
+        return 0
+
+    if args.command == "serve":
+        import dtc_server
+        dtc_server.serve(args.host, args.port, args.workers)
+        return 0
+
+    if args.command == "batch":
+        with open(args.manifest, "r") as f:
+            jobs = json.load(f)
+        if args.cache:
+            for job in jobs:
+                job.setdefault("cache", True)
+        started = time.perf_counter()
+        results = export_batch(jobs, args.workers)
+        print_batch_summary(results, time.perf_counter() - started)
+        return 0 if all(r["status"] != "failed" for r in results) else 1
+
+    if args.command == "compile":
+        import dtc_compile
+        dtcs = load_dtcs(quiet=True)
+        if not dtcs:
+            print("No DTCs found. Please create or load DTCs first.")
+            return 1
+        table, paths = dtc_compile.write_compiled(dtcs, args.output_dir, args.name, not args.no_hash)
+        for code, reason in table["skipped"]:
+            print(f"Warning: skipped {code or '(no code)'}: {reason}")
+        print(f"Compiled {len(table['entries'])} DTC(s), {len(table['pool'])} bytes of strings, "
+              f"{dtc_compile.flash_size(table)} bytes of flash in total")
+        for path in paths:
+            print(f"  {path}")
+        return 0
+
+    if args.command == "import":
+        import dtc_import
+        committed = {}
+
+        def progress(report):
+            committed.update(report)
+            if report["batches"] % 20 == 0:
+                print(f"{report['rows']} row(s) read, {report['added']} added, {report['replaced']} replaced")
+        try:
+            column_map = dtc_import.ColumnMap(dtc_import.parse_column_map(args.map), args.category, args.fix_separator)
+            report = dtc_import.import_file(args.source, args.format, column_map, args.existing,
+                                            args.batch_size or dtc_import.IMPORT_BATCH, args.dry_run, progress)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            saved = committed.get("added", 0) + committed.get("replaced", 0)
+            if saved and not args.dry_run and STORAGE_MODE != "json":
+                print(f"The first {committed['rows']} row(s) were committed ({saved} DTC(s)). "
+                      "Run the import again to finish it, rows already imported are skipped.")
+            else:
+                print("No changes were saved.")
+            return 1
+        dtc_import.print_report(report, args.dry_run)
+        if args.json:
+            dtc_storage.atomic_write_json(args.json, report)
+            print(f"Report saved to {args.json}")
+        return 0
+
+    if args.command == "compact":
+        compact_storage()
+        print(f"Compacted {JSON_FILE}")
+        return 0
+
+    if args.command == "migrate":
+        if os.path.exists(sqlite_path()) and not args.force:
+            print(f"Error: {sqlite_path()} already exists, use --force to overwrite it.")
+            return 1
+        store = dtc_storage.SQLiteStore(sqlite_path(), dtc_sort_key)
+        count = store.import_json(JSON_FILE)
+        store.close()
+        print(f"Migrated {count} DTC(s) from {JSON_FILE} to {sqlite_path()}")
+        return 0
+
+    if args.command == "search":
+        dtcs = load_dtcs(quiet=True, lazy=True) if STORAGE_MODE == "sqlite" else get_catalog(quiet=True).dtcs
+        for position in search_dtcs(args.query, args.limit):
+            print(f"{dtcs[position].get('code')} - {dtcs[position].get('title', 'Untitled')}")
+        return 0
+
+    if args.command == "list" and STORAGE_MODE == "sqlite":
+        # Filter in the database using the header/category indexes
+        dtcs = get_store().query(
+            header=HEADERS[parse_header(args.header)] if args.header else None,
+            category=CATEGORIES[parse_category(args.category)] if args.category else None)
+    elif args.command == "list":
+        dtcs = load_dtcs(quiet=True)
+
+    if args.command == "list":
+        if args.header:
+            dtcs = [d for d in dtcs if d["code"][:1] == parse_header(args.header)]
+        if args.category:
+            dtcs = [d for d in dtcs if d["category"] == CATEGORIES[parse_category(args.category)]]
+        if args.json:
+            print(json.dumps(dtcs, indent=4))
+        else:
+            for dtc in dtcs:
+                print(f"{dtc.get('code')} - {dtc.get('title', 'Untitled')}")
+        return 0
+
+    if args.command == "export":
+        if args.format == "pdf" and not PDFEnabled:
+            print("Error 0x001A: PDF functionality is not enabled.")
+            return 1
+        stream = args.stream or args.group is not None or args.format != "pdf"
+        if not args.watch and not args.force:
+            import dtc_validate
+            # Streamed SQLite exports are checked as the rows stream past, everything else is in memory anyway
+            streamed = stream and STORAGE_MODE == "sqlite" and (STORAGE_MODE, JSON_FILE) not in _catalogs
+            report = dtc_validate.validate(iter_export_dtcs() if streamed else export_order_dtcs(quiet=True))
+            if report["errors"]:
+                dtc_validate.print_report(report, limit=20)
+                print("Export stopped. Fix the errors above (validate lists them all) or pass --force.")
+                return 1
+            if report["warnings"]:
+                print(f"{report['warnings']} warning(s), run validate to see them")
+        if args.parallel:
+            dtcs = export_order_dtcs(quiet=True)
+            if not dtcs:
+                print("No DTCs found. Please create or load DTCs first.")
+                return 1
+            import dtc_render_pdf
+            pdf_files = dtc_render_pdf.export_pdf_parallel(dtcs, args.project, args.color, args.output, args.parallel,
+                                                           args.split, args.workers, args.chunk_size)
+            for pdf_file in pdf_files:
+                print(f"PDF generated successfully: {pdf_file}")
+            return 0 if pdf_files else 1
+
+        options = {}
+        if args.format == "pdf":
+            options = {"stream": stream, "chunk_size": args.chunk_size, "group_by": args.group}
+        if args.watch:
+            watch_and_export(args.format, args.project, args.color, args.output, debounce=args.debounce, **options)
+            return 0
+        if args.cache:
+            dtcs = export_order_dtcs(quiet=True)
+            if not dtcs:
+                print("No DTCs found. Please create or load DTCs first.")
+                return 1
+            output, cached = render_cached(args.format, dtcs, args.project, args.color, args.output, **options)
+            print(f"{args.format.upper()} up to date (from cache): {output}" if cached
+                  else f"{args.format.upper()} generated successfully: {output}")
+            return 0
+
+        dtcs = iter_export_dtcs() if stream else export_order_dtcs(quiet=True)
+        if stream:
+            first = next(dtcs, None)
+            dtcs = itertools.chain([first], dtcs) if first is not None else []
+        if not dtcs:
+            print("No DTCs found. Please create or load DTCs first.")
+            return 1
+        output = render(args.format, dtcs, args.project, args.color, args.output, **options)
+        print(f"{args.format.upper()} generated successfully: {output}")
+        return 0
+
+    if args.command == "validate":
+        import dtc_validate
+        # Storage order, so "entry N" is the Nth entry in the file
+        if STORAGE_MODE == "sqlite":
+            report = dtc_validate.validate(get_store().iter_all(), args.workers)
+        else:
+            # The raw list, a session catalog needs the well-formed codes validate is there to check
+            report = dtc_validate.validate(load_dtcs(quiet=True), args.workers)
+        dtc_validate.print_report(report, limit=None if args.all else 50)
+        if args.json:
+            dtc_storage.atomic_write_json(args.json, report)
+            print(f"Report saved to {args.json}")
+        return 1 if report["errors"] else 0
+
+    if args.command == "codes":
+        import dtc_codes
+        catalog = get_catalog(quiet=True)
+        try:
+            header = parse_header(args.header) if args.header else None
+            cat_key = parse_category(args.category) if args.category else None
+            if args.next:
+                if header is None or cat_key is None:
+                    raise ValueError("--next needs --header and --category")
+                # A throwaway copy, the codes are only listed here and taken when they are added
+                allocator = dtc_codes.CodeAllocator(dtc.get("code") for dtc in catalog.dtcs)
+                print("\n".join(allocator.reserve(header, cat_key, args.next, args.contiguous)))
+                return 0
+        except ValueError as e:
+            print(f"Error: {e}")
+            return 1
+        if args.normalize:
+            renames = dtc_codes.normalize_codes(catalog.dtcs)
+            for index, old, new in renames:
+                print(f"{old} -> {new}" if new else f"{old}: no free code left in its block, left as is")
+            renames = [(index, new) for index, _, new in renames if new]
+            if not renames or args.dry_run:
+                print(f"{len(renames)} code(s) to change" + (", nothing saved (dry run)" if renames else ""))
+                return 0
+            try:
+                for index, new in renames:
+                    catalog.replace(index, dict(catalog.dtcs[index], code=new))
+                save_dtcs(catalog.dtcs, quiet=True)
+            except (ValueError, TimeoutError) as e:  # a code still taken, or a ConflictError
+                print(f"Error: {e}")
+                print("No changes were saved.")
+                return 1
+            print(f"{len(renames)} code(s) changed")
+            return 0
+        print(f"{'Block':<38}{'Used':>6}{'Free':>6}  Next free")
+        for block_header, block_cat, used, next_code in catalog.allocator().fill():
+            if header in (None, block_header) and cat_key in (None, block_cat):
+                print(f"{block_header} {block_cat} {CATEGORIES[block_cat]:<30}{used:>6}{dtc_codes.BLOCK_CODES - used:>6}  "
+                      f"{next_code or 'full'}")
+        if catalog.allocator().outside:
+            print(f"{catalog.allocator().outside} DTC(s) have codes outside the {dtc_codes.BLOCK_CODES}-code blocks "
+                  "(run codes --normalize to renumber any with the wrong header or category)")
+        return 0
+
+    catalog = get_catalog(quiet=True)
+    if args.command == "apply":
+        try:
+            changes = load_change_file(args.change_file)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            print("No changes were saved.")
+            return 1
+    else:
+        changes = [_change_from_args(args)]
+        index = catalog.index_of(args.code) if args.command != "add" else len(catalog)
+
+    # All operations run against the one in-memory catalog, nothing is saved if any of them fail
+    for number, change in enumerate(changes, 1):
+        where = f"Change {number}: " if args.command == "apply" else ""
+        try:
+            code = apply_change(catalog, change)
+        except KeyError as e:
+            print(f"Error: {where}missing field {e}")
+            print("No changes were saved.")
+            return 1
+        except ValueError as e:
+            print(f"Error: {where}{e}")
+            print("No changes were saved.")
+            return 1
+
+    if args.command == "apply" and args.dry_run:
+        print(f"{len(changes)} change(s) validated, nothing saved (dry run)")
+        return 0
+
+    try:
+        if args.command == "apply":
+            save_dtcs(catalog.dtcs, quiet=True)
+        else:
+            persist_change(catalog.dtcs, {"add": "append", "edit": "set", "remove": "delete"}[args.command],
+                           index, quiet=True)
+    except dtc_storage.ConflictError as e:
+        print(f"Error: {e}")
+        print("No changes were saved. Run again to redo them on top of the latest catalog, "
+              "or pass --on-conflict mine/theirs.")
+        return 1
+    except TimeoutError as e:
+        print(f"Error: {e}")
+        print("No changes were saved.")
+        return 1
+
+    if args.command == "apply":
+        print(f"Applied {len(changes)} change(s)")
+    else:
+        done = {"add": "added", "edit": "updated", "remove": "removed"}[args.command]
+        print(f"DTC {code} {done} successfully")
+    return 0
+
 if __name__ == "__main__":
-    main()
+    try:
+        if len(sys.argv) > 1:
+            sys.exit(cli())
+        main()
+    finally:
+        close_storage()
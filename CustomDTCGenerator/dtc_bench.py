@@ -0,0 +1,252 @@
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import custom_dtc_builder as builder
+import dtc_trace
+
+# Synthetic catalogs and a benchmark harness for custom_dtc_builder.py (generate and bench commands).
+#
+# Every benchmark step runs in its own fresh interpreter so its peak RSS is not mixed up with the
+# other steps. Setup (copying the catalog, loading it for the steps that need it loaded) is not
+# timed, the wall time covers only the step itself. Peak RSS is for the whole step process, so it
+# includes the loaded catalog.
+#
+# The memory step is only run when asked for (--steps memory): it measures bytes per entry of the
+# catalog as load_dtcs returns it and as a dtc_compact table, with tracemalloc, which slows it down.
+
+BENCH_STEPS = ["load", "save", "create", "edit", "sort", "pdf"]
+EXTRA_STEPS = ["memory"]
+# Above this many entries the PDF step is skipped unless --pdf-max is raised (20k entries take minutes)
+BENCH_PDF_MAX = 10000
+# Every custom code there is (4 headers x 8 categories x 100 numbers), the biggest synthetic catalog
+MAX_SYNTHETIC = len(builder.HEADERS) * len(builder.CATEGORIES) * 100
+
+SYNTH_WORDS = (
+    "sensor signal circuit voltage low high range performance intermittent open short ground battery "
+    "supply module control communication lost bus timeout checksum message invalid data counter "
+    "relay fuse harness connector pin terminal corrosion resistance current temperature pressure "
+    "coolant pump fan inverter motor phase isolation fault charger contactor precharge cell balance "
+    "door window lock mirror seat heater lamp headlamp brake steering angle torque wheel speed yaw "
+    "airbag belt gateway node firmware calibration mismatch watchdog reset stuck position actuator "
+    "valve solenoid throttle pedal switch input output driver stage overload thermal shutdown"
+).split()
+SYNTH_FIXES = (
+    "Check the wiring harness for damage", "Inspect connector pins for corrosion", "Measure supply voltage at the module",
+    "Verify ground continuity", "Replace the fuse", "Reflash module firmware", "Replace the sensor",
+    "Check CAN bus termination resistance", "Clear codes and retest", "Replace the module",
+    "Recalibrate after repair", "Check for water intrusion", "Tighten battery terminals",
+    "Inspect the relay and replace if stuck", "Compare readings with a known good unit"
+)
+
+
+def _words(rng, low, high):
+    return " ".join(rng.choice(SYNTH_WORDS) for _ in range(rng.randint(low, high)))
+
+
+def synthetic_dtc(i, rng):
+    # Entry number i of a synthetic catalog. Codes cycle through every header and category, each one
+    # made with make_code, so i must be below MAX_SYNTHETIC.
+    headers = list(builder.HEADERS)
+    categories = list(builder.CATEGORIES)
+    header = headers[i % len(headers)]
+    cat_key = categories[(i // len(headers)) % len(categories)]
+    number = i // (len(headers) * len(categories))
+    fixes = []
+    for _ in range(rng.randint(1, 5)):
+        fix = rng.choice(SYNTH_FIXES)
+        fixes.append(fix if rng.random() < 0.6 else f"{fix} ({_words(rng, 2, 6)})")
+    return {
+        "code": builder.make_code(header, cat_key, number),
+        "header": builder.HEADERS[header],
+        "category": builder.CATEGORIES[cat_key],
+        "title": _words(rng, 3, 7).capitalize(),
+        "description": ". ".join(_words(rng, 6, 20).capitalize() for _ in range(rng.randint(1, 3))) + ".",
+        "possible_fixes": fixes,
+        "pinpoint_test": f"PP-{rng.randint(1, 999):03d}"
+    }
+
+
+def check_size(count):
+    # Raises ValueError for a catalog size synthetic_dtc can't fill with valid, unique codes
+    if not 0 <= count <= MAX_SYNTHETIC:
+        raise ValueError(f"A synthetic catalog holds 0 to {MAX_SYNTHETIC:,} DTCs "
+                         f"(every custom code there is), got {count:,}")
+
+
+def iter_synthetic(count, seed=0):
+    rng = random.Random(seed)
+    for i in range(count):
+        yield synthetic_dtc(i, rng)
+
+
+def write_catalog(path, count, seed=0):
+    # Written one entry at a time in the same layout as save_dtcs
+    check_size(count)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for i, dtc in enumerate(iter_synthetic(count, seed)):
+            entry = json.dumps(dtc, indent=4).replace("\n", "\n    ")
+            f.write(("," if i else "") + "\n    " + entry)
+        f.write("\n]" if count else "]")
+    return path
+
+
+# --- Benchmark steps (run in a child process) ---
+
+def run_step(step, catalog, storage, work_dir):
+    # One benchmark step against a copy of the catalog. Returns its result dict.
+    builder.JSON_FILE = catalog
+    builder.STORAGE_MODE = storage
+    result = {"output_bytes": None}
+    if storage != "json":
+        builder.get_store()  # journal file / SQLite migration happens here, untimed
+    if step == "load":
+        started = time.perf_counter()
+        dtcs = builder.load_dtcs(quiet=True)
+        elapsed = time.perf_counter() - started
+        result["entries"] = len(dtcs)
+    elif step == "save":
+        dtcs = builder.load_dtcs(quiet=True)
+        started = time.perf_counter()
+        builder.save_dtcs(dtcs, quiet=True)
+        elapsed = time.perf_counter() - started
+        result["output_bytes"] = os.path.getsize(builder.sqlite_path() if storage == "sqlite" else catalog)
+    elif step in ("create", "edit"):
+        catalog_obj = builder.get_catalog(quiet=True)
+        if step == "create":
+            if len(catalog_obj) >= MAX_SYNTHETIC:
+                # Every code is taken: free the last one (untimed) and add it again
+                catalog_obj.remove(len(catalog_obj) - 1)
+                builder.persist_change(catalog_obj.dtcs, "delete", len(catalog_obj), quiet=True)
+            dtc = synthetic_dtc(len(catalog_obj), random.Random(1))
+            started = time.perf_counter()
+            builder.add_dtc(dtc, quiet=True)
+        else:
+            index = len(catalog_obj) // 2
+            dtc = dict(catalog_obj.dtcs[index], title="Edited by benchmark")
+            started = time.perf_counter()
+            builder.replace_dtc(catalog_obj.dtcs, index, dtc, quiet=True)
+        elapsed = time.perf_counter() - started
+    elif step == "sort":
+        dtcs = builder.load_dtcs(quiet=True)
+        started = time.perf_counter()
+        builder.sort_dtcs(dtcs)
+        elapsed = time.perf_counter() - started
+    elif step == "pdf":
+        if not builder.PDFEnabled:
+            return {"status": "skipped", "reason": "reportlab not installed"}
+        dtcs = builder.export_order_dtcs(quiet=True)
+        output = os.path.join(work_dir, "bench.pdf")
+        started = time.perf_counter()
+        # Same call as print_to_pdf
+        builder.render("pdf", dtcs, "Benchmark", "1", output, stream=len(dtcs) > builder.STREAM_EXPORT_ROWS)
+        elapsed = time.perf_counter() - started
+        result["output_bytes"] = os.path.getsize(output)
+    elif step == "memory":
+        import dtc_compact
+        tracemalloc.start()
+        dtcs = list(builder.load_dtcs(quiet=True))
+        dict_bytes = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        compact = dtc_compact.CompactDTCs(dtcs)
+        elapsed = time.perf_counter() - started
+        if compact.to_list() != dtcs:
+            raise RuntimeError("the compact table does not give back the catalog it was built from")
+        del dtcs
+        compact_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        result["entries"] = len(compact)
+        result["dict_bytes_per_entry"] = round(dict_bytes / max(1, len(compact)))
+        result["compact_bytes_per_entry"] = round(compact_bytes / max(1, len(compact)))
+    else:
+        raise ValueError(f"Unknown benchmark step '{step}'")
+    builder.close_storage()
+    result.update({"status": "ok", "wall_s": round(elapsed, 4), "peak_rss_mb": dtc_trace.peak_rss_mb()})
+    return result
+
+
+def _child_main(argv):
+    step, catalog, storage, work_dir = argv
+    print(json.dumps(run_step(step, catalog, storage, work_dir)))
+
+
+def _run_in_child(step, catalog, storage, work_dir):
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, "-c", "import sys, dtc_bench; dtc_bench._child_main(sys.argv[1:])",
+         step, catalog, storage, work_dir],
+        cwd=script_dir, capture_output=True, text=True)
+    if result.returncode != 0:
+        error = (result.stderr.strip().splitlines() or ["no output"])[-1]
+        return {"status": "failed", "error": error}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+# --- Harness ---
+
+def run_benchmarks(sizes, steps=BENCH_STEPS, storage="json", pdf_max=BENCH_PDF_MAX, seed=0):
+    # Runs every step for every catalog size, printing a line per step. Returns the results document.
+    results = []
+    with tempfile.TemporaryDirectory(prefix="dtc_bench_") as tmp:
+        for size in sizes:
+            source = os.path.join(tmp, f"synthetic_{size}.json")
+            started = time.perf_counter()
+            write_catalog(source, size, seed)
+            print(f"Generated {size:,} DTCs ({os.path.getsize(source) / 1e6:.1f} MB) in {time.perf_counter() - started:.1f}s")
+            for step in steps:
+                if step == "pdf" and size > pdf_max:
+                    result = {"status": "skipped", "reason": f"more than --pdf-max {pdf_max} entries"}
+                else:
+                    # Fresh copy each step, so save/create/edit never see each other's changes
+                    work_dir = os.path.join(tmp, step)
+                    os.makedirs(work_dir, exist_ok=True)
+                    catalog = os.path.join(work_dir, "custom_dtcs.json")
+                    shutil.copyfile(source, catalog)
+                    result = _run_in_child(step, catalog, storage, work_dir)
+                    shutil.rmtree(work_dir)
+                result = {"size": size, "step": step, **result}
+                results.append(result)
+                print(format_result(result))
+            os.remove(source)
+    return {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "storage": storage,
+        "seed": seed,
+        "results": results
+    }
+
+
+def format_result(result):
+    label = f"  {result['size']:>9,} {result['step']:<7}"
+    if result["status"] != "ok":
+        return f"{label} {result['status']}: {result.get('reason') or result.get('error')}"
+    rss = f"{result['peak_rss_mb']:8.1f} MB" if result.get("peak_rss_mb") is not None else "       n/a"
+    size = f"  output {result['output_bytes'] / 1e6:.1f} MB" if result.get("output_bytes") else ""
+    if "compact_bytes_per_entry" in result:
+        size += (f"  {result['dict_bytes_per_entry']:,} B/entry as dicts, "
+                 f"{result['compact_bytes_per_entry']:,} B/entry compact")
+    return f"{label} {result['wall_s']:9.3f} s  peak RSS {rss}{size}"
+
+
+def compare_results(old, new):
+    # Side by side wall time and peak RSS for the steps two result documents have in common
+    previous = {(r["size"], r["step"]): r for r in old["results"] if r["status"] == "ok"}
+    print(f"{'size':>11} {'step':<7} {'wall before':>12} {'wall after':>11} {'change':>8}   {'RSS before':>10} {'RSS after':>10}")
+    for result in new["results"]:
+        before = previous.get((result["size"], result["step"]))
+        if before is None or result["status"] != "ok":
+            continue
+        change = (result["wall_s"] / before["wall_s"] - 1) * 100 if before["wall_s"] else 0.0
+        print(f"{result['size']:>11,} {result['step']:<7} {before['wall_s']:>11.3f}s {result['wall_s']:>10.3f}s "
+              f"{change:>+7.1f}%   {before.get('peak_rss_mb') or 0:>8.1f}MB {result.get('peak_rss_mb') or 0:>8.1f}MB")
@@ -0,0 +1,285 @@
+import os
+import sys
+
+import custom_dtc_builder as builder
+
+try:
+    import curses
+except ImportError:
+    curses = None  # Windows without windows-curses (install.py), the numbered pages are used instead
+
+# Full-screen catalog browser for custom_dtc_builder.py (picking the DTC to edit in the menu).
+#
+# The list is virtual: the view is the list of catalog positions that pass the filters, in the chosen
+# order (a range when nothing is filtered or sorted), and only the rows on screen are ever drawn. Moving
+# the cursor redraws the two rows it moved between, scrolling redraws the list area, and curses sends
+# only the characters that changed to the terminal. Filtering and sorting by header and category run
+# in memory over one small column of keys per entry, built on first use, so 100k entries stay quick.
+#
+# Keys: arrows / PgUp / PgDn / Home / End move, Enter picks, / jumps to a code (or searches titles and
+# descriptions if no code starts with it), h and c cycle the header and category filters, s cycles the
+# sort order, Esc clears the search and filters, q goes back.
+
+SORTS = ("catalog", "code", "category", "title")
+SEARCH_LIMIT = 1000  # most word search matches shown
+
+
+def available():
+    # The browser needs curses and a real terminal, else the numbered pages are used
+    return curses is not None and sys.stdin.isatty() and sys.stdout.isatty()
+
+
+def browse(dtcs, title="Select DTC"):
+    # Position in dtcs of the DTC picked, None if the user went back
+    os.environ.setdefault("ESCDELAY", "25")  # Esc on its own, not the start of an arrow key
+    return curses.wrapper(lambda screen: Browser(dtcs, title).run(screen))
+
+
+_ONE_LINE = {ord(char): " " for char in "\n\r\t\v\f"}
+
+
+def _one_line(text):
+    # Line breaks and tabs would scramble the screen
+    return str(text).translate(_ONE_LINE)
+
+
+class Browser:
+    def __init__(self, dtcs, title):
+        self.dtcs = dtcs
+        self.title = title
+        self.header = None      # header letter filter, None for all
+        self.cat_key = None     # category key filter, None for all
+        self.sort = "catalog"
+        self.query = None       # word search, self.matches are its positions in relevance order
+        self.matches = None
+        self.view = range(len(dtcs))
+        self.cursor = 0         # index into view
+        self.top = 0            # index into view of the first row on screen
+        self.message = ""
+        self._keys = None       # per position, see keys()
+
+    # --- Keys and view ---
+
+    def keys(self):
+        # Per entry: (header letter, category key, code upper case, export sort key, title lower case),
+        # read once in one pass over the catalog. Filters, sorts and code jumps use these instead of
+        # the entries, which in SQLite mode are only fetched for the rows on screen.
+        if self._keys is None:
+            self._keys = []
+            for dtc in self.dtcs:
+                code = dtc.get("code")
+                code = code.upper() if isinstance(code, str) else ""
+                self._keys.append((builder.HEADER_KEYS.get(dtc.get("header"), code[:1]),
+                                   builder.CATEGORY_KEYS.get(dtc.get("category"), "~"),
+                                   code,
+                                   builder.dtc_sort_key(dtc) if code else (99, 99999),
+                                   str(dtc.get("title", "")).lower()))
+        return self._keys
+
+    def _sort_key(self):
+        keys = self.keys()
+        if self.sort == "code":
+            return lambda p: keys[p][3]
+        if self.sort == "category":
+            return lambda p: (keys[p][1], keys[p][3])
+        return lambda p: keys[p][4]
+
+    def rebuild(self):
+        # New view after a filter, sort or search change, keeping the cursor on the same DTC if it's still shown
+        current = self.view[self.cursor] if self.view else None
+        positions = self.matches if self.matches is not None else range(len(self.dtcs))
+        if self.header or self.cat_key:
+            keys = self.keys()
+            positions = [p for p in positions
+                         if self.header in (None, keys[p][0]) and self.cat_key in (None, keys[p][1])]
+        if self.sort != "catalog":
+            positions = sorted(positions, key=self._sort_key())
+        self.view = positions
+        self.cursor = 0
+        if current is not None:
+            try:
+                self.cursor = self.view.index(current)
+            except ValueError:
+                pass
+
+    def jump(self, text):
+        # Cursor to the first shown code starting with text, else a word search
+        prefix = text.strip().upper()
+        if not prefix:
+            return
+        keys = self.keys()
+        for i, p in enumerate(self.view):
+            if keys[p][2].startswith(prefix):
+                self.cursor = i
+                return
+        self.status(" Searching... (the first search indexes the catalog, give it a moment)")
+        matches = builder.search_dtcs(text, SEARCH_LIMIT)
+        if not matches:
+            self.message = f"No DTC code starts with '{text}' and no DTC matches it"
+            return
+        self.query, self.matches = text, matches
+        self.sort = "catalog"  # relevance order
+        self.rebuild()
+        self.cursor = 0
+        if not self.view and (self.header or self.cat_key):
+            self.message = "No matches with the header / category filter, Esc clears it"
+
+    @staticmethod
+    def _cycle(options, current):
+        options = [None, *options]
+        return options[(options.index(current) + 1) % len(options)]
+
+    # --- Drawing ---
+
+    def _row_text(self, p, width):
+        dtc = self.dtcs[p]
+        cat_key = builder.CATEGORY_KEYS.get(dtc.get("category"), "")
+        return _one_line(f" {str(dtc.get('code', '')):<8} {cat_key:<6} {dtc.get('title', 'Untitled')}")[:width]
+
+    def _put(self, y, text, attr=0):
+        height, width = self.screen.getmaxyx()
+        if 0 <= y < height:
+            self.screen.move(y, 0)
+            self.screen.clrtoeol()
+            self.screen.addnstr(y, 0, text, width - 1, attr)
+
+    def _list_rows(self):
+        return max(1, self.screen.getmaxyx()[0] - 3)
+
+    def draw_row(self, i):
+        # One list row, i is an index into the view
+        row = i - self.top
+        if 0 <= row < self._list_rows():
+            if i < len(self.view):
+                width = self.screen.getmaxyx()[1] - 1
+                self._put(row + 1, self._row_text(self.view[i], width).ljust(width),
+                          curses.A_REVERSE if i == self.cursor else 0)
+            else:
+                self._put(row + 1, "")
+
+    def draw_bars(self):
+        height, width = self.screen.getmaxyx()
+        sort = "relevance" if self.query is not None and self.sort == "catalog" else self.sort
+        filters = [f"header {self.header or 'all'}", f"category {self.cat_key or 'all'}", f"sort {sort}"]
+        if self.query is not None:
+            filters.append(f"search '{self.query}'")
+        shown = f"{self.cursor + 1 if self.view else 0}/{len(self.view)}"
+        if len(self.view) != len(self.dtcs):
+            shown += f" of {len(self.dtcs)}"
+        self._put(0, f" {self.title}  {shown}  {'  '.join(filters)}".ljust(width - 1), curses.A_REVERSE)
+        if self.view:
+            dtc = self.dtcs[self.view[self.cursor]]
+            detail = _one_line(f" {dtc.get('description', '')}")
+        else:
+            detail = " No DTCs to show" + (", Esc clears the search and filters" if len(self.dtcs) else "")
+        self._put(height - 2, detail, curses.A_DIM)
+        self._put(height - 1, self.message or
+                  " Enter pick  / jump to code  h header  c category  s sort  Esc clear  q back", curses.A_BOLD)
+
+    def status(self, text):
+        # Shown on the bottom line straight away, before something slow
+        self._put(self.screen.getmaxyx()[0] - 1, text, curses.A_BOLD)
+        self.screen.refresh()
+
+    def draw(self, full=True, rows=()):
+        if full:
+            for i in range(self.top, self.top + self._list_rows()):
+                self.draw_row(i)
+        else:
+            for i in rows:
+                self.draw_row(i)
+        self.draw_bars()
+        self.screen.noutrefresh()
+        curses.doupdate()
+
+    def scroll_to_cursor(self):
+        # True if the list had to scroll
+        rows = self._list_rows()
+        top = min(self.top, self.cursor)
+        top = max(top, self.cursor - rows + 1)
+        top = max(0, min(top, max(0, len(self.view) - rows)))
+        scrolled = top != self.top
+        self.top = top
+        return scrolled
+
+    # --- Input ---
+
+    def prompt(self, label):
+        # One line of text typed on the bottom line, None if Esc
+        height = self.screen.getmaxyx()[0]
+        text = ""
+        curses.curs_set(1)
+        try:
+            while True:
+                self._put(height - 1, label + text, curses.A_BOLD)
+                self.screen.refresh()
+                key = self.screen.get_wch()
+                if key in ("\n", "\r", curses.KEY_ENTER):
+                    return text
+                if key == "\x1b":
+                    return None
+                if key in (curses.KEY_BACKSPACE, "\x7f", "\b"):
+                    text = text[:-1]
+                elif isinstance(key, str) and key.isprintable():
+                    text += key
+        finally:
+            curses.curs_set(0)
+
+    def run(self, screen):
+        self.screen = screen
+        try:
+            curses.curs_set(0)
+        except curses.error:
+            pass
+        screen.keypad(True)
+        self.draw()
+        while True:
+            key = screen.get_wch()
+            old_cursor, old_view = self.cursor, self.view
+            self.message = ""
+            page = self._list_rows()
+            if key in ("q", "Q"):
+                return None
+            if key in ("\n", "\r", curses.KEY_ENTER):
+                if self.view:
+                    return self.view[self.cursor]
+                continue
+            if key == "\x1b":
+                # Only clears, an unknown escape sequence from the terminal mustn't close the browser
+                self.query = self.matches = self.header = self.cat_key = None
+                self.rebuild()
+            elif key in (curses.KEY_DOWN, "j"):
+                self.cursor += 1
+            elif key in (curses.KEY_UP, "k"):
+                self.cursor -= 1
+            elif key == curses.KEY_NPAGE:
+                self.cursor += page
+            elif key == curses.KEY_PPAGE:
+                self.cursor -= page
+            elif key == curses.KEY_HOME:
+                self.cursor = 0
+            elif key == curses.KEY_END:
+                self.cursor = len(self.view) - 1
+            elif key == "/":
+                text = self.prompt("Jump to code or search: ")
+                if text:
+                    self.jump(text)
+            elif key in ("h", "H"):
+                self.header = self._cycle(builder.HEADERS, self.header)
+                self.rebuild()
+            elif key in ("c", "C"):
+                self.cat_key = self._cycle(builder.CATEGORIES, self.cat_key)
+                self.rebuild()
+            elif key in ("s", "S"):
+                self.sort = SORTS[(SORTS.index(self.sort) + 1) % len(SORTS)]
+                self.rebuild()
+            elif key == curses.KEY_RESIZE:
+                self.screen.clear()
+            else:
+                continue
+            self.cursor = max(0, min(self.cursor, len(self.view) - 1))
+            scrolled = self.scroll_to_cursor()
+            if self.view is old_view and not scrolled and key != curses.KEY_RESIZE:
+                self.draw(full=False, rows=(old_cursor, self.cursor))
+            else:
+                self.draw()
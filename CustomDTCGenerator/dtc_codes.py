@@ -0,0 +1,163 @@
+import re
+
+import custom_dtc_builder as builder
+
+# Code-space allocator for custom_dtc_builder.py (next free code when creating DTCs, the codes command).
+#
+# Canonical code layout: header letter + 4 (custom) + category digit + 2-digit number, e.g. P4101 is
+# number 01 in the P / x41xx block (see make_code). Every header x category block has 100 codes and
+# an occupancy bitmap, a Python int with bit n set when number n is used. The lowest free number is
+# the lowest clear bit, found with one bit trick instead of a scan, so handing out thousands of codes
+# in one batch stays fast. Codes outside the layout (reference codes like P0301, wider numbers) are only counted.
+
+BLOCK_CODES = 100
+_FULL = (1 << BLOCK_CODES) - 1
+_CODE = re.compile(r"([A-Z])4([0-9])([0-9]{2})")
+
+
+def parse_code(code):
+    # "P4101" -> ("P", "x41xx", 1), None if the code isn't in the canonical layout
+    match = _CODE.fullmatch(str(code).upper())
+    if not match or match.group(1) not in builder.HEADERS:
+        return None
+    cat_key = f"x4{match.group(2)}xx"
+    if cat_key not in builder.CATEGORIES:
+        return None
+    return match.group(1), cat_key, int(match.group(3))
+
+
+def _lowest_clear(bits):
+    # Index of the lowest 0 bit: bits + 1 carries through the trailing 1s into it
+    return ((bits + 1) & ~bits).bit_length() - 1
+
+
+class CodeAllocator:
+    def __init__(self, codes=()):
+        self._blocks = {}   # (header, cat_key) -> occupancy bitmap
+        self._counts = {}   # code -> entries using it, so a duplicate code isn't freed too early
+        self.outside = 0    # codes not in the canonical layout
+        for code in codes:
+            self.mark(code)
+
+    def mark(self, code):
+        # A code is now in use
+        self._counts[code] = self._counts.get(code, 0) + 1
+        parsed = parse_code(code)
+        if parsed is None:
+            self.outside += 1
+            return
+        header, cat_key, number = parsed
+        self._blocks[header, cat_key] = self._blocks.get((header, cat_key), 0) | 1 << number
+
+    def release(self, code):
+        # A code is no longer used (once every entry with it is gone)
+        count = self._counts.get(code, 0)
+        if count != 1:
+            if count:
+                self._counts[code] = count - 1
+            return
+        del self._counts[code]
+        parsed = parse_code(code)
+        if parsed is None:
+            self.outside -= 1
+            return
+        header, cat_key, number = parsed
+        self._blocks[header, cat_key] = self._blocks.get((header, cat_key), 0) & ~(1 << number)
+
+    def used(self, code):
+        return code in self._counts
+
+    def next_free(self, header, cat_key):
+        # Lowest free code in the block, or None if it is full. O(1).
+        number = _lowest_clear(self._blocks.get((header, cat_key), 0))
+        return builder.make_code(header, cat_key, number) if number < BLOCK_CODES else None
+
+    def allocate(self, header, cat_key):
+        # Next free code, marked as used. Raises ValueError if the block is full.
+        code = self.next_free(header, cat_key)
+        if code is None:
+            raise ValueError(f"All {BLOCK_CODES} codes in {header} / {cat_key} are used")
+        self.mark(code)
+        return code
+
+    def reserve(self, header, cat_key, count, contiguous=False):
+        # Marks count free codes in the block as used and returns them, lowest first. contiguous=True
+        # asks for a run of consecutive numbers. Raises ValueError (and reserves nothing) if they don't fit.
+        bits = self._blocks.get((header, cat_key), 0)
+        free = ~bits & _FULL
+        if contiguous and count > 0:
+            # Bit n of runs is set when numbers n .. n+count-1 are all free
+            runs = free
+            for _ in range(count - 1):
+                runs &= runs >> 1
+            if not runs:
+                raise ValueError(f"No run of {count} free codes in {header} / {cat_key}")
+            start = (runs & -runs).bit_length() - 1
+            numbers = range(start, start + count)
+        else:
+            numbers = []
+            while free and len(numbers) < count:
+                low = free & -free
+                numbers.append(low.bit_length() - 1)
+                free ^= low
+            if len(numbers) < count:
+                raise ValueError(f"Only {len(numbers)} free codes left in {header} / {cat_key}, {count} asked for")
+        codes = [builder.make_code(header, cat_key, number) for number in numbers]
+        for code in codes:
+            self.mark(code)
+        return codes
+
+    def fill(self):
+        # [(header, cat_key, used, next free code or None)] for every block, in header/category order
+        report = []
+        for header in builder.HEADERS:
+            for cat_key in builder.CATEGORIES:
+                bits = self._blocks.get((header, cat_key), 0)
+                report.append((header, cat_key, bin(bits).count("1"), self.next_free(header, cat_key)))
+        return report
+
+
+def canonical_code(dtc, allocator):
+    # The code dtc should have in the canonical layout: its own if it already fits its header and
+    # category and isn't taken, else the same number in the right block if that is free, else the
+    # block's next free code. None if the block is full. allocator must not count dtc's own code.
+    header = builder.HEADER_KEYS.get(dtc.get("header"), str(dtc.get("code", " "))[:1].upper())
+    cat_key = builder.CATEGORY_KEYS.get(dtc.get("category"))
+    code = str(dtc.get("code", "")).upper()
+    if header not in builder.HEADERS or cat_key is None:
+        return code  # unknown header or category, nothing to normalize it to
+    if code[:3] == f"{header}4{cat_key[2]}" and code[3:].isdigit() and len(code) >= 5 and not allocator.used(code):
+        return code  # canonical (or a wider number, kept as it is)
+    number = code[-2:]
+    if number.isdigit():
+        candidate = builder.make_code(header, cat_key, number)
+        if not allocator.used(candidate):
+            return candidate
+    return allocator.next_free(header, cat_key)
+
+
+def normalize_codes(dtcs):
+    # [(index, old code, new code or None if its block is full)] for the entries not in the canonical
+    # layout. Entries that already fit keep their codes, the others are fitted around them. Applied in
+    # order, no rename takes a code another entry still has.
+    allocator = CodeAllocator()
+    pending = []
+    for i, dtc in enumerate(dtcs):
+        code = str(dtc.get("code", ""))
+        if canonical_code(dtc, allocator) == code.upper() and not allocator.used(code):
+            allocator.mark(code)
+        else:
+            pending.append(i)
+    # A pending entry keeps holding its current code until its turn, so an earlier one isn't moved onto it
+    held = [str(dtcs[i].get("code", "")).upper() for i in pending]
+    for code in held:
+        allocator.mark(code)
+    renames = []
+    for i, code in zip(pending, held):
+        allocator.release(code)
+        new_code = canonical_code(dtcs[i], allocator)
+        if new_code is not None:
+            allocator.mark(new_code)
+        if new_code != dtcs[i].get("code"):
+            renames.append((i, dtcs[i].get("code"), new_code))
+    return renames
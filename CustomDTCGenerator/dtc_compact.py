@@ -0,0 +1,217 @@
+import array
+import copy
+
+import custom_dtc_builder as builder
+
+# Compact in-memory catalog for long-lived processes (the serve command's snapshot, bench --steps memory).
+#
+# A catalog loaded with load_dtcs is a list of dicts: every entry has its own dict, its own copy of the
+# header and category text (4 headers, 8 categories), its own fixes list and its own copy of every
+# fix, though most fixes are the same few sentences. CompactDTCs keeps the same entries column by
+# column instead:
+#   codes, titles, descriptions   one list each, the strings themselves
+#   headers, categories           one byte each, an index into the header / category names
+#   pinpoint tests, fixes         indexes into a pool that holds each distinct string once, the fixes
+#                                 of all entries back to back in one array plus where each entry's end
+# so an entry costs a few list slots and array cells besides its own text. Indexing hands back a
+# new dict in the usual JSON schema, the same keys in the same order, so json.dumps of the table's
+# entries is byte for byte the catalog it was built from. Entries that don't fit the columns (other
+# keys or key order, text that isn't text) are kept as they are.
+#
+# The pool's string -> index lookup is only built for changes after the table is made, and kept from
+# then on: the first change is O(pool), later appends and replacements are cheap. Deleting, and
+# replacing an entry with a different number of fixes, are O(n), and replaced fixes stay in the pool.
+# Meant for catalogs that are read far more than they are changed.
+
+FIELDS = ("code", "header", "category", "title", "description", "possible_fixes", "pinpoint_test")
+
+
+def _fits(dtc):
+    # True if dtc comes back out of the columns exactly as it went in
+    if type(dtc) is not dict or tuple(dtc) != FIELDS:
+        return False
+    fixes = dtc["possible_fixes"]
+    return (type(fixes) is list and all(type(fix) is str for fix in fixes)
+            and all(type(dtc[field]) is str for field in FIELDS if field != "possible_fixes"))
+
+
+class CompactDTCs:
+    def __init__(self, dtcs=()):
+        self._codes = []
+        self._titles = []
+        self._descriptions = []
+        self._headers = array.array("B")
+        self._categories = array.array("B")
+        self._pinpoints = array.array("I")   # pool index
+        self._fixes = array.array("I")       # pool indexes, every entry's fixes back to back
+        self._fix_ends = array.array("I")    # entry i's fixes end at _fixes[_fix_ends[i]]
+        self._header_names = list(builder.HEADERS.values())
+        self._category_names = list(builder.CATEGORIES.values())
+        self._pool = []                      # distinct fix and pinpoint test strings
+        self._pool_ids = {}                  # string -> pool index, None until the table is changed
+        self._odd = {}                       # position -> entry kept as it is
+        for dtc in dtcs:
+            self._append(dtc)
+        self._pool_ids = None  # as big as the pool, a table that is only read doesn't need it
+
+    # --- Adding entries ---
+
+    def _pooled(self, text):
+        pool_id = self._pool_ids.get(text)
+        if pool_id is None:
+            pool_id = self._pool_ids[text] = len(self._pool)
+            self._pool.append(text)
+        return pool_id
+
+    def _name_id(self, names, text):
+        # Index of a header / category name, added if it's new (None once there are 256)
+        try:
+            return names.index(text)
+        except ValueError:
+            if len(names) >= 256:
+                return None
+            names.append(text)
+            return len(names) - 1
+
+    def _columns(self, dtc, position):
+        # Column values of dtc; an entry that doesn't fit goes to _odd at position, with only its code in the columns
+        self._odd.pop(position, None)
+        if _fits(dtc):
+            header = self._name_id(self._header_names, dtc["header"])
+            category = self._name_id(self._category_names, dtc["category"])
+            if header is not None and category is not None:
+                return (dtc["code"], header, category, dtc["title"], dtc["description"],
+                        [self._pooled(fix) for fix in dtc["possible_fixes"]], self._pooled(dtc["pinpoint_test"]))
+        self._odd[position] = copy.deepcopy(dtc)
+        code = dtc.get("code") if isinstance(dtc, dict) else None
+        return code if isinstance(code, str) else None, 0, 0, "", "", [], self._pooled("")
+
+    def _start_adding(self):
+        # Built on the first change and kept, so later single changes don't rebuild it
+        if self._pool_ids is None:
+            self._pool_ids = {text: i for i, text in enumerate(self._pool)}
+
+    def extend(self, dtcs):
+        self._start_adding()
+        for dtc in dtcs:
+            self._append(dtc)
+
+    def append(self, dtc):
+        self._start_adding()
+        self._append(dtc)
+
+    def _append(self, dtc):
+        code, header, category, title, description, fixes, pinpoint = self._columns(dtc, len(self._codes))
+        self._codes.append(code)
+        self._headers.append(header)
+        self._categories.append(category)
+        self._titles.append(title)
+        self._descriptions.append(description)
+        self._fixes.extend(fixes)
+        self._fix_ends.append(len(self._fixes))
+        self._pinpoints.append(pinpoint)
+
+    def __setitem__(self, index, dtc):
+        index = self._position(index)
+        self._start_adding()
+        code, header, category, title, description, fixes, pinpoint = self._columns(dtc, index)
+        self._codes[index] = code
+        self._headers[index] = header
+        self._categories[index] = category
+        self._titles[index] = title
+        self._descriptions[index] = description
+        self._pinpoints[index] = pinpoint
+        start, end = self._fix_range(index)
+        if end - start != len(fixes):
+            self._shift_fixes(index, len(fixes) - (end - start))
+        self._fixes[start:start + len(fixes)] = array.array("I", fixes)
+
+    def __delitem__(self, index):
+        index = self._position(index)
+        start, end = self._fix_range(index)
+        self._shift_fixes(index, start - end)
+        del self._fix_ends[index]
+        for column in (self._codes, self._headers, self._categories, self._titles, self._descriptions,
+                       self._pinpoints):
+            del column[index]
+        if self._odd:
+            self._odd = {position - (position > index): dtc
+                         for position, dtc in self._odd.items() if position != index}
+
+    def _shift_fixes(self, index, delta):
+        # Makes room for (delta > 0) or drops (delta < 0) fixes at the end of entry index's fixes
+        end = self._fix_ends[index]
+        if delta > 0:
+            self._fixes[end:end] = array.array("I", bytes(4 * delta))
+        else:
+            del self._fixes[end + delta:end]
+        ends = self._fix_ends
+        for i in range(index, len(ends)):
+            ends[i] += delta
+
+    # --- Reading entries ---
+
+    def __len__(self):
+        return len(self._codes)
+
+    def _position(self, index):
+        if index < 0:
+            index += len(self._codes)
+        if not 0 <= index < len(self._codes):
+            raise IndexError("DTC index out of range")
+        return index
+
+    def _fix_range(self, index):
+        return (self._fix_ends[index - 1] if index else 0), self._fix_ends[index]
+
+    def __getitem__(self, index):
+        # A new dict (or list of dicts for a slice) in the JSON schema
+        if isinstance(index, slice):
+            return [self._entry(i) for i in range(*index.indices(len(self._codes)))]
+        return self._entry(self._position(index))
+
+    def _entry(self, i):
+        if self._odd and i in self._odd:
+            return copy.deepcopy(self._odd[i])
+        pool = self._pool
+        start, end = self._fix_range(i)
+        return {
+            "code": self._codes[i],
+            "header": self._header_names[self._headers[i]],
+            "category": self._category_names[self._categories[i]],
+            "title": self._titles[i],
+            "description": self._descriptions[i],
+            "possible_fixes": [pool[fix] for fix in self._fixes[start:end]],
+            "pinpoint_test": pool[self._pinpoints[i]],
+        }
+
+    def __iter__(self):
+        for i in range(len(self._codes)):
+            yield self._entry(i)
+
+    def to_list(self):
+        # The catalog as load_dtcs returns it
+        return list(self)
+
+    # Single fields without building the entry (None for a missing field)
+
+    def code(self, index):
+        return self._field(index, "code")
+
+    def header(self, index):
+        return self._field(index, "header")
+
+    def category(self, index):
+        return self._field(index, "category")
+
+    def _field(self, index, field):
+        # Same position rules as indexing, and an entry kept as it is answers for itself
+        index = self._position(index)
+        if self._odd and index in self._odd:
+            dtc = self._odd[index]
+            return dtc.get(field) if isinstance(dtc, dict) else None
+        if field == "code":
+            return self._codes[index]
+        if field == "header":
+            return self._header_names[self._headers[index]]
+        return self._category_names[self._categories[index]]
@@ -0,0 +1,314 @@
+import os
+import struct
+
+import custom_dtc_builder as builder
+from dtc_table import (TABLE_MAGIC, TABLE_VERSION, TABLE_FLAG_HASH, HEADER_FORMAT, ENTRY_FORMAT,
+                       CATEGORY_NONE, HASH_EMPTY, CODE_HEADERS, CODE_FIRST_DIGIT, pack_code, unpack_code, table_hash)
+
+# Compiles the catalog into the dtc_table.py binary table plus a C header/source pair (compile command).
+
+# Keys per perfect hash bucket, and free slots to leave (1/n of the keys). More free slots make the
+# hash faster to build, fewer make it smaller.
+HASH_BUCKET_KEYS = 4
+HASH_SLACK = 8
+
+
+def _string_pool():
+    pool = bytearray()
+    offsets = {}
+
+    def add(text):
+        # Offset of text in the pool, each distinct string is stored once
+        text = text or ""
+        if text not in offsets:
+            offsets[text] = len(pool)
+            pool.extend(text.encode("utf-8") + b"\0")
+        return offsets[text]
+    return pool, add
+
+
+def _place_buckets(keys, bucket_count, slot_count):
+    # One attempt at a given size, None if some bucket doesn't fit with any 16-bit seed
+    buckets = [[] for _ in range(bucket_count)]
+    for i, key in enumerate(keys):
+        buckets[table_hash(key, 0) % bucket_count].append(i)
+    seeds = [0] * bucket_count
+    slots = [HASH_EMPTY] * slot_count
+    for b in sorted(range(bucket_count), key=lambda b: -len(buckets[b])):
+        members = buckets[b]
+        if not members:
+            break
+        for seed in range(1, 0x10000):
+            positions = {table_hash(keys[i], seed) % slot_count for i in members}
+            if len(positions) == len(members) and all(slots[p] == HASH_EMPTY for p in positions):
+                break
+        else:
+            return None
+        for i in members:
+            slots[table_hash(keys[i], seed) % slot_count] = i
+        seeds[b] = seed
+    return seeds, slots
+
+
+def build_perfect_hash(keys):
+    # Hash and displace: keys are spread over buckets, then each bucket (largest first) gets the
+    # first seed that puts all of its keys in free slots. Returns (bucket seeds, slot -> key index).
+    if not keys:
+        return [0], [HASH_EMPTY]
+    bucket_count = max(1, (len(keys) + HASH_BUCKET_KEYS - 1) // HASH_BUCKET_KEYS)
+    slot_count = len(keys) + len(keys) // HASH_SLACK + 1
+    while True:
+        placed = _place_buckets(keys, bucket_count, slot_count)
+        if placed is not None:
+            return placed
+        slot_count += slot_count // 10 + 1
+
+
+def compile_table(dtcs, perfect_hash=True):
+    # Build the table in memory. Codes that can't be packed into 16 bits, and repeated codes, are
+    # left out and listed in table["skipped"] as (code, reason).
+    pool, add_string = _string_pool()
+    header_names = [add_string(builder.HEADERS.get(letter, letter)) for letter in CODE_HEADERS]
+    categories = list(builder.CATEGORIES.values())
+    for dtc in dtcs:
+        if dtc.get("category") and dtc["category"] not in categories:
+            categories.append(dtc["category"])
+    if len(categories) >= CATEGORY_NONE:
+        raise ValueError(f"Too many categories ({len(categories)}), the table has room for {CATEGORY_NONE}")
+    category_index = {name: i for i, name in enumerate(categories)}
+    category_names = [add_string(name) for name in categories]
+
+    packed, skipped = {}, []
+    for dtc in dtcs:
+        try:
+            code = pack_code(dtc.get("code", ""))
+        except ValueError as e:
+            skipped.append((dtc.get("code", ""), str(e)))
+            continue
+        if code in packed:
+            skipped.append((dtc["code"], f"Duplicate code {dtc['code']}, only the first one is compiled"))
+            continue
+        packed[code] = dtc
+
+    entries, fix_refs = [], []
+    for code in sorted(packed):
+        dtc = packed[code]
+        fixes = dtc.get("possible_fixes", [])
+        if len(fixes) > 255:
+            skipped.append((dtc["code"], f"{dtc['code']} has more than 255 possible fixes"))
+            continue
+        entries.append((code, category_index.get(dtc.get("category"), CATEGORY_NONE), len(fixes),
+                        add_string(dtc.get("title")), add_string(dtc.get("description")),
+                        add_string(dtc.get("pinpoint_test")), len(fix_refs)))
+        fix_refs.extend(add_string(fix) for fix in fixes)
+
+    buckets, slots = [], []
+    if perfect_hash:
+        buckets, slots = build_perfect_hash([entry[0] for entry in entries])
+    return {
+        "entries": entries,
+        "header_names": header_names,
+        "categories": categories,
+        "category_names": category_names,
+        "fix_refs": fix_refs,
+        "buckets": buckets,
+        "slots": slots,
+        "pool": bytes(pool),
+        "skipped": skipped
+    }
+
+
+def table_bytes(table):
+    # The binary file read by dtc_table.DTCTable
+    out = bytearray(HEADER_FORMAT.pack(
+        TABLE_MAGIC, TABLE_VERSION, TABLE_FLAG_HASH if table["buckets"] else 0,
+        len(table["entries"]), len(table["category_names"]), len(table["fix_refs"]),
+        len(table["pool"]), len(table["buckets"]), len(table["slots"])))
+    out += struct.pack("<4I", *table["header_names"])
+    out += struct.pack(f"<{len(table['category_names'])}I", *table["category_names"])
+    for entry in table["entries"]:
+        out += ENTRY_FORMAT.pack(*entry)
+    out += struct.pack(f"<{len(table['fix_refs'])}I", *table["fix_refs"])
+    if table["buckets"]:
+        out += struct.pack(f"<{len(table['buckets'])}H", *table["buckets"])
+        out += struct.pack(f"<{len(table['slots'])}H", *table["slots"])
+    return bytes(out + table["pool"])
+
+
+def flash_size(table):
+    # Bytes of const data the C source puts in flash
+    size = 16 + 4 * len(table["category_names"]) + ENTRY_FORMAT.size * len(table["entries"])
+    size += 4 * len(table["fix_refs"]) + 2 * (len(table["buckets"]) + len(table["slots"]))
+    return size + len(table["pool"])
+
+
+# --- C output ---
+
+def _c_string(raw):
+    # One pool string as a C literal. Everything outside printable ASCII is an octal escape.
+    out = []
+    for byte in raw:
+        ch = chr(byte)
+        if ch in "\"\\?":
+            out.append("\\" + ch)
+        elif 0x20 <= byte < 0x7F:
+            out.append(ch)
+        else:
+            out.append(f"\\{byte:03o}")
+    return '"' + "".join(out) + '\\0"'
+
+
+def _c_array(values, per_line=12):
+    # Body of a C array initializer. C has no empty arrays, so an empty list becomes a single 0.
+    values = list(values) or [0]
+    lines = []
+    for i in range(0, len(values), per_line):
+        lines.append("    " + ", ".join(f"{v}u" for v in values[i:i + per_line]) + ",")
+    return "\n".join(lines)
+
+
+def c_header(table, name, source_name):
+    guard = f"{name.upper()}_H"
+    return f"""/* {name}.h - generated by custom_dtc_builder.py compile from {source_name}, do not edit. */
+#ifndef {guard}
+#define {guard}
+
+#include <stdint.h>
+
+#define DTC_COUNT {len(table['entries'])}u
+#define DTC_CATEGORY_COUNT {len(table['category_names'])}u
+#define DTC_CATEGORY_NONE 0x{CATEGORY_NONE:02X}u
+#define DTC_PERFECT_HASH {1 if table['buckets'] else 0}
+
+/* Packed 16-bit code, SAE J2012 layout with the first digit stored as an offset from {CODE_FIRST_DIGIT}:
+ *   bits 15-14 header (P=0, C=1, B=2, U=3), bits 13-12 first digit - {CODE_FIRST_DIGIT}, bits 11-0 last three digits
+ * Example: DTC_PACK(0, 0x4, 0x101) is P4101. */
+#define DTC_PACK(header, first, rest) \\
+    ((uint16_t)(((header) & 3u) << 14 | (((first) - {CODE_FIRST_DIGIT}u) & 3u) << 12 | ((rest) & 0xFFFu)))
+#define DTC_HEADER(code) ((code) >> 14)
+
+typedef struct {{
+    uint16_t code;          /* packed code, entries are sorted by it */
+    uint8_t category;       /* index into dtc_category_names, or DTC_CATEGORY_NONE */
+    uint8_t fix_count;
+    uint32_t title;         /* offsets into dtc_strings */
+    uint32_t description;
+    uint32_t pinpoint_test;
+    uint32_t first_fix;     /* fixes are dtc_fix_refs[first_fix .. first_fix + fix_count - 1] */
+}} dtc_entry_t;
+
+extern const dtc_entry_t dtc_entries[];
+extern const uint32_t dtc_fix_refs[];
+extern const uint32_t dtc_header_names[4];
+extern const uint32_t dtc_category_names[];
+extern const char dtc_strings[];
+
+/* Entry for a packed code or NULL. dtc_find uses the perfect hash when there is one (O(1)),
+ * dtc_find_sorted is always a binary search (O(log n)). */
+const dtc_entry_t *dtc_find(uint16_t code);
+const dtc_entry_t *dtc_find_sorted(uint16_t code);
+
+#define DTC_STRING(offset) (&dtc_strings[(offset)])
+
+#endif /* {guard} */
+"""
+
+
+def c_source(table, name, source_name):
+    pool = table["pool"]
+    strings, start = [], 0
+    while start < len(pool):
+        end = pool.index(b"\0", start)
+        strings.append(f"    /* {start:>6} */ {_c_string(pool[start:end])}")
+        start = end + 1
+    entries = "\n".join(
+        "    {{0x{:04X}u, {}u, {}u, {}u, {}u, {}u, {}u}}, /* {} */".format(*entry, dtc_code)
+        for entry, dtc_code in zip(table["entries"], (unpack_code(e[0]) for e in table["entries"])))
+    out = [f"""/* {name}.c - generated by custom_dtc_builder.py compile from {source_name}, do not edit. */
+#include <stddef.h>
+#include "{name}.h"
+
+const uint32_t dtc_header_names[4] = {{
+{_c_array(table['header_names'])}
+}};
+
+const uint32_t dtc_category_names[] = {{
+{_c_array(table['category_names'])}
+}};
+
+const dtc_entry_t dtc_entries[] = {{
+{entries or '    {0u, 0u, 0u, 0u, 0u, 0u, 0u},'}
+}};
+
+const uint32_t dtc_fix_refs[] = {{
+{_c_array(table['fix_refs'])}
+}};
+
+const char dtc_strings[{max(len(pool), 1)}] =
+{chr(10).join(strings) or '    ""'};
+
+const dtc_entry_t *dtc_find_sorted(uint16_t code)
+{{
+    size_t lo = 0, hi = DTC_COUNT;
+    while (lo < hi) {{
+        size_t mid = lo + (hi - lo) / 2;
+        if (dtc_entries[mid].code < code) {{
+            lo = mid + 1;
+        }} else {{
+            hi = mid;
+        }}
+    }}
+    return (lo < DTC_COUNT && dtc_entries[lo].code == code) ? &dtc_entries[lo] : NULL;
+}}
+"""]
+    if table["buckets"]:
+        out.append(f"""
+#define DTC_HASH_BUCKETS {len(table['buckets'])}u
+#define DTC_HASH_SLOTS {len(table['slots'])}u
+#define DTC_HASH_EMPTY 0x{HASH_EMPTY:04X}u
+
+static const uint16_t dtc_hash_buckets[DTC_HASH_BUCKETS] = {{
+{_c_array(table['buckets'])}
+}};
+
+static const uint16_t dtc_hash_slots[DTC_HASH_SLOTS] = {{
+{_c_array(table['slots'])}
+}};
+
+static uint32_t dtc_hash(uint32_t key, uint32_t seed)
+{{
+    uint32_t h = key ^ (seed * 0x9E3779B1u);
+    h *= 0x85EBCA6Bu;
+    return h ^ (h >> 13);
+}}
+
+const dtc_entry_t *dtc_find(uint16_t code)
+{{
+    uint16_t seed = dtc_hash_buckets[dtc_hash(code, 0u) % DTC_HASH_BUCKETS];
+    uint16_t index = dtc_hash_slots[dtc_hash(code, seed) % DTC_HASH_SLOTS];
+    return (index != DTC_HASH_EMPTY && dtc_entries[index].code == code) ? &dtc_entries[index] : NULL;
+}}
+""")
+    else:
+        out.append("""
+const dtc_entry_t *dtc_find(uint16_t code)
+{
+    return dtc_find_sorted(code);
+}
+""")
+    return "".join(out)
+
+
+def write_compiled(dtcs, output_dir=".", name="dtc_table", perfect_hash=True, source_name=None):
+    # Writes <name>.bin, <name>.h and <name>.c, returns (table, [paths])
+    table = compile_table(dtcs, perfect_hash)
+    source_name = os.path.basename(source_name or builder.JSON_FILE)
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for ext, data in (("bin", table_bytes(table)),
+                      ("h", c_header(table, name, source_name).encode("utf-8")),
+                      ("c", c_source(table, name, source_name).encode("utf-8"))):
+        path = os.path.join(output_dir, f"{name}.{ext}")
+        builder.dtc_storage.atomic_write_bytes(path, data)
+        paths.append(path)
+    return table, paths
@@ -0,0 +1,174 @@
+import hashlib
+import json
+
+import dtc_storage
+
+# Diff and three-way merge between catalog versions (diff and merge commands in custom_dtc_builder.py),
+# for teams that each extend their own copy of a catalog.
+#
+# Entries are matched by code. Every entry gets a content hash, so two catalogs are compared in one
+# pass over each and only entries whose hash differs are compared field by field. Changes come out as
+# a plain dict that can be saved as JSON:
+#   {"added": [dtc], "removed": [dtc], "unchanged": n, "duplicates": [code],
+#    "changed": [{"code", "old_hash", "new_hash", "fields": {field: {"old", "new"}},
+#                 "fixes": {"added": [fix], "removed": [fix]}}]}
+# ("fixes" is only there when possible_fixes changed, and is empty lists if they were only reordered.)
+#
+# The merge is merge_catalogs from dtc_storage (the same one saves use) with a field level resolver:
+# when both sides changed the same DTC, fields only one side changed are combined, fixes either side
+# added are kept and fixes either side removed are dropped. Only a field both sides changed differently,
+# or a DTC one side deleted and the other changed, is a conflict.
+
+
+_CANONICAL = json.JSONEncoder(sort_keys=True, separators=(",", ":"))
+
+
+def entry_hash(dtc):
+    # Same content, same hash, whatever the key order
+    return hashlib.sha1(_CANONICAL.encode(dtc).encode("utf-8")).hexdigest()
+
+
+def load_catalog(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _index(dtcs, duplicates):
+    # code -> (hash, dtc), first entry wins like everywhere else in the builder
+    index = {}
+    for dtc in dtcs:
+        code = dtc.get("code")
+        if code in index:
+            duplicates.add(code)
+        else:
+            index[code] = (entry_hash(dtc), dtc)
+    return index
+
+
+def _fix_changes(old, new):
+    # Fixes added and removed, counting repeats (a fix listed twice and now once was removed once)
+    counts = {}
+    for fix in old:
+        counts[fix] = counts.get(fix, 0) + 1
+    added = []
+    for fix in new:
+        if counts.get(fix):
+            counts[fix] -= 1
+        else:
+            added.append(fix)
+    removed = [fix for fix, count in counts.items() for _ in range(count)]
+    return {"added": added, "removed": removed}
+
+
+def diff_entry(old, new):
+    # Field changes between two versions of one DTC
+    fields = {}
+    for field in dict.fromkeys([*old, *new]):
+        if old.get(field) != new.get(field):
+            fields[field] = {"old": old.get(field), "new": new.get(field)}
+    change = {"code": new.get("code", old.get("code")), "old_hash": entry_hash(old), "new_hash": entry_hash(new),
+              "fields": fields}
+    if "possible_fixes" in fields:
+        change["fixes"] = _fix_changes(old.get("possible_fixes") or [], new.get("possible_fixes") or [])
+    return change
+
+
+def diff_catalogs(old, new):
+    # Change set turning catalog old into catalog new
+    duplicates = set()
+    old_by = _index(old, duplicates)
+    new_by = _index(new, duplicates)
+    changes = {"added": [], "removed": [], "changed": [], "unchanged": 0}
+    for code, (new_hash, dtc) in new_by.items():
+        if code not in old_by:
+            changes["added"].append(dtc)
+        elif old_by[code][0] == new_hash:
+            changes["unchanged"] += 1
+        else:
+            changes["changed"].append(diff_entry(old_by[code][1], dtc))
+    changes["removed"] = [dtc for code, (_, dtc) in old_by.items() if code not in new_by]
+    changes["duplicates"] = sorted(duplicates, key=str)
+    return changes
+
+
+def _merge_fixes(base, ours, theirs):
+    # Ours in order minus what theirs removed, then what theirs added
+    removed = set(base) - set(theirs)
+    merged = [fix for fix in ours if fix not in removed]
+    merged.extend(fix for fix in theirs if fix not in base and fix not in merged)
+    return merged
+
+
+def merge3(base, ours, theirs, resolve=None):
+    # Three-way merge of whole catalogs. Returns (merged, conflicts). resolve(code, ours, theirs) -> "M"
+    # or "T" (like ask_conflict) picks the side for each conflicting DTC; without it ours is kept.
+    # conflicts: [{"code", "field" (None if one side deleted the DTC), "base", "ours", "theirs", "kept"}]
+    conflicts = []
+    missing = object()
+
+    def resolve_entry(code, o, t):
+        b = base_by.get(code)
+        if o is None or t is None:
+            side = resolve(code, o, t) if resolve else "M"
+            conflicts.append({"code": code, "field": None, "base": b, "ours": o, "theirs": t,
+                              "kept": "theirs" if side == "T" else "ours"})
+            return t if side == "T" else o
+        b = b or {}
+        merged, clashes = {}, []
+        for field in dict.fromkeys([*o, *t]):
+            bv, ov, tv = b.get(field, missing), o.get(field, missing), t.get(field, missing)
+            if ov == tv or tv == bv:
+                value = ov
+            elif ov == bv:
+                value = tv
+            elif field == "possible_fixes" and all(isinstance(v, list) for v in (ov, tv)):
+                value = _merge_fixes(bv if isinstance(bv, list) else [], ov, tv)
+            else:
+                clashes.append(field)
+                value = ov
+            if value is not missing:
+                merged[field] = value
+        if clashes:
+            side = resolve(code, o, t) if resolve else "M"
+            for field in clashes:
+                if side == "T":
+                    if field in t:
+                        merged[field] = t[field]
+                    else:
+                        merged.pop(field, None)
+                conflicts.append({"code": code, "field": field, "base": b.get(field), "ours": o.get(field),
+                                  "theirs": t.get(field), "kept": "theirs" if side == "T" else "ours"})
+        return merged
+
+    base_by = {}
+    for dtc in base:
+        base_by.setdefault(dtc.get("code"), dtc)
+    merged = dtc_storage.merge_catalogs(base, ours, theirs, resolve_entry)
+    return merged, conflicts
+
+
+def summary(changes):
+    return (f"{len(changes['added'])} added, {len(changes['removed'])} removed, "
+            f"{len(changes['changed'])} changed, {changes['unchanged']} unchanged")
+
+
+def print_diff(changes):
+    for dtc in changes["added"]:
+        print(f"+ {dtc.get('code')}  {dtc.get('title', '')}")
+    for dtc in changes["removed"]:
+        print(f"- {dtc.get('code')}  {dtc.get('title', '')}")
+    for change in changes["changed"]:
+        print(f"~ {change['code']}")
+        for field, values in change["fields"].items():
+            if field == "possible_fixes":
+                for fix in change["fixes"]["removed"]:
+                    print(f"    fix - {fix}")
+                for fix in change["fixes"]["added"]:
+                    print(f"    fix + {fix}")
+                if not change["fixes"]["added"] and not change["fixes"]["removed"]:
+                    print("    fixes reordered")
+            else:
+                print(f"    {field}: {values['old']!r} -> {values['new']!r}")
+    if changes["duplicates"]:
+        print(f"Duplicate codes (only the first of each was compared): {', '.join(map(str, changes['duplicates']))}")
+    print(summary(changes))
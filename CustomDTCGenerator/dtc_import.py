@@ -0,0 +1,407 @@
+import csv
+import gzip
+import hashlib
+import itertools
+import json
+import os
+import re
+
+import custom_dtc_builder as builder
+import dtc_codes
+import dtc_trace
+
+# Importer for external DTC lists (import command in custom_dtc_builder.py): SAE J2012-style code
+# tables, vendor CSV / JSON dumps, other catalogs.
+#
+# Reads CSV (or TSV), JSON Lines and JSON arrays, plain or gzipped, one row at a time: CSV and JSON
+# Lines line by line, JSON arrays with an incremental parser that decodes one element at a time out of
+# IMPORT_BLOCK_CHARS blocks. Only the current block and one batch of rows are in memory, so a
+# million-row file imports like a small one.
+#
+# Columns are matched to the catalog fields by name (see FIELD_ALIASES, or --map title="Short Text").
+# A row needs a code. The header comes from the code letter when there is no header column, the
+# category from the code when it is in the canonical layout (P41xx is x41xx), else from --category.
+# Rows that can't be mapped are rejected with a reason and the import carries on.
+#
+# Duplicates are found with a hash index: code -> (position, hash of the content) for every entry in
+# the catalog, and every row imported so far. A row whose code is new is added, one with the same
+# code and content is skipped, and one with the same code but other content is skipped or replaces
+# the entry (on_existing). Journal and SQLite catalogs are written every IMPORT_BATCH rows, so an
+# interrupted import keeps what it committed; a JSON catalog is one file and is saved once at the end.
+
+IMPORT_BATCH = 5000
+IMPORT_BLOCK_CHARS = 1024 * 1024
+IMPORT_MAX_ENTRY_CHARS = 16 * 1024 * 1024  # a JSON element bigger than this is a broken file
+REPORT_LIMIT = 1000  # rejected rows / changed codes listed in the report
+
+FIELDS = ("code", "header", "category", "title", "description", "possible_fixes", "pinpoint_test")
+
+# Column names recognised for each field, compared lower case with spaces and dashes as "_"
+FIELD_ALIASES = {
+    "code": ("code", "dtc", "dtc_code", "fault_code", "trouble_code", "id"),
+    "header": ("header", "system", "code_type"),
+    "category": ("category", "group", "subsystem"),
+    "title": ("title", "name", "short_description", "summary", "short_text", "label"),
+    "description": ("description", "desc", "long_description", "details", "text", "meaning"),
+    "possible_fixes": ("possible_fixes", "fixes", "fix", "repair", "repairs", "remedy", "possible_causes", "causes"),
+    "pinpoint_test": ("pinpoint_test", "pinpoint", "test"),
+}
+
+FORMATS = ("csv", "jsonl", "json")
+
+_SPACE = re.compile(r"[ \t\n\r]*")
+_NUMBER_TAIL = re.compile(r"[0-9.eE+\-]*")
+_CANONICAL = json.JSONEncoder(sort_keys=True, separators=(",", ":"))
+_DIGEST_MASK = (1 << 64) - 1
+
+
+def _column_key(name):
+    return re.sub(r"[\s\-]+", "_", str(name).strip().lower())
+
+
+def guess_format(path):
+    # "csv", "jsonl" or "json" from the file name (.gz is looked through)
+    name = path[:-3] if path.endswith(".gz") else path
+    ext = os.path.splitext(name)[1].lower()
+    if ext in (".csv", ".tsv", ".txt"):
+        return "csv"
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if ext == ".json":
+        return "json"
+    raise ValueError(f"Can't tell the format of {path} from its name, pass --format ({'/'.join(FORMATS)})")
+
+
+def open_text(path):
+    # Text file, gzipped or not. utf-8-sig drops the byte order mark spreadsheet exports start with.
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8-sig", newline="")
+    return open(path, "r", encoding="utf-8-sig", newline="")
+
+
+# --- Readers: each yields one dict per row ---
+
+def iter_csv(f, delimiter=None):
+    # First row is the column names. Without a delimiter, the most common of , ; and tab in it.
+    first = f.readline()
+    if not first:
+        return
+    if delimiter is None:
+        delimiter = max((",", ";", "\t"), key=first.count)
+    reader = csv.reader(itertools.chain([first], f), delimiter=delimiter)
+    columns = next(reader)
+    for row in reader:
+        if any(cell.strip() for cell in row):
+            yield dict(zip(columns, row))
+
+
+def iter_jsonl(f):
+    for number, line in enumerate(f, 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"Line {number}: {e}") from None
+
+
+def iter_json_array(f, block_chars=IMPORT_BLOCK_CHARS):
+    # Elements of a top-level JSON array, decoded one at a time as the file is read in blocks.
+    # An element cut off by the end of a block is decoded again once the next block is in.
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+    count = 0
+    state = "start"  # then "first" (after "["), "value" (after ","), "next" (after a value)
+    while True:
+        pos = _SPACE.match(buf, pos).end()
+        need_more = pos == len(buf)
+        if not need_more:
+            if state == "start":
+                if buf[pos] != "[":
+                    raise ValueError("Expected a JSON array ([...]) at the top level")
+                pos += 1
+                state = "first"
+                continue
+            if state == "next":
+                char = buf[pos]
+                pos += 1
+                if char == "]":
+                    return
+                if char != ",":
+                    raise ValueError(f"Expected ',' or ']' between array elements, found {char!r}")
+                state = "value"
+                continue
+            if state == "first" and buf[pos] == "]":
+                return
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as e:
+                if eof or len(buf) - pos > IMPORT_MAX_ENTRY_CHARS:
+                    raise ValueError(f"Array element {count + 1}: {e.msg}") from None
+                need_more = True
+            else:
+                # A number near the end of the block may go on in the next one ("2" of "2.5")
+                need_more = (not eof and isinstance(value, (int, float))
+                             and _NUMBER_TAIL.match(buf, end).end() == len(buf))
+                if not need_more:
+                    pos = end
+                    state = "next"
+                    count += 1
+                    yield value
+                    continue
+        if eof:
+            raise ValueError("The JSON array ends before its closing ]")
+        block = f.read(block_chars)
+        eof = not block
+        buf = buf[pos:] + block
+        pos = 0
+
+
+def iter_records(path, fmt=None):
+    # Rows of an import file as dicts. The file is opened (and the format checked) straight away,
+    # so a bad path fails before anything else is done.
+    fmt = fmt or guess_format(path)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown import format '{fmt}', expected one of: {', '.join(FORMATS)}")
+    f = open_text(path)
+    if fmt == "csv":
+        name = path[:-3] if path.endswith(".gz") else path
+        rows = iter_csv(f, "\t" if name.lower().endswith(".tsv") else None)
+    else:
+        rows = iter_jsonl(f) if fmt == "jsonl" else iter_json_array(f)
+    return _closing(f, rows)
+
+
+def _closing(f, rows):
+    with f:
+        yield from rows
+
+
+# --- Mapping rows onto the catalog fields ---
+
+class ColumnMap:
+    def __init__(self, columns=None, category=None, fix_separator="|"):
+        # columns: {field: column name} on top of FIELD_ALIASES. category: category for rows that
+        # have none and whose code doesn't give one. fix_separator splits a text fixes column
+        # (line breaks always do).
+        self.columns = {}
+        for field, column in (columns or {}).items():
+            if field not in FIELDS:
+                raise ValueError(f"Unknown field '{field}', expected one of: {', '.join(FIELDS)}")
+            self.columns[field] = column
+        self.category = builder.parse_category(category) if category else None
+        self._fix_split = re.compile("|".join([re.escape(fix_separator), r"\r?\n"]) if fix_separator else r"\r?\n")
+        self._plans = {}  # tuple of row keys -> [(field, key)]
+        self._header_keys = {}  # header / category text -> key, None if unknown
+        self._category_keys = {}
+
+    def _plan(self, keys):
+        plan = self._plans.get(keys)
+        if plan is None:
+            by_name = {}
+            for key in keys:
+                by_name.setdefault(_column_key(key), key)
+            plan = []
+            for field in FIELDS:
+                if field in self.columns:
+                    names = [self.columns[field]]
+                else:
+                    names = FIELD_ALIASES[field]
+                for name in names:
+                    key = name if name in keys else by_name.get(_column_key(name))
+                    if key is not None:
+                        plan.append((field, key))
+                        break
+            if len(self._plans) < 1000:
+                self._plans[keys] = plan
+        return plan
+
+    def to_dtc(self, row):
+        # Catalog entry for one row, ValueError if it can't be mapped
+        if not isinstance(row, dict):
+            raise ValueError("Not an object with named fields")
+        values = {}
+        for field, key in self._plan(tuple(row)):
+            value = row[key]
+            if value is not None:
+                values[field] = value if field == "possible_fixes" else str(value).strip()
+
+        code = values.get("code", "").upper()
+        if not code:
+            raise ValueError("No code")
+        header = values.get("header") or code[0]
+        header_key = _resolve(self._header_keys, builder.parse_header, header)
+        if header_key is None:
+            raise ValueError(f"Unknown header '{header}'")
+        if values.get("category"):
+            cat_key = _resolve(self._category_keys, builder.parse_category, values["category"])
+            if cat_key is None:
+                raise ValueError(f"Unknown category '{values['category']}'")
+        else:
+            parsed = dtc_codes.parse_code(code)
+            cat_key = parsed[1] if parsed else self.category
+            if cat_key is None:
+                raise ValueError(f"No category for {code} (pass --category)")
+
+        fixes = values.get("possible_fixes", [])
+        if isinstance(fixes, str):
+            fixes = self._fix_split.split(fixes)
+        elif not isinstance(fixes, list):
+            fixes = [fixes]
+        return {
+            "code": code,
+            "header": builder.HEADERS[header_key],
+            "category": builder.CATEGORIES[cat_key],
+            "title": values.get("title", ""),
+            "description": values.get("description", ""),
+            "possible_fixes": [str(fix).strip() for fix in fixes if fix is not None and str(fix).strip()],
+            "pinpoint_test": values.get("pinpoint_test", ""),
+        }
+
+
+def _resolve(cache, resolve, value):
+    # resolve(value) remembered, the same few headers and categories come up on every row
+    if value in cache:
+        return cache[value]
+    try:
+        key = resolve(value)
+    except ValueError:
+        key = None
+    if len(cache) < 1000:
+        cache[value] = key
+    return key
+
+
+def parse_column_map(pairs):
+    # ["title=Short Text", ...] -> {"title": "Short Text"}
+    columns = {}
+    for pair in pairs or []:
+        field, sep, column = pair.partition("=")
+        if not sep or not field.strip():
+            raise ValueError(f"Expected FIELD=COLUMN, got '{pair}'")
+        columns[field.strip()] = column.strip()
+    return columns
+
+
+# --- Deduplication ---
+
+def content_digest(dtc):
+    # 64-bit hash of the content, the same whatever the key order
+    return int.from_bytes(hashlib.blake2b(_CANONICAL.encode(dtc).encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashIndex:
+    # code -> position << 64 | content digest, for the first entry with each code. One int per code
+    # rather than a tuple keeps the index of a million-entry catalog small.
+    def __init__(self, dtcs=()):
+        self._entries = {}
+        self.size = 0
+        for dtc in dtcs:
+            self.add(dtc)
+
+    def add(self, dtc, digest=None):
+        # dtc is appended to the catalog
+        code = dtc.get("code")
+        if code not in self._entries:
+            self._entries[code] = self.size << 64 | (content_digest(dtc) if digest is None else digest)
+        self.size += 1
+
+    def get(self, code):
+        # (position, content digest) or None
+        packed = self._entries.get(code)
+        return None if packed is None else (packed >> 64, packed & _DIGEST_MASK)
+
+    def replace(self, position, dtc, digest=None):
+        self._entries[dtc.get("code")] = position << 64 | (content_digest(dtc) if digest is None else digest)
+
+
+# --- Import ---
+
+def import_file(path, fmt=None, column_map=None, on_existing="skip", batch_size=IMPORT_BATCH, dry_run=False,
+                progress=None):
+    # Imports path into the current catalog (builder.JSON_FILE / STORAGE_MODE) and returns the report:
+    #   {"rows", "added", "unchanged", "changed", "replaced", "rejected", "batches",
+    #    "changed_codes": [code], "rejections": [{"row", "message"}]}
+    # on_existing: "skip" or "replace" rows whose code is in the catalog with other content.
+    # dry_run only counts. progress(report) is called after every batch.
+    column_map = column_map or ColumnMap()
+    report = {"rows": 0, "added": 0, "unchanged": 0, "changed": 0, "replaced": 0, "rejected": 0, "batches": 0,
+              "changed_codes": [], "rejections": []}
+    records = iter_records(path, fmt)
+    if builder.STORAGE_MODE == "sqlite":
+        dtcs = None  # the catalog stays in the database, only the index is in memory
+        with dtc_trace.stage("import.index"):
+            index = HashIndex(builder.get_store().iter_all())
+    else:
+        dtcs = builder.load_dtcs(quiet=True, track=True)
+        with dtc_trace.stage("import.index"):
+            index = HashIndex(dtcs)
+    batch = []
+
+    def commit():
+        nonlocal index
+        report["batches"] += 1
+        if not dry_run and builder.STORAGE_MODE != "json":
+            if builder.persist_changes(dtcs, batch, quiet=True, compact=False):
+                index = HashIndex(dtcs)  # merged with someone else's changes, positions moved
+        batch.clear()
+        if progress:
+            progress(report)
+
+    with dtc_trace.stage("import", file=path):
+        for row, record in enumerate(records, 1):
+            report["rows"] = row
+            try:
+                dtc = column_map.to_dtc(record)
+            except ValueError as e:
+                report["rejected"] += 1
+                if len(report["rejections"]) < REPORT_LIMIT:
+                    report["rejections"].append({"row": row, "message": str(e)})
+                continue
+            digest = content_digest(dtc)
+            found = index.get(dtc["code"])
+            if found is None:
+                index.add(dtc, digest)
+                report["added"] += 1
+                change = {"op": "append", "dtc": dtc}
+            elif found[1] == digest:
+                report["unchanged"] += 1
+                continue
+            else:
+                report["changed"] += 1
+                if len(report["changed_codes"]) < REPORT_LIMIT:
+                    report["changed_codes"].append(dtc["code"])
+                if on_existing != "replace":
+                    continue
+                index.replace(found[0], dtc, digest)
+                report["replaced"] += 1
+                change = {"op": "set", "index": found[0], "dtc": dtc}
+            if dtcs is not None and not dry_run:
+                builder.dtc_storage.apply_journal_op(dtcs, change)
+            batch.append(change)
+            if len(batch) >= batch_size:
+                commit()
+        if batch:
+            commit()
+        dtc_trace.note(entries=report["rows"], added=report["added"], replaced=report["replaced"])
+
+    if not dry_run and (report["added"] or report["replaced"]):
+        if builder.STORAGE_MODE == "json":
+            builder.save_dtcs(dtcs, quiet=True)
+        else:
+            builder.compact_storage(dtcs)
+    return report
+
+
+def print_report(report, dry_run=False, limit=20):
+    for rejection in report["rejections"][:limit]:
+        print(f"Rejected row {rejection['row']}: {rejection['message']}")
+    if report["rejected"] > limit:
+        print(f"... and {report['rejected'] - limit} more rejected row(s)")
+    if report["changed"]:
+        codes = ", ".join(report["changed_codes"][:limit]) + (" ..." if report["changed"] > limit else "")
+        print(f"{report['changed']} row(s) have a code already in the catalog with other content: {codes}")
+    replaced = f", {report['replaced']} replaced" if report["replaced"] else ""
+    print(f"Read {report['rows']} row(s): {report['added']} new, {report['unchanged']} already in the catalog, "
+          f"{report['changed']} different from the catalog{replaced}, {report['rejected']} rejected")
+    if dry_run:
+        print("Nothing saved (dry run)")
@@ -0,0 +1,284 @@
+import datetime
+import gzip
+import re
+import time
+
+import custom_dtc_builder as builder
+from dtc_table import CODE_HEADERS, pack_code, unpack_code
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # optional (install.py), the pure Python path gives the same results, just slower
+
+# Counts OBD-II Mode 03/07/0A DTCs in candump logs, plain or gzipped (decode-log command).
+
+# Diagnostic response IDs: 11-bit 7E8-7EF and 29-bit 18DAF1xx (ISO 15765-4)
+DIAG_RESPONSE_IDS = [*range(0x7E8, 0x7F0), *range(0x18DAF100, 0x18DAF200)]
+# OBD-II response service -> mode bit and name
+DTC_SERVICES = {0x43: (1, "stored"), 0x47: (2, "pending"), 0x4A: (4, "permanent")}
+LOG_BLOCK_BYTES = 8 * 1024 * 1024
+# DTCs collected before they are added to the totals
+DECODE_BATCH = 65536
+
+# Patterns start at the space before the CAN ID, the regex skips ahead to those far faster than to line starts
+_COMPACT_FRAME = rb"[ \t](%s)#(?:#[0-9A-Fa-f])?([0-9A-Fa-f]*)"
+_SCREEN_FRAME = rb"[ \t](%s)[ \t]+\[(\d+)\][ \t]+([0-9A-Fa-f \t]*)"
+
+
+def j2012_code(value):
+    # 16-bit DTC as the vehicle sent it and a generic scan tool shows it (0x0101 -> "P0101"). ECUs
+    # that send this catalog's codes count the first digit from 4, see dtc_table.unpack_code.
+    return f"{CODE_HEADERS[value >> 14]}{value >> 12 & 3}{value & 0xFFF:03X}"
+
+
+def parse_ids(text):
+    # "7E8,7E9,18DAF100-18DAF1FF" -> [ids]
+    ids = []
+    for part in text.split(","):
+        low, _, high = part.strip().partition("-")
+        ids.extend(range(int(low, 16), int(high or low, 16) + 1))
+    return ids
+
+
+def _id_pattern(ids):
+    # Alternation for the IDs as candump writes them (3 hex digits for 11-bit, 8 for 29-bit),
+    # grouped by all but the last digit so 256 IDs cost 16 alternatives
+    groups = {}
+    for can_id in sorted(set(ids)):
+        text = f"{can_id:03X}" if can_id <= 0x7FF else f"{can_id:08X}"
+        groups.setdefault(text[:-1], []).append(text[-1])
+    return b"|".join(f"{prefix}[{''.join(last)}]".encode("ascii") for prefix, last in groups.items())
+
+
+def _timestamp(block, end):
+    # Timestamp of the line a frame match starts in. candump -t a/d/z timestamps are seconds,
+    # -t A is a date, no timestamp gives nan.
+    line = block[block.rfind(b"\n", 0, end) + 1:end].strip()
+    if not line.startswith(b"("):
+        return float("nan")
+    text = line[1:line.find(b")")]
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.datetime.fromisoformat(text.decode("ascii").strip()).timestamp()
+
+
+def _blocks(path):
+    # Whole lines, about LOG_BLOCK_BYTES at a time
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        rest = b""
+        while True:
+            block = f.read(LOG_BLOCK_BYTES)
+            if not block:
+                break
+            block = rest + block
+            end = block.rfind(b"\n") + 1
+            rest = block[end:]
+            yield block[:end]
+        if rest:
+            yield rest + b"\n"
+
+
+class DTCLogDecoder:
+    def __init__(self, ids=DIAG_RESPONSE_IDS, use_numpy=True):
+        id_pattern = _id_pattern(ids)
+        self._compact = re.compile(_COMPACT_FRAME % id_pattern, re.I)
+        self._screen = re.compile(_SCREEN_FRAME % id_pattern, re.I)
+        self.numpy = numpy if use_numpy else None
+        if self.numpy:
+            self.counts = numpy.zeros(65536, numpy.int64)
+            self.first = numpy.full(65536, numpy.nan)
+            self.last = numpy.full(65536, numpy.nan)
+            self.modes = numpy.zeros(65536, numpy.uint8)
+        else:
+            self.counts, self.first, self.last, self.modes = {}, {}, {}, {}
+        self._pending = {}  # CAN ID -> [timestamp, length, bytearray, next sequence] of an ISO-TP transfer in progress
+        self._batch = bytearray()  # DTC bytes waiting to be added
+        self._batch_times = []     # (timestamp, mode bit, DTC count) per response in the batch
+        self.frames = 0
+        self.responses = 0
+        self.bytes_read = 0
+
+    def decode_file(self, path):
+        pattern = None
+        for block in _blocks(path):
+            self.bytes_read += len(block)
+            if pattern is None:
+                # One format per file, decided by the first frame line
+                pattern = self._screen if re.search(rb"\]\s+[0-9A-Fa-f]{2}", block.split(b"\n", 1)[0]) else self._compact
+            for match in pattern.finditer(block):
+                data = bytes.fromhex(match.group(match.lastindex).decode("ascii"))
+                if pattern is self._screen:
+                    data = data[:int(match.group(2))]
+                self.frame(_timestamp(block, match.start()), match.group(1).upper(), data)
+        self.flush()
+
+    def frame(self, ts, can_id, data):
+        # One frame from a diagnostic response ID, ISO-TP reassembly
+        if not data:
+            return
+        self.frames += 1
+        kind = data[0] >> 4
+        if kind == 0:  # single frame
+            length = data[0] & 0xF
+            if length == 0 and len(data) > 8:  # CAN FD single frame, length in the next byte
+                self.response(ts, data[2:2 + data[1]])
+            else:
+                self.response(ts, data[1:1 + length])
+        elif kind == 1:  # first frame, only followed if it is a DTC response
+            self._pending.pop(can_id, None)
+            if len(data) > 2 and data[2] in DTC_SERVICES:
+                self._pending[can_id] = [ts, (data[0] & 0xF) << 8 | data[1], bytearray(data[2:]), 1]
+        elif kind == 2 and can_id in self._pending:  # consecutive frame
+            transfer = self._pending[can_id]
+            if data[0] & 0xF != transfer[3]:
+                del self._pending[can_id]  # lost a frame, drop the transfer
+                return
+            transfer[2].extend(data[1:])
+            transfer[3] = (transfer[3] + 1) & 0xF
+            if len(transfer[2]) >= transfer[1]:
+                del self._pending[can_id]
+                self.response(transfer[0], bytes(transfer[2][:transfer[1]]))
+
+    def response(self, ts, payload):
+        # A complete OBD-II response: service, DTC count (on CAN), then 2 bytes per DTC
+        if len(payload) < 2 or payload[0] not in DTC_SERVICES:
+            return
+        self.responses += 1
+        dtc_bytes = payload[2:2 + 2 * payload[1]]
+        dtc_bytes = dtc_bytes[:len(dtc_bytes) & ~1]
+        if not dtc_bytes:
+            return
+        self._batch += dtc_bytes
+        self._batch_times.append((ts, DTC_SERVICES[payload[0]][0], len(dtc_bytes) // 2))
+        if len(self._batch) >= 2 * DECODE_BATCH:
+            self.flush()
+
+    def flush(self):
+        # Add the batch to the totals
+        if not self._batch:
+            return
+        times, mode_bits, counts = zip(*self._batch_times)
+        if self.numpy:
+            np = self.numpy
+            codes = np.frombuffer(bytes(self._batch), ">u2").astype(np.intp)
+            stamps = np.repeat(np.array(times, np.float64), counts)
+            bits = np.repeat(np.array(mode_bits, np.uint8), counts)
+            keep = codes != 0  # 0x0000 pads a response, it isn't a DTC
+            codes, stamps, bits = codes[keep], stamps[keep], bits[keep]
+            self.counts += np.bincount(codes, minlength=65536)
+            np.fmin.at(self.first, codes, stamps)  # fmin/fmax skip logs without timestamps (nan)
+            np.fmax.at(self.last, codes, stamps)
+            np.bitwise_or.at(self.modes, codes, bits)
+        else:
+            batch = self._batch
+            i = 0
+            for ts, bit, count in self._batch_times:
+                for _ in range(count):
+                    code = batch[i] << 8 | batch[i + 1]
+                    i += 2
+                    if not code:
+                        continue
+                    self.counts[code] = self.counts.get(code, 0) + 1
+                    if ts == ts:  # not nan
+                        if code not in self.first or ts < self.first[code]:
+                            self.first[code] = ts
+                        if code not in self.last or ts > self.last[code]:
+                            self.last[code] = ts
+                    self.modes[code] = self.modes.get(code, 0) | bit
+        self._batch = bytearray()
+        self._batch_times = []
+
+    def totals(self):
+        # [(16-bit value, count, first, last, mode bits)], most frequent first
+        if self.numpy:
+            found = self.numpy.flatnonzero(self.counts)
+            rows = [(int(code), int(self.counts[code]), float(self.first[code]), float(self.last[code]),
+                     int(self.modes[code])) for code in found]
+        else:
+            rows = [(code, count, self.first.get(code, float("nan")), self.last.get(code, float("nan")),
+                     self.modes[code]) for code, count in self.counts.items()]
+        rows.sort(key=lambda row: (-row[1], row[0]))
+        return rows
+
+
+def catalog_index(dtcs):
+    # 16-bit value -> catalog DTC. Codes that don't fit two bytes (more than 3 digits) can't appear in a log.
+    index = {}
+    for dtc in dtcs:
+        try:
+            index.setdefault(pack_code(dtc.get("code", "")), dtc)
+        except ValueError:
+            pass
+    return index
+
+
+def _format_time(ts):
+    if ts is None:
+        return "-"
+    if ts > 1e9:  # seconds since 1970, candump -t a
+        return datetime.datetime.fromtimestamp(ts).isoformat(sep=" ", timespec="milliseconds")
+    return f"{ts:.3f}s"
+
+
+def decode_logs(paths, lookup=None, ids=DIAG_RESPONSE_IDS, use_numpy=True):
+    # Decodes every log into one report, by code as read (J2012). lookup(value) gives the catalog DTC
+    # for a 16-bit value or None; only pass it for ECUs known to send this catalog's custom codes.
+    decoder = DTCLogDecoder(ids, use_numpy)
+    started = time.perf_counter()
+    for path in paths:
+        decoder.decode_file(path)
+    elapsed = time.perf_counter() - started
+    results = []
+    for value, count, first, last, modes in decoder.totals():
+        dtc = lookup(value) if lookup else None
+        results.append({
+            "code": j2012_code(value),
+            "custom_code": unpack_code(value) if lookup else None,
+            "count": count,
+            "first_seen": first if first == first else None,
+            "last_seen": last if last == last else None,
+            "modes": [name for bit, name in DTC_SERVICES.values() if modes & bit],
+            "in_catalog": dtc is not None,
+            "title": dtc.get("title", "") if dtc else "",
+            "possible_fixes": list(dtc.get("possible_fixes", [])) if dtc else []
+        })
+    return {
+        "logs": list(paths),
+        "bytes": decoder.bytes_read,
+        "frames": decoder.frames,
+        "responses": decoder.responses,
+        "seconds": round(elapsed, 3),
+        "numpy": decoder.numpy is not None,
+        "custom_codes": lookup is not None,
+        "dtcs": results
+    }
+
+
+def print_report(report):
+    print(f"Decoded {report['responses']:,} DTC response(s) from {report['bytes'] / 1e6:,.1f} MB of logs "
+          f"({report['frames']:,} diagnostic frames) in {report['seconds']:.2f}s")
+    if not report["dtcs"]:
+        print("No DTCs found.")
+        return
+    custom = report["custom_codes"]
+    print(f"{'Code':<7}{'Custom' if custom else '':<9}{'Count':>8}  {'First seen':<24}{'Last seen':<24}{'Modes':<18}"
+          + ("Title" if custom else ""))
+    for dtc in report["dtcs"]:
+        title = (dtc["title"] if dtc["in_catalog"] else "(not in catalog)") if custom else ""
+        print(f"{dtc['code']:<7}{dtc['custom_code'] or '':<9}{dtc['count']:>8,}  {_format_time(dtc['first_seen']):<24}"
+              f"{_format_time(dtc['last_seen']):<24}{','.join(dtc['modes']):<18}{title}")
+        for fix in dtc["possible_fixes"]:
+            print(f"{'':<16}- {fix}")
+    if not custom:
+        print("Codes are shown as read and not looked up in the catalog (--custom-codes for ECUs that send its codes).")
+
+
+def catalog_lookup(table_path=None):
+    # Lookup function for decode_logs: from a compiled table (compile command) or the loaded catalog
+    if table_path:
+        from dtc_table import DTCTable
+        return DTCTable(table_path).find
+    return catalog_index(builder.export_order_dtcs(quiet=True)).get
@@ -0,0 +1,232 @@
+import html
+import json
+import os
+import re
+import shutil
+import urllib.parse
+
+import custom_dtc_builder as builder
+
+# Static HTML export for custom_dtc_builder.py (export --format html, and Export to HTML in the menu).
+#
+# Writes a small offline site for shop tablets and phones. The output file is the front page, and
+# <name>_files/ next to it holds the DTC pages: one per header and category, split every
+# HTML_PAGE_ROWS rows. It also holds the stylesheet and search.js, a prebuilt search index with the
+# code, title and page of every DTC. The front page only loads search.js, so filtering codes never
+# loads the catalog itself, and each result links straight to its row. Works from file://, no server.
+#
+# DTCs are written to their page as they stream past. Memory stays flat however big the catalog is:
+# at most one open page per header x category, and search.js is written row by row.
+
+HTML_PAGE_ROWS = 1000
+SEARCH_RESULTS = 100
+
+# Table colors per color mode, same as the PDF: (header background, header text, grid, footer text)
+HTML_COLORS = {
+    "1": ("#d3d3d3", "#000000", "#808080", "#000000"),  # Black & White
+    "2": ("transparent", "#000000", "#000000", "#000000"),  # Colorless, only borders
+    "3": ("#008000", "#ffffff", "#006400", "#008000"),  # Color, green highlights
+}
+
+TABLE_HEADER = ["Code", "Category", "Title", "Description", "Possible Fixes", "Pinpoint Test"]
+
+# ReportLab paragraph markup that has an HTML equivalent, everything else is shown as text
+_TAG = re.compile(r"&lt;(/?)(b|i|u|strike|sub|super|sup|br)\s*/?&gt;", re.IGNORECASE)
+_ENTITY = re.compile(r"&amp;(#[0-9]+|#x[0-9a-fA-F]+|[a-zA-Z]+);")
+_ANY_TAG = re.compile(r"<[^<>]*>")
+
+
+def _tag(match):
+    closing, tag = match.group(1), match.group(2).lower()
+    if tag == "br":
+        return "<br>"
+    return f"<{closing}{'sup' if tag == 'super' else tag}>"
+
+
+def html_text(text):
+    # DTC text as HTML: escaped, except the simple tags and entities the PDF renders too
+    text = str(text)
+    if "<" not in text and "&" not in text and ">" not in text:
+        return text
+    text = _ENTITY.sub(r"&\1;", html.escape(text, quote=False))
+    return _TAG.sub(_tag, text)
+
+
+def _stylesheet(color_choice):
+    head_bg, head_fg, grid, footer = HTML_COLORS.get(color_choice, HTML_COLORS["1"])
+    return f"""body {{ font-family: Helvetica, Arial, sans-serif; font-size: 15px; margin: 1em; }}
+table {{ border-collapse: collapse; width: 100%; }}
+th, td {{ border: 1px solid {grid}; padding: 4px; text-align: left; vertical-align: top; }}
+th {{ background: {head_bg}; color: {head_fg}; position: sticky; top: 0; }}
+td ul {{ margin: 0; padding-left: 1.1em; }}
+tr:target {{ outline: 3px solid {grid}; }}
+.legend td {{ border: none; }}
+#q {{ font-size: 1.2em; width: 100%; max-width: 30em; padding: 6px; }}
+#results a {{ display: block; padding: 4px 0; }}
+nav {{ margin: 1em 0; }}
+footer {{ margin-top: 2em; font-size: 0.8em; color: {footer}; }}
+"""
+
+
+def _page_head(title, css):
+    return (f'<!DOCTYPE html>\n<html lang="en">\n<head>\n<meta charset="utf-8">\n'
+            f'<meta name="viewport" content="width=device-width, initial-scale=1">\n'
+            f'<title>{html.escape(title)}</title>\n<link rel="stylesheet" href="{css}">\n</head>\n<body>\n')
+
+
+def _footer(project_name):
+    return (f'<footer><b>{html.escape(project_name)}</b> | Created with Custom DTC Builder from Ironwood Restorations | '
+            f'<a href="{builder.repo_link}">Github: @IronwoodRestorations</a> | '
+            f'<a href="{builder.youtube_link}">Youtube/TikTok</a></footer>\n</body>\n</html>\n')
+
+
+def _row(dtc):
+    fixes = dtc.get("possible_fixes") or []
+    fixes_cell = "<ul>" + "".join(f"<li>{html_text(fix)}</li>" for fix in fixes) + "</ul>" if fixes else "-"
+    code = html_text(dtc.get("code", ""))
+    return (f'<tr id="{html.escape(str(dtc.get("code", "")))}"><td>{code}</td><td>{html_text(dtc.get("category", ""))}</td>'
+            f'<td>{html_text(dtc.get("title", ""))}</td><td>{html_text(dtc.get("description", ""))}</td>'
+            f'<td>{fixes_cell}</td><td>{html_text(dtc.get("pinpoint_test", ""))}</td></tr>\n')
+
+
+class _Section:
+    # The pages of one header x category, written one at a time
+    def __init__(self, header, cat_key, title, index_url):
+        self.header = header
+        self.cat_key = cat_key
+        self.title = title
+        self.index_url = index_url  # the front page
+        self.pages = []  # (file name, rows)
+        self.file = None
+        self.rows = 0
+        self.page_id = None  # position of the open page in search.js's page list
+
+    def next_page_name(self):
+        return f"{self.header}-{self.cat_key}-{len(self.pages) + 1}.html"
+
+    def open_page(self, files_dir, project_name):
+        previous = self.pages[-1][0] if self.pages else None
+        name = self.next_page_name()
+        self.pages.append((name, 0))
+        self.file = open(os.path.join(files_dir, name), "w", encoding="utf-8")
+        self.rows = 0
+        part = f" (part {len(self.pages)})" if previous else ""
+        self.file.write(_page_head(f"{self.title}{part} – {project_name}", "style.css"))
+        self.file.write(f'<nav><a href="{self.index_url}">All DTCs / search</a>'
+                        + (f' | <a href="{previous}">&larr; Previous</a>' if previous else "") + "</nav>\n")
+        self.file.write(f"<h2>{html.escape(self.title)}{part}</h2>\n<table>\n<tr>"
+                        + "".join(f"<th>{label}</th>" for label in TABLE_HEADER) + "</tr>\n")
+        return name
+
+    def close_page(self, project_name, next_page=None):
+        self.file.write("</table>\n<nav>" + (f'<a href="{next_page}">Next &rarr;</a> | ' if next_page else "")
+                        + f'<a href="{self.index_url}">All DTCs / search</a></nav>\n')
+        self.file.write(_footer(project_name))
+        self.file.close()
+        self.file = None
+        self.pages[-1] = (self.pages[-1][0], self.rows)
+
+
+def _section_of(dtc):
+    header = str(dtc.get("code", ""))[:1]
+    if not header.isalnum():
+        header = "_"  # used in file names
+    cat_key = builder.CATEGORY_KEYS.get(dtc.get("category"), "other")
+    title = f"{header} – {builder.HEADERS.get(header, 'Unknown')}: {builder.CATEGORIES.get(cat_key, 'Other')}"
+    return header, cat_key, title
+
+
+def _front_page(project_name, files_name, sections, total):
+    # Legend, search box and the list of pages
+    files_url = urllib.parse.quote(files_name)
+    out = [_page_head(f"Custom DTC's: {project_name}", f"{files_url}/style.css")]
+    out.append(f"<h1>Custom DTC's: {html.escape(project_name)}</h1>\n")
+    headers = "<br>".join(html.escape(f"{k} – {v}") for k, v in builder.HEADERS.items())
+    categories = "<br>".join(html.escape(f"{k} – {v}") for k, v in builder.CATEGORIES.items())
+    out.append(f'<table class="legend"><tr><td><b>Custom DTC Headers</b><br>{headers}</td>'
+               f'<td><b>Trouble Code Categories</b><br>{categories}</td></tr></table>\n')
+    out.append(f'<h2>Search {total} DTC(s)</h2>\n<input id="q" type="search" placeholder="Code or words from the title" '
+               f'autofocus>\n<div id="results"></div>\n')
+    out.append("<h2>Custom DTC's</h2>\n")
+    for section in sections:  # in export order
+        rows = sum(count for _, count in section.pages)
+        links = " ".join(f'<a href="{files_url}/{name}">{i}</a>' for i, (name, _) in enumerate(section.pages, 1))
+        first = section.pages[0][0]
+        out.append(f'<p><a href="{files_url}/{first}">{html.escape(section.title)}</a> ({rows})'
+                   + (f" – pages {links}" if len(section.pages) > 1 else "") + "</p>\n")
+    out.append(f'<script src="{files_url}/search.js"></script>\n<script>\n{_SEARCH_SCRIPT % (json.dumps(files_url), SEARCH_RESULTS)}</script>\n')
+    out.append(_footer(project_name))
+    return "".join(out)
+
+
+# Filters DTC_SEARCH (from search.js) as you type: codes starting with the query, or titles containing every word
+_SEARCH_SCRIPT = """var dir = %s, limit = %d, lower = null;
+var q = document.getElementById("q"), results = document.getElementById("results");
+function esc(s) { return s.replace(/[&<>"]/g, function (c) { return "&#" + c.charCodeAt(0) + ";"; }); }
+q.addEventListener("input", function () {
+  var text = q.value.trim().toLowerCase(), words = text.split(/\\s+/), rows = DTC_SEARCH.rows, out = [];
+  if (!text) { results.innerHTML = ""; return; }
+  if (lower === null) { lower = rows.map(function (r) { return r[1].toLowerCase(); }); }
+  for (var i = 0; i < rows.length && out.length < limit; i++) {
+    var hit = rows[i][0].toLowerCase().indexOf(text) === 0;
+    for (var w = 0; !hit && w < words.length; w++) { if (lower[i].indexOf(words[w]) < 0) break; }
+    if (hit || w === words.length) {
+      var page = DTC_SEARCH.pages[rows[i][2]];
+      out.push('<a href="' + dir + "/" + page + "#" + encodeURIComponent(rows[i][0]) + '">' +
+               esc(rows[i][0]) + " – " + esc(rows[i][1]) + "</a>");
+    }
+  }
+  results.innerHTML = out.length ? out.join("") : "<p>No matching DTCs</p>";
+});
+"""
+
+
+def export_html(dtcs, project_name, color_choice="1", output=None, **options):
+    # Renderer (see RENDERERS): writes the front page to output and the pages next to it, returns output.
+    # The pages are built in a temporary folder and swapped in at the end, so a failed export never
+    # leaves a half-written site behind.
+    if output is None:
+        output = builder.default_output(project_name, "html")
+    files_dir = os.path.splitext(output)[0] + "_files"
+    files_name = os.path.basename(files_dir)
+    index_url = "../" + urllib.parse.quote(os.path.basename(output))
+    work_dir = files_dir + ".tmp"
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir)
+    sections = {}
+    pages = []  # every page file name, in the order search.js refers to them
+    total = 0
+    try:
+        with open(os.path.join(work_dir, "style.css"), "w", encoding="utf-8") as f:
+            f.write(_stylesheet(color_choice))
+        with open(os.path.join(work_dir, "search.js"), "w", encoding="utf-8") as search:
+            search.write('var DTC_SEARCH = {"rows": [\n')
+            for dtc in dtcs:
+                header, cat_key, title = _section_of(dtc)
+                section = sections.get((header, cat_key))
+                if section is None:
+                    section = sections[header, cat_key] = _Section(header, cat_key, title, index_url)
+                elif section.rows >= HTML_PAGE_ROWS:
+                    section.close_page(project_name, next_page=section.next_page_name())
+                if section.file is None:
+                    pages.append(section.open_page(work_dir, project_name))
+                    section.page_id = len(pages) - 1
+                section.file.write(_row(dtc))
+                section.rows += 1
+                entry = [str(dtc.get("code", "")), _ANY_TAG.sub("", str(dtc.get("title", ""))), section.page_id]
+                search.write(("," if total else "") + json.dumps(entry, separators=(",", ":")) + "\n")
+                total += 1
+            for section in sections.values():
+                section.close_page(project_name)
+            search.write('],\n"pages": ' + json.dumps(pages) + "};\n")
+    except BaseException:
+        for section in sections.values():
+            if section.file is not None:
+                section.file.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+    builder.dtc_storage.atomic_write_bytes(
+        output, _front_page(project_name, files_name, sections.values(), total).encode("utf-8"))
+    shutil.rmtree(files_dir, ignore_errors=True)
+    os.replace(work_dir, files_dir)
+    return output
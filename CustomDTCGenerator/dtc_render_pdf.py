@@ -0,0 +1,467 @@
+import concurrent.futures
+import datetime
+import os
+import re
+import shutil
+import tempfile
+
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle, Spacer, PageBreak
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib import colors
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus.paragraph import split as paragraph_split
+
+import custom_dtc_builder as builder
+import dtc_trace
+
+# PDF renderer for custom_dtc_builder.py. Imported only when a PDF export is requested,
+# so sessions that just create or edit DTCs never pay for loading ReportLab.
+
+PDF_TABLE_HEADER = ["Code", "Category", "Title", "Description", "Possible Fixes", "Pinpoint Test"]
+PDF_COL_WIDTHS = [55, 95, 95, 130, 130, 65]
+
+def _pdf_footer(project_name_display, color_choice):
+    # --- Links ---
+    repo_full = builder.repo_link
+    youtube_full = builder.youtube_link
+    youtube_display = youtube_full.replace("https://www.", "").replace("https://", "").replace("youtube.com/", "")
+
+    # --- Footer ---
+    def footer(canvas, doc):
+        canvas.saveState()
+        text_color = colors.green if color_choice=="3" else colors.black
+        style = ParagraphStyle("footer_style", fontSize=8, textColor=text_color)
+        footer_text = (
+            f"<b>{project_name_display}</b> | "
+            f"Created with Custom DTC Builder from Ironwood Restorations<br/>"
+            f"Page {canvas.getPageNumber()} | "
+            f"<a href='{repo_full}'>Github: @IronwoodRestorations</a> | "
+            f"<a href='{youtube_full}'>Youtube/TikTok: {youtube_display}</a>"
+        )
+        p = Paragraph(footer_text, style)
+        w, h = p.wrap(doc.width, doc.bottomMargin)
+        p.drawOn(canvas, doc.leftMargin, 20)
+        canvas.restoreState()
+    return footer
+
+def _pdf_document(pdf_file, project_name_display):
+    # --- Document Setup ---
+    creation_date = datetime.datetime.now()
+    return SimpleDocTemplate(
+        pdf_file,
+        pagesize=letter,
+        leftMargin=36,
+        rightMargin=36,
+        topMargin=36,
+        bottomMargin=36,
+        title=f"Custom DTC's: {project_name_display}",
+        author=builder.author_name(),
+        creator="Custom DTC Builder Script",
+        creationDate=creation_date,
+        modDate=creation_date,
+        subject=f"Custom DTC list for {project_name_display}",
+        keywords=f"DTC, Custom, IronwoodRestorations, Repo: {builder.repo_link}, YouTube: {builder.youtube_link}"
+    )
+
+def _pdf_front_matter(doc, project_name_display, styles):
+    elements = []
+
+    # --- Main Title ---
+    elements.append(Paragraph(f"<b>Custom DTC's: {project_name_display}</b>", styles["Title"]))
+    elements.append(Spacer(1, 12))
+
+    # --- DTC Headers | Trouble Code Categories in two columns ---
+    headers_para = "<br/>".join([f"{k} – {v}" for k,v in builder.HEADERS.items()])
+    categories_para = "<br/>".join([f"{k} – {v}" for k,v in builder.CATEGORIES.items()])
+
+    table_data = [
+        [
+            Paragraph("<b>Custom DTC Headers</b><br/>" + headers_para, styles["Normal"]),
+            Paragraph("<b>Trouble Code Categories</b><br/>" + categories_para, styles["Normal"])
+        ]
+    ]
+    table = Table(table_data, colWidths=[doc.width/2.0]*2)
+    table.setStyle(TableStyle([
+        ('VALIGN', (0,0), (-1,-1), 'TOP'),
+        ('FONTSIZE', (0,0), (-1,-1), 9),
+        ('BOTTOMPADDING', (0,0), (-1,-1), 6),
+        ('TOPPADDING', (0,0), (-1,-1), 6)
+    ]))
+    elements.append(table)
+    elements.append(Spacer(1, 18))
+
+    # --- Combined DTC Table ---
+    elements.append(Paragraph("<b>Custom DTC's</b>", styles["Heading2"]))
+    return elements
+
+# --- Table cells ---
+# Plain-text cells are wrapped here the way Paragraph would and drawn as strings, markup and over-wide words still get a Paragraph
+_word_widths = {}   # word -> width in points, Helvetica 10pt
+_paragraphs = {}    # (text, style name) -> Paragraph, for values repeated on many rows (categories)
+_text_widths = {}   # color_choice -> room for text in each column
+_table_styles = {}  # color_choice -> TableStyle
+_sample_styles = None
+
+def sample_styles():
+    # getSampleStyleSheet() builds a new stylesheet every call, one is enough
+    global _sample_styles
+    if _sample_styles is None:
+        _sample_styles = getSampleStyleSheet()
+    return _sample_styles
+
+def _word_width(word):
+    width = _word_widths.get(word)
+    if width is None:
+        if len(_word_widths) >= 100000:
+            _word_widths.clear()
+        width = _word_widths[word] = stringWidth(word, "Helvetica", 10)
+    return width
+
+_MARKUP = re.compile(r"<|&(?!\s|$)")  # a tag, or an & that isn't just an ampersand ("Safety & Chassis")
+_SPACE_WIDTH = stringWidth(" ", "Helvetica", 10)
+_SPACE_SHRINK = 0.05 * _SPACE_WIDTH
+
+def _wrap(text, width):
+    # Lines of plain text in a column width points wide, None if a word doesn't fit on a line at all
+    lines = []
+    line = []
+    line_width = -_SPACE_WIDTH
+    for word in paragraph_split(text):
+        word_width = _word_width(word)
+        if word_width > width or "\xad" in word:
+            return None  # Paragraph splits or hyphenates these
+        new_width = line_width + _SPACE_WIDTH + word_width
+        if new_width <= width + _SPACE_SHRINK * len(line) or not line:
+            line.append(word)
+            line_width = new_width
+        else:
+            lines.append(" ".join(line))
+            line = [word]
+            line_width = word_width
+    if line:
+        lines.append(" ".join(line))
+    return lines
+
+def _paragraph(text, style, shared=False):
+    if not shared:
+        return Paragraph(text, style)
+    key = (text, style.name)
+    if key not in _paragraphs:
+        if len(_paragraphs) >= 1000:
+            _paragraphs.clear()
+        _paragraphs[key] = Paragraph(text, style)
+    return _paragraphs[key]
+
+def _cell(text, width, style, shared=False):
+    if not _MARKUP.search(text):
+        lines = _wrap(text, width)
+        if lines is not None:
+            return "\n".join(lines)
+    return _paragraph(text, style, shared)
+
+def _fixes_cell(fixes, width, style):
+    # "• fix" per line under an empty first line, like "<br/>• " + "<br/>• ".join(fixes) as a Paragraph
+    if not fixes:
+        return _cell("-", width, style, shared=True)
+    lines = [""]
+    for fix in fixes:
+        fix_lines = _wrap("• " + fix, width) if not _MARKUP.search(fix) else None
+        if fix_lines is None:
+            return _paragraph("<br/>• " + "<br/>• ".join(fixes), style)
+        lines.extend(fix_lines)
+    return "\n".join(lines)
+
+def text_widths(color_choice):
+    # Room for text in each column: PDF_COL_WIDTHS minus the cell padding of the color's table style
+    if color_choice not in _text_widths:
+        padding = {"LEFTPADDING": 6, "RIGHTPADDING": 6}  # ReportLab's default
+        table_style = dtc_table_style(color_choice)
+        for command in table_style.getCommands() if table_style is not None else []:
+            if command[0] in padding:
+                padding[command[0]] = command[3]
+        _text_widths[color_choice] = [width - padding["LEFTPADDING"] - padding["RIGHTPADDING"]
+                                      for width in PDF_COL_WIDTHS]
+    return _text_widths[color_choice]
+
+def dtc_table_row(dtc, styles, color_choice="1"):
+    normal = styles["Normal"]
+    widths = text_widths(color_choice)
+    return [
+        _cell(dtc["code"], widths[0], normal),
+        _cell(dtc["category"], widths[1], normal, shared=True),
+        _cell(dtc["title"], widths[2], normal),
+        _cell(dtc["description"], widths[3], normal),
+        _fixes_cell(dtc["possible_fixes"], widths[4], normal),
+        _cell(dtc["pinpoint_test"], widths[5], normal, shared=True),
+    ]
+
+def dtc_table_style(color_choice):
+    # Built once per color, the same TableStyle serves every table
+    if color_choice not in _table_styles:
+        _table_styles[color_choice] = _make_table_style(color_choice)
+    return _table_styles[color_choice]
+
+def _make_table_style(color_choice):
+    # --- Table Styling ---
+    # Rows below the header use the Normal paragraph font (Helvetica 10pt, 12pt leading) for string cells
+    body_font = [('FONTSIZE', (0,1), (-1,-1), 10), ('LEADING', (0,1), (-1,-1), 12)]
+    if color_choice=="1":  # B&W
+        return TableStyle([
+            ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
+            ('TEXTCOLOR', (0,0), (-1,0), colors.black),
+            ('GRID', (0,0), (-1,-1), 0.5, colors.grey),
+            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+            ('ALIGN', (0,0), (-1,-1), 'LEFT'),
+            ('VALIGN', (0,0), (-1,-1), 'TOP'),
+            ('FONTSIZE', (0,0), (-1,-1), 8),
+            ('LEFTPADDING', (0,0), (-1,-1), 4),
+            ('RIGHTPADDING', (0,0), (-1,-1), 4),
+            ('BOTTOMPADDING', (0,0), (-1,-1), 3),
+            ('TOPPADDING', (0,0), (-1,-1), 3),
+        ] + body_font)
+    elif color_choice=="2":  # Borders only
+        return TableStyle([
+            ('GRID', (0,0), (-1,-1), 0.5, colors.black),
+            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+            ('ALIGN', (0,0), (-1,-1), 'LEFT'),
+            ('VALIGN', (0,0), (-1,-1), 'TOP'),
+            ('FONTSIZE', (0,0), (-1,-1), 8),
+        ] + body_font)
+    elif color_choice=="3":  # Green highlights
+        return TableStyle([
+            ('BACKGROUND', (0,0), (-1,0), colors.green),
+            ('TEXTCOLOR', (0,0), (-1,0), colors.white),
+            ('GRID', (0,0), (-1,-1), 0.5, colors.darkgreen),
+            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+            ('ALIGN', (0,0), (-1,-1), 'LEFT'),
+            ('VALIGN', (0,0), (-1,-1), 'TOP'),
+            ('FONTSIZE', (0,0), (-1,-1), 8),
+            ('LEFTPADDING', (0,0), (-1,-1), 4),
+            ('RIGHTPADDING', (0,0), (-1,-1), 4),
+            ('BOTTOMPADDING', (0,0), (-1,-1), 3),
+            ('TOPPADDING', (0,0), (-1,-1), 3),
+        ] + body_font)
+    return None
+
+def _dtc_table(rows, table_style):
+    table = Table([PDF_TABLE_HEADER] + rows, colWidths=PDF_COL_WIDTHS, repeatRows=1)
+    if table_style is not None:
+        table.setStyle(table_style)
+    return table
+
+def section_title(dtc, group_by):
+    # Section heading for grouped exports: "B – Body" or "B – Body: Sensor Networks"
+    header = dtc["code"][:1]
+    title = f"{header} – {builder.HEADERS.get(header, 'Unknown')}"
+    if group_by == "category":
+        title += f": {dtc.get('category', '')}"
+    return title
+
+def _pdf_stream_flowables(dtcs, styles, color_choice, chunk_size, group_by=None):
+    # Yields bounded tables (and section headings) one at a time, at most chunk_size rows are alive
+    table_style = dtc_table_style(color_choice)
+    rows = []
+    section = None
+    for dtc in dtcs:
+        if group_by:
+            title = section_title(dtc, group_by)
+            if title != section:
+                if rows:
+                    yield _dtc_table(rows, table_style)
+                    rows = []
+                section = title
+                heading = Paragraph(f"<b>{title}</b>", styles["Heading3"])
+                heading.keepWithNext = 1
+                yield heading
+        rows.append(dtc_table_row(dtc, styles, color_choice))
+        if len(rows) >= chunk_size:
+            yield _dtc_table(rows, table_style)
+            rows = []
+    if rows:
+        yield _dtc_table(rows, table_style)
+
+class _FlowableStream(list):
+    # doc.build() consumes its flowables list from the front (len / [0] / del [0], and puts split
+    # pieces back at the front). This list refills itself from a generator as it drains, so only a
+    # few flowables exist at a time instead of the whole document.
+    def __init__(self, source, lookahead=4):
+        super().__init__()
+        self._source = iter(source)
+        self._lookahead = lookahead
+
+    def _fill(self):
+        while self._source is not None and list.__len__(self) < self._lookahead:
+            try:
+                list.append(self, next(self._source))
+            except StopIteration:
+                self._source = None
+
+    def __len__(self):
+        self._fill()
+        return list.__len__(self)
+
+    def __getitem__(self, index):
+        self._fill()
+        return list.__getitem__(self, index)
+
+def export_pdf(dtcs, project_name, color_choice="1", pdf_file=None,
+               stream=False, chunk_size=None, group_by=None):
+    # Non-interactive PDF export, returns the path of the written file.
+    # dtcs must already be in export order (export_order_dtcs() or sort_dtcs()).
+    # stream=True renders bounded table chunks produced lazily from dtcs (any iterable), optionally
+    # with a section heading per header or category (group_by="header" / "category").
+    project_name_file = re.sub(r'[^a-zA-Z0-9_-]', '_', project_name)
+    project_name_display = project_name  # readable
+    chunk_size = chunk_size or builder.EXPORT_CHUNK_ROWS
+
+    if pdf_file is None:
+        pdf_file = f"custom_dtcs_{project_name_file}.pdf"
+
+    footer = dtc_trace.timed_pages(_pdf_footer(project_name_display, color_choice))
+    doc = _pdf_document(pdf_file, project_name_display)
+    styles = sample_styles()
+    elements = _pdf_front_matter(doc, project_name_display, styles)
+
+    if stream or group_by:
+        def flowables():
+            yield from elements
+            yield from _pdf_stream_flowables(dtcs, styles, color_choice, chunk_size, group_by)
+        # Rows and tables are made as the pages are laid out, so it is all one stage here
+        with dtc_trace.stage("pdf.build", streamed=True):
+            doc.build(_FlowableStream(flowables()), onFirstPage=footer, onLaterPages=footer)
+            dtc_trace.pages_done()
+        return pdf_file
+
+    with dtc_trace.stage("pdf.rows"):
+        table_data = [PDF_TABLE_HEADER]
+        for dtc in dtcs:
+            table_data.append(dtc_table_row(dtc, styles, color_choice))
+        dtc_trace.note(entries=len(table_data) - 1)
+
+    with dtc_trace.stage("pdf.table"):
+        col_widths = PDF_COL_WIDTHS
+        table = Table(table_data, colWidths=col_widths, repeatRows=1)
+        table_style = dtc_table_style(color_choice)
+        if table_style is not None:
+            table.setStyle(table_style)
+
+    elements.append(table)
+
+    # --- Build PDF ---
+    with dtc_trace.stage("pdf.build"):
+        doc.build(elements, onFirstPage=footer, onLaterPages=footer)
+        dtc_trace.pages_done()
+
+    return pdf_file
+
+def section_key(dtc, section_by):
+    # Header letter ("B") or category key ("x41xx") a DTC belongs to
+    if section_by == "header":
+        return dtc["code"][:1]
+    return builder.CATEGORY_KEYS.get(dtc.get("category"), "other")
+
+def _section_heading(key, section_by):
+    if section_by == "header":
+        return f"{key} – {builder.HEADERS.get(key, 'Unknown')}"
+    return f"{key} – {builder.CATEGORIES.get(key, 'Other')}"
+
+def _no_footer(canvas, doc):
+    pass
+
+def _render_section(job):
+    # Process pool worker: render one section to its own PDF, returns (path, page count)
+    doc = _pdf_document(job["pdf_file"], job["project_name"])
+    styles = sample_styles()
+    elements = _pdf_front_matter(doc, job["project_name"], styles) if job["front_matter"] else []
+    heading = Paragraph(f"<b>{job['heading']}</b>", styles["Heading2"])
+    heading.keepWithNext = 1
+    elements.append(heading)
+
+    def flowables():
+        yield from elements
+        yield from _pdf_stream_flowables(job["dtcs"], styles, job["color_choice"], job["chunk_size"])
+
+    footer = _pdf_footer(job["project_name"], job["color_choice"]) if job["footer"] else _no_footer
+    doc.build(_FlowableStream(flowables()), onFirstPage=footer, onLaterPages=footer)
+    return job["pdf_file"], doc.page
+
+def _footer_overlay(pdf_file, project_name, color_choice, pages):
+    # One page per output page holding only the normal footer, so page numbers run across all sections
+    doc = _pdf_document(pdf_file, project_name)
+    footer = _pdf_footer(project_name, color_choice)
+    elements = [Spacer(1, 1)]
+    for _ in range(pages - 1):
+        elements += [PageBreak(), Spacer(1, 1)]
+    doc.build(elements, onFirstPage=footer, onLaterPages=footer)
+
+def export_pdf_parallel(dtcs, project_name, color_choice="1", pdf_file=None, section_by="header",
+                        split=False, workers=None, chunk_size=None):
+    # Render each header or category section as its own document in a process pool.
+    # split=False stitches the parts into one PDF (needs pypdf) with running page numbers,
+    # split=True writes one PDF per section. dtcs must be in export order. Returns the written paths.
+    project_name_file = re.sub(r'[^a-zA-Z0-9_-]', '_', project_name)
+    if pdf_file is None:
+        pdf_file = f"custom_dtcs_{project_name_file}.pdf"
+    chunk_size = chunk_size or builder.EXPORT_CHUNK_ROWS
+
+    if not split:
+        try:
+            from pypdf import PdfReader, PdfWriter
+        except ImportError:
+            print("Error 0x001B: Merging sections needs pypdf, please run install.py (or use split output).")
+            return []
+
+    # --- Split into sections, in export order ---
+    sections = {}
+    for dtc in dtcs:
+        sections.setdefault(section_key(dtc, section_by), []).append(dtc)
+    if section_by == "header":
+        keys = sorted(sections, key=lambda k: (builder.dtc_sort_key({"code": k})[0], k))
+    else:
+        order = list(builder.CATEGORIES)
+        keys = sorted(sections, key=lambda k: (order.index(k) if k in order else len(order), k))
+
+    base, ext = os.path.splitext(pdf_file)
+    work_dir = None if split else tempfile.mkdtemp(prefix="dtc_sections_")
+    jobs = []
+    for i, key in enumerate(keys):
+        part = f"{base}_{key}{ext}" if split else os.path.join(work_dir, f"{i:03d}_{key}.pdf")
+        jobs.append({
+            "dtcs": sections[key],
+            "project_name": project_name,
+            "color_choice": color_choice,
+            "pdf_file": part,
+            "heading": _section_heading(key, section_by),
+            "front_matter": split or i == 0,
+            "footer": split,  # merged output gets its footers afterwards, numbered across sections
+            "chunk_size": chunk_size,
+        })
+
+    # --- Render sections in parallel ---
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_render_section, jobs))
+
+    if split:
+        return [path for path, _ in results]
+
+    # --- Stitch the parts and stamp the running footer ---
+    try:
+        writer = PdfWriter()
+        for path, _ in results:
+            for page in PdfReader(path).pages:
+                writer.add_page(page)
+        total_pages = sum(pages for _, pages in results)
+        overlay_file = os.path.join(work_dir, "footer.pdf")
+        _footer_overlay(overlay_file, project_name, color_choice, total_pages)
+        for page, footer_page in zip(writer.pages, PdfReader(overlay_file).pages):
+            page.merge_page(footer_page)
+        metadata = PdfReader(results[0][0]).metadata
+        if metadata:
+            writer.add_metadata(dict(metadata))
+        with open(pdf_file, "wb") as f:
+            writer.write(f)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return [pdf_file]
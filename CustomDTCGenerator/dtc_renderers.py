@@ -0,0 +1,53 @@
+import csv
+import json
+
+import custom_dtc_builder as builder
+
+# Plain text renderers for custom_dtc_builder.py (see RENDERERS there). Each one writes the DTCs
+# as it iterates over them, so they stream straight from the catalog. color_choice and PDF-only
+# options are accepted and ignored.
+
+CSV_FIELDS = ["code", "header", "category", "title", "description", "possible_fixes", "pinpoint_test"]
+
+
+def render_csv(dtcs, project_name, color_choice="1", output=None, **options):
+    # One row per DTC, possible fixes joined with " | "
+    with open(output, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_FIELDS)
+        for dtc in dtcs:
+            row = [dtc.get(field, "") for field in CSV_FIELDS]
+            row[5] = " | ".join(dtc.get("possible_fixes", []))
+            writer.writerow(row)
+    return output
+
+
+def _md_cell(text):
+    return str(text).replace("|", "\\|").replace("\n", " ")
+
+
+def render_markdown(dtcs, project_name, color_choice="1", output=None, **options):
+    with open(output, "w", encoding="utf-8") as f:
+        f.write(f"# Custom DTC's: {project_name}\n\n")
+        f.write("| Custom DTC Headers | Trouble Code Categories |\n|---|---|\n")
+        headers = [f"{k} – {v}" for k, v in builder.HEADERS.items()]
+        categories = [f"{k} – {v}" for k, v in builder.CATEGORIES.items()]
+        for i in range(max(len(headers), len(categories))):
+            f.write(f"| {headers[i] if i < len(headers) else ''} | {categories[i] if i < len(categories) else ''} |\n")
+        f.write("\n## Custom DTC's\n\n")
+        f.write("| Code | Category | Title | Description | Possible Fixes | Pinpoint Test |\n")
+        f.write("|---|---|---|---|---|---|\n")
+        for dtc in dtcs:
+            fixes = "<br>".join("• " + _md_cell(fix) for fix in dtc.get("possible_fixes", [])) or "-"
+            f.write(f"| {_md_cell(dtc['code'])} | {_md_cell(dtc['category'])} | {_md_cell(dtc['title'])} | "
+                    f"{_md_cell(dtc['description'])} | {fixes} | {_md_cell(dtc['pinpoint_test'])} |\n")
+        f.write(f"\n_Created with Custom DTC Builder from Ironwood Restorations: {builder.repo_link}_\n")
+    return output
+
+
+def render_jsonl(dtcs, project_name, color_choice="1", output=None, **options):
+    # One DTC per line, same fields as custom_dtcs.json
+    with open(output, "w", encoding="utf-8") as f:
+        for dtc in dtcs:
+            f.write(json.dumps(dtc, ensure_ascii=False) + "\n")
+    return output
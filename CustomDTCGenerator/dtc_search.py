@@ -0,0 +1,194 @@
+import bisect
+import heapq
+import math
+import operator
+import re
+
+# Full-text search for custom_dtc_builder.py (the search / jump-to-code prompt in the editor).
+#
+# An inverted index: every word of a DTC's fields points at the DTCs it appears in, with a weight
+# for the field it came from. A query word matches index words exactly, by prefix ("sens" finds
+# "sensor") or, if it isn't in the index at all, with one typo ("wirng" finds "wiring"). DTCs must
+# match every query word and are ranked by field weight x how rare the matched word is.
+# Documents are identified by any hashable id chosen by the caller.
+
+# Field -> weight, a match in the code or title counts for more than one in the description
+SEARCH_FIELDS = {
+    "code": 8,
+    "title": 4,
+    "pinpoint_test": 4,
+    "possible_fixes": 2,
+    "description": 1
+}
+
+# How much a prefix or fuzzy match counts compared to an exact one
+PREFIX_FACTOR = 0.6
+FUZZY_FACTOR = 0.4
+# Shortest query word that is expanded by prefix / index word considered for typos
+PREFIX_MIN_LENGTH = 2
+FUZZY_MIN_LENGTH = 4
+# Most index words one prefix expands to (keeps a 2-letter prefix fast on big catalogs)
+PREFIX_MAX_TERMS = 200
+
+_WORD = re.compile(r"[0-9a-z]+")
+
+
+def tokenize(text):
+    return _WORD.findall(str(text).casefold())
+
+
+def _deletes(term):
+    # Every way to drop one letter, two words with a shared entry are at most one edit apart
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _fuzzy_term(term):
+    return len(term) >= FUZZY_MIN_LENGTH and term.isalpha()
+
+
+class SearchIndex:
+    def __init__(self):
+        self._postings = {}   # term -> {doc_id: weight}
+        self._doc_terms = {}  # doc_id -> {term: weight}, to undo an entry on update/remove
+        self._deletes = {}    # one-letter-deleted term -> {terms}, for typo matching
+        self._vocab = None    # sorted terms for prefix matching, built on first use
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._doc_terms
+
+    def build(self, items):
+        # Index many (doc_id, dtc) pairs at once
+        for doc_id, dtc in items:
+            self.add(doc_id, dtc)
+
+    def _new_term(self, term):
+        self._postings[term] = {}
+        if self._vocab is not None:
+            bisect.insort(self._vocab, term)
+        if _fuzzy_term(term):
+            for variant in _deletes(term):
+                self._deletes.setdefault(variant, set()).add(term)
+
+    def _drop_term(self, term):
+        del self._postings[term]
+        if self._vocab is not None:
+            del self._vocab[bisect.bisect_left(self._vocab, term)]
+        if _fuzzy_term(term):
+            for variant in _deletes(term):
+                terms = self._deletes[variant]
+                terms.discard(term)
+                if not terms:
+                    del self._deletes[variant]
+
+    def add(self, doc_id, dtc):
+        if doc_id in self._doc_terms:
+            self.remove(doc_id)
+        weights = {}
+        for field, weight in SEARCH_FIELDS.items():
+            value = dtc.get(field) or ""
+            if isinstance(value, list):
+                value = " ".join(value)
+            for term in tokenize(value):
+                weights[term] = weights.get(term, 0) + weight
+        self._doc_terms[doc_id] = weights
+        for term, weight in weights.items():
+            if term not in self._postings:
+                self._new_term(term)
+            self._postings[term][doc_id] = weight
+
+    def update(self, doc_id, dtc):
+        self.add(doc_id, dtc)
+
+    def remove(self, doc_id):
+        for term in self._doc_terms.pop(doc_id, {}):
+            docs = self._postings[term]
+            del docs[doc_id]
+            if not docs:
+                self._drop_term(term)
+
+    def _prefix_terms(self, word):
+        if self._vocab is None:
+            self._vocab = sorted(self._postings)
+        start = bisect.bisect_left(self._vocab, word)
+        terms = []
+        for term in self._vocab[start:start + PREFIX_MAX_TERMS + 1]:
+            if not term.startswith(word):
+                break
+            if term != word:
+                terms.append(term)
+        return terms
+
+    def _fuzzy_terms(self, word):
+        candidates = set(self._deletes.get(word, ()))
+        for variant in _deletes(word):
+            candidates.update(self._deletes.get(variant, ()))
+            if variant in self._postings and _fuzzy_term(variant):
+                candidates.add(variant)
+        return candidates
+
+    def matching_terms(self, word):
+        # {index term: factor} for one query word
+        matches = {}
+        if word in self._postings:
+            matches[word] = 1.0
+        if len(word) >= PREFIX_MIN_LENGTH:
+            for term in self._prefix_terms(word):
+                matches[term] = PREFIX_FACTOR
+        if not matches and len(word) >= FUZZY_MIN_LENGTH:
+            for term in self._fuzzy_terms(word):
+                matches[term] = FUZZY_FACTOR
+        return matches
+
+    def search(self, query, limit=25):
+        # Best matches first as [(doc_id, score)]
+        words = list(dict.fromkeys(tokenize(query)))
+        if not words:
+            return []
+        total = len(self._doc_terms)
+        per_word = []
+        for word in words:
+            terms = [(self._postings[term], factor * math.log(1 + total / len(self._postings[term])))
+                     for term, factor in self.matching_terms(word).items()]
+            if not terms:
+                return []
+            per_word.append(terms)
+
+        # Every word has to match. Score the word with the fewest DTCs in full, then only look up
+        # those DTCs for the other words.
+        per_word.sort(key=lambda terms: sum(len(docs) for docs, _ in terms))
+        terms = per_word[0]
+        if len(terms) == 1 and len(per_word) == 1:
+            # One word, one index term: the field weights alone give the order
+            docs, scale = terms[0]
+            return [(doc_id, weight * scale)
+                    for doc_id, weight in heapq.nlargest(limit, docs.items(), key=operator.itemgetter(1))]
+        if len(terms) == 1:
+            docs, scale = terms[0]
+            ranked = {doc_id: weight * scale for doc_id, weight in docs.items()}
+        else:
+            ranked = {}
+            for docs, scale in terms:
+                for doc_id, weight in docs.items():
+                    score = weight * scale
+                    if score > ranked.get(doc_id, 0):
+                        ranked[doc_id] = score
+        for terms in per_word[1:]:
+            if len(terms) == 1:
+                docs, scale = terms[0]
+                ranked = {doc_id: score + docs[doc_id] * scale for doc_id, score in ranked.items() if doc_id in docs}
+            else:
+                narrowed = {}
+                for doc_id, score in ranked.items():
+                    best = 0
+                    for docs, scale in terms:
+                        if doc_id in docs and docs[doc_id] * scale > best:
+                            best = docs[doc_id] * scale
+                    if best:
+                        narrowed[doc_id] = score + best
+                ranked = narrowed
+            if not ranked:
+                return []
+        return heapq.nlargest(limit, ranked.items(), key=operator.itemgetter(1))
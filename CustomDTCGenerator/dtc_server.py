@@ -0,0 +1,331 @@
+import array
+import asyncio
+import concurrent.futures
+import datetime
+import hashlib
+import json
+import os
+import time
+import urllib.parse
+
+import custom_dtc_builder as builder
+import dtc_compact
+
+# Local HTTP service for the serve command: GET /, /dtc/<code>, /dtcs, /search and /export (see README).
+
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+# How often to check the catalog file for changes, and how long it must be quiet before reloading
+RELOAD_INTERVAL = 1.0
+RELOAD_DEBOUNCE = 0.5
+SERVER_EXPORT_DIR = "server_exports"
+
+REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 500: "Internal Server Error", 503: "Service Unavailable"}
+CONTENT_TYPES = {"pdf": "application/pdf", "csv": "text/csv; charset=utf-8",
+                 "md": "text/markdown; charset=utf-8", "jsonl": "application/x-ndjson"}
+
+
+def _etag(data):
+    return '"' + hashlib.sha1(data).hexdigest()[:20] + '"'
+
+
+class CatalogSnapshot:
+    # Read-only view of the catalog as of one load, with the indexes the endpoints need. The entries are
+    # held in a compact table (dtc_compact), the indexes hold positions in it.
+    def __init__(self, dtcs, signature):
+        self.dtcs = dtc_compact.CompactDTCs(dtcs)  # export order
+        self.version = hashlib.sha1(repr(signature).encode("utf-8")).hexdigest()[:12]
+        self.loaded = datetime.datetime.now().isoformat(timespec="seconds")
+        self.by_code = {}
+        self.by_header = {}
+        self.by_category = {}
+        for i in range(len(self.dtcs)):
+            code = str(self.dtcs.code(i) or "")
+            self.by_code.setdefault(code.upper(), i)
+            self.by_header.setdefault(code[:1].upper(), array.array("I")).append(i)
+            category = builder.CATEGORY_KEYS.get(self.dtcs.category(i), self.dtcs.category(i))
+            self.by_category.setdefault(category, array.array("I")).append(i)
+        self._bodies = {}  # code -> (json body, etag), filled on first lookup
+        self.search_index = None
+
+    def build_search_index(self):
+        import dtc_search
+        index = dtc_search.SearchIndex()
+        index.build(enumerate(self.dtcs))
+        self.search_index = index
+
+    def entry(self, code):
+        code = code.upper()
+        if code not in self._bodies:
+            position = self.by_code.get(code)
+            if position is None:
+                return None
+            body = json.dumps(self.dtcs[position]).encode("utf-8")
+            self._bodies[code] = (body, _etag(body))
+        return self._bodies[code]
+
+
+def _load_snapshot():
+    # Runs in a worker thread, the loop keeps serving the old snapshot meanwhile
+    signature = builder.catalog_signature()
+    builder.forget_catalogs()
+    snapshot = CatalogSnapshot(builder.iter_export_dtcs(), signature)
+    builder.forget_catalogs()  # the snapshot has its own compact copy, drop the session one
+    snapshot.build_search_index()
+    return snapshot, signature
+
+
+class DTCServer:
+    def __init__(self, workers=None):
+        self.snapshot = None
+        self.signature = None
+        self.workers = workers
+        self._pool = None
+        # Catalog loads always run on this one thread (SQLite connections belong to the thread that opened them)
+        self._loader = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._exports = {}  # (format, project, color, version) -> running export, shared by identical requests
+        self.requests = 0
+
+    async def start(self, host=SERVER_HOST, port=SERVER_PORT):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        self.snapshot, self.signature = await loop.run_in_executor(self._loader, _load_snapshot)
+        print(f"Loaded {len(self.snapshot.dtcs)} DTC(s) from {builder.JSON_FILE} "
+              f"in {time.perf_counter() - started:.1f}s")
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Serving on http://{host}:{port} (Ctrl+C to stop)")
+        asyncio.ensure_future(self.watch())
+        return server
+
+    async def watch(self):
+        # Hot reload: swap in a new snapshot once the catalog files have stopped changing
+        loop = asyncio.get_running_loop()
+        seen = self.signature
+        changed_at = None
+        while True:
+            await asyncio.sleep(RELOAD_INTERVAL)
+            signature = builder.catalog_signature()
+            if signature != seen:
+                seen = signature
+                changed_at = time.monotonic()
+            elif changed_at is not None and time.monotonic() - changed_at >= RELOAD_DEBOUNCE:
+                changed_at = None
+                try:
+                    self.snapshot, self.signature = await loop.run_in_executor(self._loader, _load_snapshot)
+                except Exception as e:  # caught a file mid-edit by hand, keep serving the old one
+                    print(f"Reload failed, still serving the previous catalog: {e}")
+                    continue
+                print(f"[{datetime.datetime.now():%H:%M:%S}] Reloaded {len(self.snapshot.dtcs)} DTC(s)")
+
+    async def handle(self, reader, writer):
+        # One connection, any number of keep-alive requests
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self.send(writer, 400, {"error": "Malformed request line"}, keep_alive=False)
+                    break
+                length = headers.get("content-length", "0")
+                if not (length.isascii() and length.isdigit()):
+                    await self.send(writer, 400, {"error": f"Invalid Content-Length '{length}'"}, keep_alive=False)
+                    break
+                keep_alive = (headers.get("connection", "").lower() != "close" if version == "HTTP/1.1"
+                              else headers.get("connection", "").lower() == "keep-alive")
+                if int(length):
+                    await reader.readexactly(int(length))
+                self.requests += 1
+                try:
+                    await self.dispatch(writer, method, target, headers, keep_alive)
+                except Exception as e:
+                    await self.send(writer, 500, {"error": f"{type(e).__name__}: {e}"}, keep_alive=keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def send(self, writer, status, body=b"", content_type="application/json", etag=None, keep_alive=True,
+                   head=False, extra_headers=()):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+                 f"Content-Type: {content_type}",
+                 f"Content-Length: {0 if status == 304 else len(body)}",
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if etag:
+            lines.append(f"ETag: {etag}")
+            lines.append("Cache-Control: no-cache")
+        lines.extend(extra_headers)
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        if status != 304 and not head:
+            writer.write(body)
+        await writer.drain()
+
+    async def send_json(self, writer, request, etag, make_body):
+        # 304 if the client already has this version, otherwise build and send the body
+        if request["if_none_match"] in (etag, "*"):
+            await self.send(writer, 304, etag=etag, keep_alive=request["keep_alive"])
+            return
+        await self.send(writer, 200, make_body(), etag=etag, keep_alive=request["keep_alive"],
+                        head=request["head"])
+
+    async def dispatch(self, writer, method, target, headers, keep_alive):
+        if method not in ("GET", "HEAD"):
+            await self.send(writer, 405, {"error": "Only GET and HEAD are supported"}, keep_alive=keep_alive,
+                            extra_headers=["Allow: GET, HEAD"])
+            return
+        url = urllib.parse.urlsplit(target)
+        query = {k: v[-1] for k, v in urllib.parse.parse_qs(url.query).items()}
+        path = urllib.parse.unquote(url.path).rstrip("/") or "/"
+        request = {"keep_alive": keep_alive, "head": method == "HEAD",
+                   "if_none_match": headers.get("if-none-match")}
+        snapshot = self.snapshot
+
+        if path.startswith("/dtc/"):
+            found = snapshot.entry(path[len("/dtc/"):])
+            if found is None:
+                await self.send(writer, 404, {"error": f"DTC {path[len('/dtc/'):]} not found"}, keep_alive=keep_alive)
+                return
+            body, etag = found
+            await self.send_json(writer, request, etag, lambda: body)
+        elif path == "/dtcs":
+            await self.list_dtcs(writer, request, snapshot, query)
+        elif path == "/search":
+            if not query.get("q"):
+                await self.send(writer, 400, {"error": "Missing q= parameter"}, keep_alive=keep_alive)
+                return
+            try:
+                limit = int(query.get("limit", 25))
+            except ValueError:
+                await self.send(writer, 400, {"error": "limit= must be a number"}, keep_alive=keep_alive)
+                return
+            etag = f'"{snapshot.version}-{_etag(url.query.encode("utf-8"))[1:-1]}"'
+
+            def body():
+                results = snapshot.search_index.search(query["q"], limit)
+                return {"query": query["q"], "version": snapshot.version,
+                        "results": [dict(snapshot.dtcs[i], score=round(score, 3)) for i, score in results]}
+            await self.send_json(writer, request, etag, body)
+        elif path == "/export":
+            await self.export(writer, request, snapshot, query)
+        elif path == "/":
+            await self.send(writer, 200, {"catalog": builder.JSON_FILE, "storage": builder.STORAGE_MODE,
+                                          "entries": len(snapshot.dtcs), "version": snapshot.version,
+                                          "loaded": snapshot.loaded, "requests": self.requests,
+                                          "formats": [fmt for fmt in builder.RENDERERS if fmt not in builder.SITE_FORMATS]},
+                            keep_alive=keep_alive, head=request["head"])
+        else:
+            await self.send(writer, 404, {"error": f"No such endpoint {path}"}, keep_alive=keep_alive)
+
+    async def list_dtcs(self, writer, request, snapshot, query):
+        positions = range(len(snapshot.dtcs))
+        try:
+            if query.get("header"):
+                positions = snapshot.by_header.get(builder.parse_header(query["header"]), ())
+            if query.get("category"):
+                category = builder.parse_category(query["category"])
+                if query.get("header"):
+                    positions = [i for i in positions
+                                 if builder.CATEGORY_KEYS.get(snapshot.dtcs.category(i)) == category]
+                else:
+                    positions = snapshot.by_category.get(category, ())
+            offset = int(query.get("offset", 0))
+            limit = int(query["limit"]) if "limit" in query else None
+        except ValueError as e:
+            await self.send(writer, 400, {"error": str(e)}, keep_alive=request["keep_alive"])
+            return
+        etag = f'"{snapshot.version}-{_etag(urllib.parse.urlencode(sorted(query.items())).encode("utf-8"))[1:-1]}"'
+        page = positions[offset:offset + limit if limit is not None else None]
+        await self.send_json(writer, request, etag, lambda: {"total": len(positions), "offset": offset,
+                                                             "version": snapshot.version,
+                                                             "dtcs": [snapshot.dtcs[i] for i in page]})
+
+    async def export(self, writer, request, snapshot, query):
+        fmt = query.get("format", "pdf")
+        if fmt in builder.SITE_FORMATS:
+            await self.send(writer, 400, {"error": f"{fmt} writes a folder of pages, use the export command"},
+                            keep_alive=request["keep_alive"])
+            return
+        try:
+            builder.get_renderer(fmt)
+        except ValueError as e:
+            await self.send(writer, 400, {"error": str(e)}, keep_alive=request["keep_alive"])
+            return
+        except RuntimeError as e:
+            await self.send(writer, 503, {"error": str(e)}, keep_alive=request["keep_alive"])
+            return
+        project = query.get("project", "Unnamed Project")
+        color = query.get("color", "1")
+        key = (fmt, project, color, snapshot.version)
+        if key not in self._exports:
+            task = asyncio.ensure_future(self._render(fmt, project, color, snapshot))
+            self._exports[key] = task
+            task.add_done_callback(lambda _: self._exports.pop(key, None))
+        result, data = await self._exports[key]
+        if result["status"] == "failed":
+            await self.send(writer, 500, {"error": result["error"]}, keep_alive=request["keep_alive"])
+            return
+        name = builder.default_output(project, fmt)
+        await self.send(writer, 200, data, CONTENT_TYPES.get(fmt, "application/octet-stream"), etag=_etag(data),
+                        keep_alive=request["keep_alive"], head=request["head"],
+                        extra_headers=[f'Content-Disposition: attachment; filename="{name}"'])
+
+    async def _render(self, fmt, project, color, snapshot):
+        # One render in the process pool, shared by identical requests that arrive while it runs.
+        # Returns (result, file contents); the output file itself is removed, the render cache keeps a copy.
+        loop = asyncio.get_running_loop()
+        if self._pool is None:
+            self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers)
+        export_dir = os.path.abspath(SERVER_EXPORT_DIR)
+        os.makedirs(export_dir, exist_ok=True)
+        # The snapshot's own entries go to the worker (as the compact table, it pickles small), so the
+        # file always matches the version and ETag being served even if the catalog changed since
+        job = {"catalog": builder.JSON_FILE, "dtcs": snapshot.dtcs,
+               "project": project, "color": color, "format": fmt, "cache": True,
+               "stream": len(snapshot.dtcs) > builder.STREAM_EXPORT_ROWS,
+               "cache_dir": os.path.abspath(builder.RENDER_CACHE_DIR),
+               "output": os.path.join(export_dir, f"{snapshot.version}_{builder.default_output(project, fmt)}")}
+        result = await loop.run_in_executor(self._pool, builder.export_job, job)
+        if result["status"] == "failed":
+            return result, b""
+
+        def read_and_remove(path):
+            with open(path, "rb") as f:
+                data = f.read()
+            os.remove(path)
+            return data
+        return result, await loop.run_in_executor(None, read_and_remove, result["output"])
+
+    def close(self):
+        self._loader.shutdown()
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+
+
+def serve(host=SERVER_HOST, port=SERVER_PORT, workers=None):
+    # Run until Ctrl+C
+    service = DTCServer(workers)
+
+    async def run():
+        server = await service.start(host, port)
+        async with server:
+            await server.serve_forever()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+    finally:
+        service.close()
@@ -0,0 +1,519 @@
+import array
+import hashlib
+import itertools
+import json
+import os
+import socket
+import threading
+import time
+
+# Storage helpers for custom_dtc_builder.py
+#
+# Journal mode keeps the normal catalog file (a plain JSON list, same as always) as a snapshot
+# and appends every change to "<catalog>.journal", one JSON record per line:
+#   {"base": "<sha1 of the snapshot>"}              first line, which snapshot the journal belongs to
+#   {"op": "append", "dtc": {...}}
+#   {"op": "set", "index": 3, "dtc": {...}}
+#   {"op": "delete", "index": 3}
+# Loading replays the journal on top of the snapshot. Compaction writes a new snapshot and a fresh
+# journal, both with atomic replaces. If the process dies between the two replaces, the old journal's
+# base no longer matches the new snapshot and it is ignored, which is correct since the snapshot
+# already has those changes.
+
+# Compact automatically once the journal grows past this size (bytes)
+JOURNAL_COMPACT_BYTES = 4 * 1024 * 1024
+
+
+def atomic_write_bytes(path, data):
+    # Write to a temp file next to the target, flush it to disk, then swap it in.
+    # Readers see either the old file or the new one, never half of one.
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def atomic_write_json(path, data, indent=4):
+    atomic_write_bytes(path, json.dumps(data, indent=indent).encode("utf-8"))
+
+
+# ===================== Sharing a catalog between processes =====================
+#
+# Saves take a lock file next to the catalog ("<catalog>.lock") for the few moments they read and
+# write it. A lock file (rather than an OS file lock) also works on shared network drives. A lock
+# older than LOCK_STALE_SECONDS is left over from a crashed process and is taken over.
+
+LOCK_TIMEOUT = 30
+LOCK_STALE_SECONDS = 120
+
+_held_locks = {}  # (path, thread) -> depth, so a thread can take a lock it already holds again
+
+
+class ConflictError(ValueError):
+    # The same DTC was changed here and by another process, and the conflict wasn't resolved
+    def __init__(self, codes):
+        self.codes = codes
+        super().__init__(f"DTC {', '.join(codes)} changed by someone else since it was loaded")
+
+
+class FileLock:
+    def __init__(self, path, timeout=LOCK_TIMEOUT):
+        self.path = path + ".lock"
+        self.timeout = timeout
+
+    def __enter__(self):
+        self._key = (self.path, threading.get_ident())
+        if self._key in _held_locks:
+            _held_locks[self._key] += 1
+            return self
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > LOCK_STALE_SECONDS:
+                        os.remove(self.path)
+                        continue
+                except OSError:
+                    continue  # released while we looked
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"{self.path} is held by {self.owner()}, try again in a moment")
+                time.sleep(0.05)
+        with os.fdopen(fd, "w") as f:
+            f.write(f"{socket.gethostname()} pid {os.getpid()}")
+        _held_locks[self._key] = 1
+        return self
+
+    def __exit__(self, *exc):
+        _held_locks[self._key] -= 1
+        if not _held_locks[self._key]:
+            del _held_locks[self._key]
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def owner(self):
+        try:
+            with open(self.path, "r") as f:
+                return f.read() or "another process"
+        except OSError:
+            return "another process"
+
+
+def merge_catalogs(base, ours, theirs, resolve):
+    # Three-way merge keyed on code. base is the catalog as this process loaded it, ours is it now,
+    # theirs is what is on disk now. An entry's loaded content is its version: an entry only one side
+    # changed takes that side, and resolve(code, ours, theirs) -> entry or None (deleted) is called
+    # only when both sides changed the same code differently. Keeps the order on disk, new entries
+    # of ours go at the end.
+    missing = object()
+    base_by = {}
+    for dtc in base:
+        base_by.setdefault(dtc.get("code"), dtc)
+    ours_by = {}
+    for dtc in ours:
+        ours_by.setdefault(dtc.get("code"), dtc)
+
+    def pick(code, b, o, t):
+        if o is t or o == t or o is b or o == b:
+            return t
+        if t is b or t == b:
+            return o
+        choice = resolve(code, None if o is missing else o, None if t is missing else t)
+        return missing if choice is None else choice
+
+    merged, seen = [], set()
+    for t in theirs:
+        code = t.get("code")
+        if code in seen:
+            merged.append(t)  # duplicate code already in the file, leave it alone
+            continue
+        seen.add(code)
+        dtc = pick(code, base_by.get(code, missing), ours_by.get(code, missing), t)
+        if dtc is not missing:
+            merged.append(dtc)
+    for o in ours:
+        code = o.get("code")
+        if code in seen:
+            continue
+        seen.add(code)
+        dtc = pick(code, base_by.get(code, missing), o, missing)
+        if dtc is not missing:
+            merged.append(dtc)
+    return merged
+
+
+def apply_journal_op(dtcs, record):
+    op = record.get("op")
+    if op == "append":
+        dtcs.append(record["dtc"])
+    elif op == "set":
+        dtcs[record["index"]] = record["dtc"]
+    elif op == "delete":
+        dtcs.pop(record["index"])
+    else:
+        raise ValueError(f"Unknown journal operation '{op}'")
+
+
+class JournalStore:
+    def __init__(self, path):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self._lock = threading.Lock()
+        self._compactor = None
+        self._checked_tail = False
+        self._compactions = {}  # signature before -> after, for the compactions this store did
+
+    def _read_snapshot(self):
+        if not os.path.exists(self.path):
+            return b"", []
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        return raw, json.loads(raw) if raw.strip() else []
+
+    def load(self):
+        # Snapshot + journal replay
+        with self._lock:
+            return self._load()
+
+    def signature(self):
+        # Changes whenever any process writes to the snapshot or the journal
+        state = []
+        for path in (self.path, self.journal_path):
+            try:
+                st = os.stat(path)
+                state.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                state.append(None)
+        return tuple(state)
+
+    def compacted_since(self, version):
+        # The current signature if the only writes since version were this store's own compactions
+        # (same entries, new files), else None
+        after = version
+        while after in self._compactions:
+            after = self._compactions[after]
+        return after if after != version and after == self.signature() else None
+
+    def _load(self):
+        raw, dtcs = self._read_snapshot()
+        if not os.path.exists(self.journal_path):
+            return dtcs
+        base = hashlib.sha1(raw).hexdigest()
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            header = f.readline()
+            try:
+                if json.loads(header).get("base") != base:
+                    # Left over from an interrupted compaction (or the catalog was replaced by hand)
+                    return dtcs
+            except ValueError:
+                print(f"Warning: {self.journal_path} has no valid header, ignoring it.")
+                return dtcs
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn last line from a killed process, the change never completed
+                    break
+                apply_journal_op(dtcs, record)
+        return dtcs
+
+    def _repair_tail(self):
+        # Drop a partial last record left by a crash so new records start on a clean line
+        with open(self.journal_path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+            f.seek(max(0, size - 65536))
+            tail = f.read()
+            if tail.endswith(b"\n"):
+                return
+            cut = tail.rfind(b"\n")
+            f.truncate(size - len(tail) + cut + 1 if cut >= 0 else 0)
+
+    def append(self, record):
+        # O(1) durable append of one change record
+        self.append_many([record])
+
+    def append_many(self, records, compact=True):
+        # Durable append of a batch of change records, one write and one fsync for all of them.
+        # compact=False leaves a big journal alone (a long import compacts once at the end instead).
+        with FileLock(self.path), self._lock:
+            if not os.path.exists(self.journal_path):
+                raw, _ = self._read_snapshot()
+                header = json.dumps({"base": hashlib.sha1(raw).hexdigest()}) + "\n"
+                atomic_write_bytes(self.journal_path, header.encode("utf-8"))
+            elif not self._checked_tail:
+                self._repair_tail()
+            self._checked_tail = True
+            with open(self.journal_path, "ab") as f:
+                f.write("".join(json.dumps(record) + "\n" for record in records).encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+        if compact and os.path.getsize(self.journal_path) > JOURNAL_COMPACT_BYTES:
+            self.compact_in_background()
+
+    def compact(self, dtcs=None):
+        # Fold the journal into a new snapshot. dtcs, if given, is the full current catalog.
+        with FileLock(self.path), self._lock:
+            before = self.signature()
+            if dtcs is None:
+                dtcs = self._load()
+            snapshot = json.dumps(dtcs, indent=4).encode("utf-8")
+            header = json.dumps({"base": hashlib.sha1(snapshot).hexdigest()}) + "\n"
+            atomic_write_bytes(self.path, snapshot)
+            atomic_write_bytes(self.journal_path, header.encode("utf-8"))
+            self._checked_tail = True
+            self._compactions[before] = self.signature()
+
+    def compact_in_background(self):
+        if self._compactor is not None and self._compactor.is_alive():
+            return self._compactor
+        self._compactor = threading.Thread(target=self.compact, daemon=True)
+        self._compactor.start()
+        return self._compactor
+
+    def wait(self):
+        # Let a running background compaction finish (call before exiting)
+        if self._compactor is not None:
+            self._compactor.join()
+
+
+# ===================== SQLite storage =====================
+#
+# One row per DTC, possible_fixes stored as a JSON list. Row order (id) is the catalog order, so the
+# same index based change records as the journal ("append"/"set"/"delete") work here too.
+# sort_header/sort_number hold the PDF sort key so exports can be read back already sorted.
+# Positions map to row ids through an in-memory array, so an edit or delete touches one row instead
+# of counting its way down the table; it is re-read if another connection changed the database.
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dtcs (
+    id INTEGER PRIMARY KEY,
+    code TEXT NOT NULL,
+    header TEXT,
+    category TEXT,
+    title TEXT,
+    description TEXT,
+    possible_fixes TEXT,
+    pinpoint_test TEXT,
+    sort_header INTEGER,
+    sort_number INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_dtcs_code ON dtcs (code);
+CREATE INDEX IF NOT EXISTS idx_dtcs_header ON dtcs (header);
+CREATE INDEX IF NOT EXISTS idx_dtcs_category ON dtcs (category);
+CREATE INDEX IF NOT EXISTS idx_dtcs_pinpoint ON dtcs (pinpoint_test);
+CREATE INDEX IF NOT EXISTS idx_dtcs_sort ON dtcs (sort_header, sort_number, id);
+"""
+
+DTC_COLUMNS = "code, header, category, title, description, possible_fixes, pinpoint_test"
+
+
+def _row_to_dtc(row):
+    return {
+        "code": row[0],
+        "header": row[1],
+        "category": row[2],
+        "title": row[3],
+        "description": row[4],
+        "possible_fixes": json.loads(row[5]) if row[5] else [],
+        "pinpoint_test": row[6]
+    }
+
+
+class SQLiteStore:
+    def __init__(self, path, sort_key):
+        import sqlite3
+        self.path = path
+        self.sort_key = sort_key
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SQLITE_SCHEMA)
+        self._rowids = None          # row id of each position, read on the first positional change
+        self._rowids_version = None  # PRAGMA data_version it was read at
+
+    def _row_values(self, dtc):
+        sort_header, sort_number = self.sort_key(dtc)
+        return (
+            dtc.get("code", ""), dtc.get("header", ""), dtc.get("category", ""),
+            dtc.get("title", ""), dtc.get("description", ""),
+            json.dumps(dtc.get("possible_fixes", [])), dtc.get("pinpoint_test", ""),
+            sort_header, sort_number
+        )
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM dtcs").fetchone()[0]
+
+    def load(self):
+        rows = self.conn.execute(f"SELECT {DTC_COLUMNS} FROM dtcs ORDER BY id")
+        return [_row_to_dtc(row) for row in rows]
+
+    def load_sorted(self):
+        # Export order straight from idx_dtcs_sort, no sort in Python
+        rows = self.conn.execute(
+            f"SELECT {DTC_COLUMNS} FROM dtcs ORDER BY sort_header, sort_number, id")
+        return [_row_to_dtc(row) for row in rows]
+
+    def iter_sorted(self, batch_size=1000):
+        # Same as load_sorted but yields rows as they are read, for streaming exports
+        return self._iter_rows("ORDER BY sort_header, sort_number, id", batch_size)
+
+    def iter_all(self, batch_size=1000):
+        # Catalog order, one batch of rows in memory at a time
+        return self._iter_rows("ORDER BY id", batch_size)
+
+    def _iter_rows(self, order_by, batch_size):
+        cursor = self.conn.execute(f"SELECT {DTC_COLUMNS} FROM dtcs {order_by}")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield _row_to_dtc(row)
+
+    def page(self, offset, limit):
+        rows = self.conn.execute(
+            f"SELECT {DTC_COLUMNS} FROM dtcs ORDER BY id LIMIT ? OFFSET ?", (limit, offset))
+        return [_row_to_dtc(row) for row in rows]
+
+    def query(self, code=None, header=None, category=None, pinpoint_test=None):
+        # Filtered listing using the column indexes, results in catalog order
+        where, params = [], []
+        for column, value in (("code", code), ("header", header),
+                              ("category", category), ("pinpoint_test", pinpoint_test)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        sql = f"SELECT {DTC_COLUMNS} FROM dtcs"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return [_row_to_dtc(row) for row in self.conn.execute(sql + " ORDER BY id", params)]
+
+    def _positions(self):
+        # The position -> row id array, re-read when another connection has committed since
+        # (data_version only changes for other connections' writes, not this one's)
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._rowids is None or version != self._rowids_version:
+            rows = self.conn.execute("SELECT id FROM dtcs ORDER BY id")
+            self._rowids = array.array("q", (row[0] for row in rows))
+            self._rowids_version = version
+        return self._rowids
+
+    def _rowid_at(self, index):
+        rowids = self._positions()
+        if not 0 <= index < len(rowids):
+            raise IndexError(f"No DTC at position {index}")
+        return rowids[index]
+
+    def _appended(self):
+        # Row ids of rows just inserted, they always come after the ones known (ids only grow at the end)
+        if self._rowids is not None:
+            last = self._rowids[-1] if self._rowids else 0
+            rows = self.conn.execute("SELECT id FROM dtcs WHERE id > ? ORDER BY id", (last,))
+            self._rowids.extend(row[0] for row in rows)
+
+    def apply(self, record):
+        # Same change records as the journal
+        self.apply_many([record])
+
+    def apply_many(self, records):
+        # A batch of change records in one transaction, all of them or none
+        try:
+            with self.conn:
+                for op, group in itertools.groupby(records, key=lambda record: record.get("op")):
+                    if op == "append":
+                        # Runs of appends (an import) go in with one statement
+                        self.conn.executemany(
+                            f"INSERT INTO dtcs ({DTC_COLUMNS}, sort_header, sort_number) VALUES (?,?,?,?,?,?,?,?,?)",
+                            (self._row_values(record["dtc"]) for record in group))
+                        self._appended()
+                    else:
+                        for record in group:
+                            self._apply(record)
+        except BaseException:
+            self._rowids = None  # rolled back, the array may have changes the table doesn't
+            raise
+
+    def _apply(self, record):
+        op = record.get("op")
+        if op == "append":
+            self.conn.execute(
+                f"INSERT INTO dtcs ({DTC_COLUMNS}, sort_header, sort_number) VALUES (?,?,?,?,?,?,?,?,?)",
+                self._row_values(record["dtc"]))
+            self._appended()
+        elif op == "set":
+            self.conn.execute(
+                "UPDATE dtcs SET code=?, header=?, category=?, title=?, description=?, "
+                "possible_fixes=?, pinpoint_test=?, sort_header=?, sort_number=? WHERE id=?",
+                self._row_values(record["dtc"]) + (self._rowid_at(record["index"]),))
+        elif op == "delete":
+            self.conn.execute("DELETE FROM dtcs WHERE id=?", (self._rowid_at(record["index"]),))
+            del self._rowids[record["index"]]
+        else:
+            raise ValueError(f"Unknown change operation '{op}'")
+
+    def replace_all(self, dtcs):
+        # Full save in one transaction, a crash rolls back to the previous catalog
+        self._rowids = None
+        with self.conn:
+            self.conn.execute("DELETE FROM dtcs")
+            self.conn.executemany(
+                f"INSERT INTO dtcs ({DTC_COLUMNS}, sort_header, sort_number) VALUES (?,?,?,?,?,?,?,?,?)",
+                (self._row_values(dtc) for dtc in dtcs))
+
+    def import_json(self, json_path):
+        # One-shot migration from a custom_dtcs.json file, returns the number of DTCs imported
+        with open(json_path, "r") as f:
+            dtcs = json.load(f)
+        self.replace_all(dtcs)
+        return len(dtcs)
+
+    def lazy_list(self, page_size=25):
+        return LazyDTCList(self, page_size)
+
+    def close(self):
+        self.conn.close()
+
+
+class LazyDTCList:
+    # List view over a SQLiteStore that fetches one page at a time, so the paginated editor never
+    # loads the whole catalog. Fetched and assigned entries are kept in memory (nothing is written back).
+    def __init__(self, store, page_size=25):
+        self.store = store
+        self.page_size = page_size
+        self._length = store.count()
+        self._cache = {}
+
+    def __len__(self):
+        return self._length
+
+    def _fetch(self, index):
+        if index not in self._cache:
+            start = index - index % self.page_size
+            for i, dtc in enumerate(self.store.page(start, self.page_size), start):
+                self._cache.setdefault(i, dtc)
+        return self._cache[index]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._fetch(i) for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("DTC index out of range")
+        return self._fetch(index)
+
+    def __setitem__(self, index, dtc):
+        self._cache[index] = dtc
+
+    def __iter__(self):
+        # One pass over the table rather than a page query every page_size entries. Entries assigned
+        # or already fetched are the ones handed out, the rest aren't kept.
+        for i, dtc in zip(range(self._length), self.store.iter_all()):
+            yield self._cache.get(i, dtc)
@@ -0,0 +1,143 @@
+import bisect
+import struct
+
+# Loader for the compiled DTC table written by `custom_dtc_builder.py compile` (see dtc_compile.py).
+# Only needs the standard library, so it can be copied next to a simulator or test script on its own.
+#
+# File layout, all integers little endian:
+#   header          "<4sHHIIIIII": magic b"DTCB", version, flags, entry_count, category_count,
+#                   fix_ref_count, pool_size, hash_buckets, hash_slots
+#   header names    4 x u32 string offsets, in code order (P, C, B, U)
+#   category names  category_count x u32 string offsets
+#   entries         entry_count x "<HBBIIII": code, category, fix_count, title, description,
+#                   pinpoint_test, first_fix. Sorted by code, so they can be binary searched.
+#   fix refs        fix_ref_count x u32 string offsets, an entry's fixes are fix_count refs from first_fix
+#   hash buckets    hash_buckets x u16 displacements  (only if flags & TABLE_FLAG_HASH)
+#   hash slots      hash_slots x u16 entry indexes, 0xFFFF = empty
+#   string pool     pool_size bytes of NUL terminated UTF-8 strings, each distinct string stored once
+
+TABLE_MAGIC = b"DTCB"
+TABLE_VERSION = 1
+TABLE_FLAG_HASH = 1
+
+HEADER_FORMAT = struct.Struct("<4sHHIIIIII")
+ENTRY_FORMAT = struct.Struct("<HBBIIII")
+
+CATEGORY_NONE = 0xFF
+HASH_EMPTY = 0xFFFF
+
+# Packed 16-bit code, same layout as the SAE J2012 two-byte DTC:
+#   bits 15-14  header (P=0, C=1, B=2, U=3)
+#   bits 13-12  first digit
+#   bits 11-0   last three digits (hex)
+# Custom codes always start with 4 (P4101), and J2012 only has room for first digits 0-3, so the
+# first digit is stored as an offset from CODE_FIRST_DIGIT, which covers P4000-P7FFF.
+CODE_HEADERS = "PCBU"
+CODE_FIRST_DIGIT = 4
+
+
+def pack_code(code):
+    # "P4101" -> 0x0101, raises ValueError if the code can't be packed
+    code = str(code).strip().upper()
+    if len(code) != 5 or code[0] not in CODE_HEADERS:
+        raise ValueError(f"Can't pack DTC code '{code}', expected a header letter and 4 digits (e.g. P4101)")
+    try:
+        first = int(code[1], 16) - CODE_FIRST_DIGIT
+        rest = int(code[2:], 16)
+    except ValueError:
+        raise ValueError(f"Can't pack DTC code '{code}', digits must be hex") from None
+    if not 0 <= first <= 3:
+        raise ValueError(f"Can't pack DTC code '{code}', first digit must be "
+                         f"{CODE_FIRST_DIGIT}-{CODE_FIRST_DIGIT + 3}")
+    return CODE_HEADERS.index(code[0]) << 14 | first << 12 | rest
+
+
+def unpack_code(value):
+    # 0x0101 -> "P4101"
+    return f"{CODE_HEADERS[value >> 14 & 3]}{(value >> 12 & 3) + CODE_FIRST_DIGIT:X}{value & 0xFFF:03X}"
+
+
+def table_hash(key, seed):
+    # 32-bit mix used by the perfect hash. Must match dtc_hash() in the generated C source.
+    h = (key ^ (seed * 0x9E3779B1)) & 0xFFFFFFFF
+    h = (h * 0x85EBCA6B) & 0xFFFFFFFF
+    return h ^ (h >> 13)
+
+
+class DTCTable:
+    # Read-only view of a compiled table. Strings are decoded when an entry is looked up.
+    def __init__(self, data):
+        if isinstance(data, str):
+            with open(data, "rb") as f:
+                data = f.read()
+        self.data = data
+        (magic, version, self.flags, count, category_count, fix_ref_count,
+         pool_size, self.hash_buckets, self.hash_slots) = HEADER_FORMAT.unpack_from(data, 0)
+        if magic != TABLE_MAGIC:
+            raise ValueError("Not a compiled DTC table (bad magic)")
+        if version != TABLE_VERSION:
+            raise ValueError(f"Unsupported DTC table version {version}, expected {TABLE_VERSION}")
+
+        offset = HEADER_FORMAT.size
+        self._header_names = struct.unpack_from("<4I", data, offset)
+        offset += 16
+        self._category_names = struct.unpack_from(f"<{category_count}I", data, offset)
+        offset += 4 * category_count
+        self._entries_offset = offset
+        self.codes = [ENTRY_FORMAT.unpack_from(data, offset + i * ENTRY_FORMAT.size)[0] for i in range(count)]
+        offset += ENTRY_FORMAT.size * count
+        self._fix_refs = struct.unpack_from(f"<{fix_ref_count}I", data, offset)
+        offset += 4 * fix_ref_count
+        if self.flags & TABLE_FLAG_HASH:
+            self._buckets = struct.unpack_from(f"<{self.hash_buckets}H", data, offset)
+            offset += 2 * self.hash_buckets
+            self._slots = struct.unpack_from(f"<{self.hash_slots}H", data, offset)
+            offset += 2 * self.hash_slots
+        self._pool_offset = offset
+        if offset + pool_size != len(data):
+            raise ValueError("Compiled DTC table is truncated or has trailing data")
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _string(self, offset):
+        start = self._pool_offset + offset
+        return self.data[start:self.data.index(b"\0", start)].decode("utf-8")
+
+    def entry(self, index):
+        # Entry at a position in code order, as a catalog style dict
+        code, category, fix_count, title, description, pinpoint, first_fix = ENTRY_FORMAT.unpack_from(
+            self.data, self._entries_offset + index * ENTRY_FORMAT.size)
+        return {
+            "code": unpack_code(code),
+            "header": self._string(self._header_names[code >> 14]),
+            "category": self._string(self._category_names[category]) if category != CATEGORY_NONE else "",
+            "title": self._string(title),
+            "description": self._string(description),
+            "possible_fixes": [self._string(ref) for ref in self._fix_refs[first_fix:first_fix + fix_count]],
+            "pinpoint_test": self._string(pinpoint)
+        }
+
+    def index_of(self, code):
+        # Binary search, O(log n). code can be a string ("P4101") or a packed value. -1 if missing.
+        packed = code if isinstance(code, int) else pack_code(code)
+        i = bisect.bisect_left(self.codes, packed)
+        return i if i < len(self.codes) and self.codes[i] == packed else -1
+
+    def hash_index_of(self, code):
+        # Same result as index_of through the perfect hash, O(1)
+        if not self.flags & TABLE_FLAG_HASH:
+            return self.index_of(code)
+        packed = code if isinstance(code, int) else pack_code(code)
+        seed = self._buckets[table_hash(packed, 0) % self.hash_buckets]
+        i = self._slots[table_hash(packed, seed) % self.hash_slots]
+        return i if i != HASH_EMPTY and self.codes[i] == packed else -1
+
+    def find(self, code):
+        # Catalog style dict for a code, or None
+        i = self.hash_index_of(code)
+        return self.entry(i) if i >= 0 else None
+
+    def __iter__(self):
+        for i in range(len(self.codes)):
+            yield self.entry(i)
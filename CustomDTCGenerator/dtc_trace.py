@@ -0,0 +1,209 @@
+import atexit
+import datetime
+import os
+import sys
+import time
+
+# Stage timing for custom_dtc_builder.py: --trace [FILE] / --cprofile FILE, or DTC_TRACE=trace.json
+# and DTC_CPROFILE=run.prof (DTC_TRACE_MEMORY=1 adds tracemalloc peaks). Off by default, the hooks then do nothing.
+
+DEFAULT_TRACE_FILE = "dtc_trace.json"
+
+enabled = False
+_trace_file = None
+_profiler = None
+_profile_file = None
+_memory = False
+_pid = None
+_started = None
+_started_at = None
+_stages = []        # stage records, in start order
+_open = []          # (record, start time) of the stages running now, innermost last
+_pauses = 0.0
+_pages = []         # seconds per finished page
+_page_started = None
+
+
+class _NullStage:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, name, counts):
+        self.record = {"name": name, **counts}
+
+    def __enter__(self):
+        record = self.record
+        record["depth"] = len(_open)
+        record["start_s"] = round(time.perf_counter() - _started, 4)
+        record["pause_s"] = 0.0
+        _stages.append(record)
+        if _memory:
+            import tracemalloc
+            if _open:
+                # The parent's peak so far, before the child resets it
+                parent = _open[-1][0]
+                parent["_peak"] = max(parent.get("_peak", 0), tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        _open.append((record, time.perf_counter()))
+        return record
+
+    def __exit__(self, *exc):
+        _close_stage()
+        return False
+
+
+def _close_stage():
+    record, start = _open.pop()
+    seconds = time.perf_counter() - start
+    record["seconds"] = round(seconds, 4)
+    record["work_s"] = round(seconds - record["pause_s"], 4)
+    record["pause_s"] = round(record["pause_s"], 4)
+    record["peak_rss_mb"] = peak_rss_mb()
+    if _memory:
+        import tracemalloc
+        peak = max(record.pop("_peak", 0), tracemalloc.get_traced_memory()[1])
+        record["peak_alloc_mb"] = round(peak / (1024 * 1024), 1)
+        if _open:
+            parent = _open[-1][0]
+            parent["_peak"] = max(parent.get("_peak", 0), peak)
+
+
+def peak_rss_mb():
+    # Peak resident memory of this process so far, None where the resource module is missing (Windows)
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def enable(trace_file=None, profile_file=None, memory=None):
+    # Start recording. trace_file defaults to DEFAULT_TRACE_FILE, profile_file also runs cProfile.
+    # Both are written when the process exits (or by finish()).
+    global enabled, _trace_file, _profiler, _profile_file, _memory, _pid, _started, _started_at
+    if not enabled:
+        enabled = True
+        _pid = os.getpid()
+        _started = time.perf_counter()
+        _started_at = datetime.datetime.now().isoformat(timespec="seconds")
+        atexit.register(finish)
+    _trace_file = trace_file or _trace_file or DEFAULT_TRACE_FILE
+    if memory if memory is not None else os.environ.get("DTC_TRACE_MEMORY"):
+        import tracemalloc
+        tracemalloc.start()
+        _memory = True
+    if profile_file and _profiler is None:
+        import cProfile
+        _profile_file = profile_file
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def stage(name, **counts):
+    # with stage("load.parse", bytes=n): ...  Nested stages are recorded with their depth.
+    if not enabled:
+        return _NULL_STAGE
+    return _Stage(name, counts)
+
+
+def note(**counts):
+    # Adds counts (entries=..., pages=...) to the innermost running stage
+    if enabled and _open:
+        _open[-1][0].update(counts)
+
+
+def pause(seconds):
+    # The status message pauses (time.sleep), recorded apart from the work around them
+    time.sleep(seconds)
+    if enabled:
+        global _pauses
+        _pauses += seconds
+        for record, _ in _open:
+            record["pause_s"] += seconds
+
+
+def timed_pages(footer):
+    # footer(canvas, doc) that also records when each page starts. PDF footers run at the start of
+    # every page, so a page lasts until the next footer call (or pages_done() after doc.build).
+    if not enabled:
+        return footer
+
+    def timed_footer(canvas, doc):
+        _page_start()
+        if _open:
+            record = _open[-1][0]
+            record["pages"] = record.get("pages", 0) + 1
+        footer(canvas, doc)
+    return timed_footer
+
+
+def _page_start():
+    global _page_started
+    now = time.perf_counter()
+    if _page_started is not None:
+        _pages.append(now - _page_started)
+    _page_started = now
+
+
+def pages_done():
+    # The last page of a document is finished
+    global _page_started
+    if enabled and _page_started is not None:
+        _page_start()
+        _page_started = None
+
+
+def trace():
+    # The trace so far, as written by finish()
+    slowest = max(range(len(_pages)), key=_pages.__getitem__, default=None)
+    return {
+        "argv": sys.argv,
+        "python": sys.version.split()[0],
+        "started": _started_at,
+        "seconds": round(time.perf_counter() - _started, 4),
+        "pause_s": round(_pauses, 4),
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": _stages,
+        "pages": {
+            "count": len(_pages),
+            "seconds": [round(seconds, 4) for seconds in _pages],
+            "slowest": None if slowest is None else [slowest + 1, round(_pages[slowest], 4)],
+        },
+    }
+
+
+def finish():
+    # Writes the trace (and cProfile dump) and stops recording. Runs at exit when enabled.
+    global enabled, _profiler
+    if not enabled or os.getpid() != _pid:
+        return
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(_profile_file)
+        _profiler = None
+    pages_done()
+    while _open:
+        _open[-1][0]["unfinished"] = True
+        _close_stage()
+    import dtc_storage
+    dtc_storage.atomic_write_json(_trace_file, trace())
+    enabled = False
+    print(f"Trace saved to {_trace_file}" + (f", profile to {_profile_file}" if _profile_file else ""),
+          file=sys.stderr)
+
+
+if os.environ.get("DTC_TRACE") or os.environ.get("DTC_CPROFILE"):
+    _value = os.environ.get("DTC_TRACE", "")
+    enable(None if _value in ("", "1") else _value, os.environ.get("DTC_CPROFILE"))
+    # Worker processes started with spawn would otherwise each overwrite the trace
+    os.environ.pop("DTC_TRACE", None)
+    os.environ.pop("DTC_CPROFILE", None)
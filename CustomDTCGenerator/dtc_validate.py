@@ -0,0 +1,235 @@
+import concurrent.futures
+import itertools
+import os
+import re
+
+import custom_dtc_builder as builder
+import dtc_trace
+
+# Catalog validator (validate command, and the check before every export in custom_dtc_builder.py).
+#
+# One pass over the catalog. Every entry is checked on its own (code layout, header/category against
+# the code, empty or missing fields, fields too long for the PDF table, ReportLab markup), and the
+# codes seen so far are kept to catch duplicates. Large catalogs are checked in chunks by worker
+# processes; the duplicate check runs in this process as the chunk results come back, in order.
+#
+# The report is a plain dict that can be saved as JSON:
+#   {"entries": n, "errors": n, "warnings": n,
+#    "issues": [{"index", "code", "severity", "check", "field", "message"}]}
+# Errors would break or scramble an export (exports stop on them), warnings only look wrong.
+
+# Catalogs at least this big are checked in parallel, VALIDATE_CHUNK entries per job
+VALIDATE_PARALLEL_MIN = 50000
+VALIDATE_CHUNK = 10000
+
+# PDF table layout, same as PDF_COL_WIDTHS in dtc_render_pdf.py (points, 4pt padding each side) and
+# the page it goes on (letter, 36pt margins). A table row can't be split across pages, so a row taller
+# than a page stops the export.
+PDF_COLUMNS = {"code": 55, "category": 95, "title": 95, "description": 130, "possible_fixes": 130, "pinpoint_test": 65}
+PDF_LINE_HEIGHT = 12
+PDF_CHAR_WIDTH = 5.0  # average Helvetica 10pt character, a little on the wide side
+PDF_MAX_ROW_HEIGHT = 680
+
+# Longest sensible value per field, longer ones are warned about
+MAX_FIELD_LENGTHS = {"title": 120, "description": 1000, "pinpoint_test": 20, "possible_fixes": 250}
+
+TEXT_FIELDS = ("code", "header", "category", "title", "description", "pinpoint_test")
+# field -> (characters per line, pattern for a word wider than the column)
+_COLUMN_FIT = {field: (int((width - 8) / PDF_CHAR_WIDTH),
+                       re.compile(r"\S{%d,}" % (int((width - 8) / PDF_CHAR_WIDTH) + 1)))
+               for field, width in PDF_COLUMNS.items()}
+_SORTABLE_CODE = re.compile(r"[A-Z][0-9]{4,}")
+_TAG = re.compile(r"<(/?)([a-zA-Z]+)[^<>]*?(/?)>")
+
+
+def _issue(index, dtc, severity, check, field, message):
+    code = dtc.get("code") if isinstance(dtc, dict) else None
+    return {"index": index, "code": code, "severity": severity, "check": check, "field": field, "message": message}
+
+
+_markup_checked = {}  # text -> error, categories and common fixes repeat on thousands of entries
+
+
+def _markup_error(text, parser):
+    # None if ReportLab can lay out text as a Paragraph, else why not. Only text with tags or
+    # entities needs parsing, everything else is plain.
+    if "<" not in text and "&" not in text:
+        return None
+    if text not in _markup_checked:
+        if len(_markup_checked) >= 10000:
+            _markup_checked.clear()
+        _markup_checked[text] = _parse_markup(text, parser)
+    return _markup_checked[text]
+
+
+def _parse_markup(text, parser):
+    if parser is not None:
+        try:
+            parser(text)
+        except Exception as e:
+            # ReportLab repeats the whole paragraph before the reason
+            return str(e).strip().split("caused exception ")[-1][:200] or type(e).__name__
+        return None
+    # Without ReportLab: tags must at least be balanced
+    open_tags = []
+    for closing, tag, self_closing in _TAG.findall(text):
+        tag = tag.lower()
+        if self_closing or tag == "br":
+            continue
+        if not closing:
+            open_tags.append(tag)
+        elif not open_tags or open_tags.pop() != tag:
+            return f"unexpected </{tag}>"
+    return f"<{open_tags[-1]}> is never closed" if open_tags else None
+
+
+def _paragraph_parser():
+    if not builder.PDFEnabled:
+        return None
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import Paragraph
+    style = getSampleStyleSheet()["Normal"]
+    return lambda text: Paragraph(text, style)
+
+
+def check_dtc(index, dtc, parser=None):
+    # Issues with one entry on its own
+    if not isinstance(dtc, dict):
+        return [_issue(index, dtc, "error", "malformed_entry", None, "Entry is not a JSON object")]
+    issues = []
+    for field in TEXT_FIELDS:
+        if not isinstance(dtc.get(field), str):
+            issues.append(_issue(index, dtc, "error", "missing_field", field,
+                                 f"'{field}' is {'missing' if field not in dtc else 'not text'}"))
+    fixes = dtc.get("possible_fixes")
+    if not isinstance(fixes, list) or not all(isinstance(fix, str) for fix in fixes):
+        issues.append(_issue(index, dtc, "error", "missing_field", "possible_fixes",
+                             "'possible_fixes' must be a list of text"))
+        fixes = []
+    if not isinstance(dtc.get("code"), str):
+        return issues
+
+    code = dtc["code"]
+    if not _SORTABLE_CODE.fullmatch(code) or code[0] not in builder.HEADERS:
+        issues.append(_issue(index, dtc, "error", "malformed_code", "code",
+                             f"'{code}' is not a header letter ({'/'.join(builder.HEADERS)}) and digits, it would sort last"))
+    else:
+        header = dtc.get("header")
+        if isinstance(header, str):
+            if header not in builder.HEADER_KEYS:
+                issues.append(_issue(index, dtc, "error", "unknown_header", "header", f"Unknown header '{header}'"))
+            elif builder.HEADER_KEYS[header] != code[0]:
+                issues.append(_issue(index, dtc, "error", "header_mismatch", "header",
+                                     f"Header '{header}' doesn't match code letter {code[0]} "
+                                     f"({builder.HEADERS[code[0]]})"))
+        category = dtc.get("category")
+        if isinstance(category, str):
+            cat_key = builder.CATEGORY_KEYS.get(category)
+            if cat_key is None:
+                issues.append(_issue(index, dtc, "error", "unknown_category", "category", f"Unknown category '{category}'"))
+            elif code[1:3] != cat_key[1:3]:
+                issues.append(_issue(index, dtc, "error", "category_mismatch", "category",
+                                     f"Category '{category}' ({cat_key}) doesn't match code {code}"))
+
+    if isinstance(dtc.get("title"), str) and not dtc["title"].strip():
+        issues.append(_issue(index, dtc, "error", "empty_title", "title", "Title is empty"))
+
+    # Layout: long values, words wider than their column, rows taller than a page (estimated wrapped lines)
+    row_lines = 0
+    for field, (chars, long_word) in _COLUMN_FIT.items():
+        if field == "possible_fixes":
+            texts = fixes or ["-"]
+        else:
+            texts = [dtc[field]] if isinstance(dtc.get(field), str) else []
+        limit = MAX_FIELD_LENGTHS.get(field)
+        lines = 0
+        for text in texts:
+            if limit and len(text) > limit:
+                issues.append(_issue(index, dtc, "warning", "field_too_long", field,
+                                     f"{len(text)} characters, more than {limit}"))
+            word = long_word.search(text)
+            if word:
+                issues.append(_issue(index, dtc, "warning", "long_word", field,
+                                     f"'{word.group()[:30]}' is wider than the column and will overflow it"))
+            error = _markup_error(text, parser)
+            if error:
+                issues.append(_issue(index, dtc, "error", "markup", field, f"Invalid markup: {error}"))
+            lines += len(text) // chars + 1
+        row_lines = max(row_lines, lines)
+    if row_lines * PDF_LINE_HEIGHT + 6 > PDF_MAX_ROW_HEIGHT:
+        issues.append(_issue(index, dtc, "error", "row_too_tall", None,
+                             f"About {row_lines} lines in one table row, more than fit on a page"))
+    return issues
+
+
+def _check_chunk(job):
+    # Worker: (first index, entries) -> (issues, [code per entry])
+    start, dtcs = job
+    parser = _paragraph_parser()
+    issues = []
+    for i, dtc in enumerate(dtcs, start):
+        issues.extend(check_dtc(i, dtc, parser))
+    return issues, [dtc.get("code") if isinstance(dtc, dict) else None for dtc in dtcs]
+
+
+def _chunks(dtcs):
+    iterator = iter(dtcs)
+    start = 0
+    while True:
+        chunk = list(itertools.islice(iterator, VALIDATE_CHUNK))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+
+def _parallel_results(dtcs, workers):
+    # Chunk results in order, with only a few chunks in flight so an iterator isn't read all at once
+    workers = workers or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for job in _chunks(dtcs):
+            pending.append(pool.submit(_check_chunk, job))
+            if len(pending) >= 2 * workers:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+
+def validate(dtcs, workers=None):
+    # Report for dtcs (a list or any iterable, e.g. rows streamed from SQLite). workers=1 never
+    # starts worker processes.
+    big = not hasattr(dtcs, "__len__") or len(dtcs) >= VALIDATE_PARALLEL_MIN
+    if workers != 1 and big:
+        results = _parallel_results(dtcs, workers)
+    else:
+        results = map(_check_chunk, _chunks(dtcs))
+    first_index = {}
+    issues = []
+    entries = 0
+    with dtc_trace.stage("validate"):
+        for chunk_issues, codes in results:
+            issues.extend(chunk_issues)
+            for i, code in enumerate(codes, entries):
+                if code is None:
+                    continue
+                if code in first_index:
+                    issues.append({"index": i, "code": code, "severity": "error", "check": "duplicate_code",
+                                   "field": "code", "message": f"Same code as entry {first_index[code] + 1}"})
+                else:
+                    first_index[code] = i
+            entries += len(codes)
+        dtc_trace.note(entries=entries, issues=len(issues))
+    issues.sort(key=lambda issue: issue["index"])
+    errors = sum(issue["severity"] == "error" for issue in issues)
+    return {"entries": entries, "errors": errors, "warnings": len(issues) - errors, "issues": issues}
+
+
+def print_report(report, limit=50):
+    # limit=None prints every issue
+    for issue in report["issues"][:limit]:
+        field = f" {issue['field']}" if issue["field"] else ""
+        print(f"{issue['severity'].upper():<8}entry {issue['index'] + 1} {issue['code'] or '?'}{field}: {issue['message']}")
+    if limit is not None and len(report["issues"]) > limit:
+        print(f"... and {len(report['issues']) - limit} more")
+    print(f"Checked {report['entries']} DTC(s): {report['errors']} error(s), {report['warnings']} warning(s)")
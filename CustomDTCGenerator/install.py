@@ -3,7 +3,12 @@ import subprocess
 import sys
 
 # Dependencies
-dependencies = [("reportlab", True)]
+dependencies = [("reportlab", True), ("pypdf", False), ("numpy", False)]
+# The full-screen DTC browser needs curses, which Python on Windows doesn't come with
+if sys.platform == "win32":
+    dependencies.append(("curses", False))
+# pip package where it isn't named after the module
+pipNames = {"curses": "windows-curses"}
 mainScript = "custom_dtc_builder.py"
 
 # Loop for each dependency
@@ -27,7 +32,7 @@ for dep, is_critical in dependencies:
                 print(f"Install of '{dep}' skipped")
         elif install == "y":
             try:
-                subprocess.check_call([sys.executable, "-m", "pip", "install", dep])
+                subprocess.check_call([sys.executable, "-m", "pip", "install", pipNames.get(dep, dep)])
             except Exception as e:
                 print(f"'{dep}' failed to install. Exception: {e}")
                 quit()
@@ -0,0 +1,74 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import custom_dtc_builder as builder  # noqa: E402
+
+# Shared helpers for the tests: a catalog in a temporary folder and the builder reset around each test.
+
+
+def make_dtc(code, title="", header="Powertrain", category="Sensor Networks", fixes=(), pinpoint=""):
+    return {
+        "code": code,
+        "header": header,
+        "category": category,
+        "title": title,
+        "description": "",
+        "possible_fixes": list(fixes),
+        "pinpoint_test": pinpoint
+    }
+
+
+def reset_builder():
+    # Drop everything the builder keeps per catalog between sessions
+    builder.close_storage()
+    builder.forget_catalogs()
+
+
+class CatalogTestCase(unittest.TestCase):
+    # Each test gets its own catalog file, storage mode STORAGE
+    STORAGE = "json"
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="dtc_test_")
+        self.path = os.path.join(self.dir, "custom_dtcs.json")
+        saved = (builder.JSON_FILE, builder.STORAGE_MODE, builder.ON_CONFLICT)
+        reset_builder()
+        builder.JSON_FILE, builder.STORAGE_MODE, builder.ON_CONFLICT = self.path, self.STORAGE, "fail"
+
+        def restore():
+            reset_builder()
+            builder.JSON_FILE, builder.STORAGE_MODE, builder.ON_CONFLICT = saved
+            shutil.rmtree(self.dir, ignore_errors=True)
+        self.addCleanup(restore)
+
+    def write_catalog(self, dtcs):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(dtcs, f, indent=4)
+
+    def write_file(self, name, text):
+        path = os.path.join(self.dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def read_catalog(self):
+        # The catalog as a fresh session would load it
+        reset_builder()
+        return builder.load_dtcs(quiet=True)
+
+    def run_cli(self, *argv):
+        # (exit code, printed output) of one command against this test's catalog
+        reset_builder()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            code = builder.cli(["--file", self.path, "--storage", self.STORAGE, *argv])
+        reset_builder()
+        return code, output.getvalue()
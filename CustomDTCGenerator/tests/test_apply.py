@@ -0,0 +1,124 @@
+import json
+import unittest
+
+from support import CatalogTestCase, make_dtc
+
+
+class ApplyTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.original = [make_dtc("P4101", "Sensor A", fixes=["Check wiring", "Replace sensor"]),
+                         make_dtc("P4102", "Sensor B")]
+        self.write_catalog(self.original)
+
+    def apply(self, changes):
+        return self.run_cli("apply", self.write_file("changes.json", json.dumps(changes)))
+
+    def assert_not_saved(self, code, output, message):
+        self.assertEqual(code, 1)
+        self.assertIn(message, output)
+        self.assertIn("No changes were saved.", output)
+        self.assertEqual(self.read_catalog(), self.original)
+
+    def test_applies_every_change(self):
+        code, output = self.apply([
+            {"op": "add", "header": "P", "category": "x41xx", "number": "5", "title": "New"},
+            {"op": "edit", "code": "P4101", "title": "Renamed", "remove_fixes": [1], "add_fixes": ["Reflash"]},
+            {"op": "remove", "code": "P4102"},
+        ])
+        self.assertEqual(code, 0, output)
+        self.assertIn("Applied 3 change(s)", output)
+        catalog = {dtc["code"]: dtc for dtc in self.read_catalog()}
+        self.assertEqual(sorted(catalog), ["P4101", "P4105"])
+        self.assertEqual(catalog["P4101"]["title"], "Renamed")
+        self.assertEqual(catalog["P4101"]["possible_fixes"], ["Replace sensor", "Reflash"])
+
+    def test_jsonl_change_file(self):
+        path = self.write_file("changes.jsonl", '{"op": "remove", "code": "P4102"}\n\n')
+        code, output = self.run_cli("apply", path)
+        self.assertEqual(code, 0, output)
+        self.assertEqual([dtc["code"] for dtc in self.read_catalog()], ["P4101"])
+
+    def test_one_bad_change_saves_nothing(self):
+        code, output = self.apply([
+            {"op": "edit", "code": "P4101", "title": "Renamed"},
+            {"op": "remove", "code": "P4199"},
+        ])
+        self.assert_not_saved(code, output, "Error: Change 2: DTC P4199 not found")
+
+    def test_duplicate_code_saves_nothing(self):
+        code, output = self.apply([
+            {"op": "remove", "code": "P4102"},
+            {"op": "add", "header": "P", "category": "x41xx", "number": "01"},
+        ])
+        self.assert_not_saved(code, output, "Error: Change 2: DTC P4101 already exists")
+
+    def test_missing_field(self):
+        code, output = self.apply([{"op": "add", "header": "P"}])
+        self.assert_not_saved(code, output, "Error: Change 1: missing field 'category'")
+
+    def test_malformed_changes(self):
+        cases = [
+            ([5], "Error: Change 1: expected an object"),
+            ([{"op": "add", "header": 5, "category": "1"}], "Error: Change 1: 'header' must be text"),
+            ([{"op": "edit", "code": "P4101", "category": ["x41xx"]}], "Error: Change 1: 'category' must be text"),
+            ([{"op": "edit", "code": "P4101", "remove_fixes": "1"}], "Error: Change 1: 'remove_fixes' must be a list"),
+            ([{"op": "edit", "code": "P4101", "add_fixes": "Reflash"}], "Error: Change 1: 'add_fixes' must be a list"),
+            ([{"op": "edit", "code": "P4101", "remove_fixes": [3]}], "Error: Change 1: DTC P4101 has no fix number 3"),
+            ([{"op": "add", "header": "P", "category": "1", "number": "abc"}], "Error: Change 1: Invalid number 'abc'"),
+            ([{"op": "add", "header": "P", "category": "1", "number": 123}], "Error: Change 1: Invalid number '123'"),
+            ([{"op": "rename", "code": "P4101"}], "Error: Change 1: Unknown operation 'rename'"),
+        ]
+        for changes, message in cases:
+            with self.subTest(changes=changes):
+                code, output = self.apply(changes)
+                self.assert_not_saved(code, output, message)
+
+    def test_unreadable_change_files(self):
+        cases = [
+            ("changes.json", '[{"op": "remove"', "is not valid JSON"),
+            ("changes.json", '{"op": "remove", "code": "P4101"}', "must hold a JSON array of changes"),
+            ("changes.jsonl", '{"op": "remove", "code": "P4101"}\n{oops\n', "line 2 is not valid JSON"),
+        ]
+        for name, text, message in cases:
+            with self.subTest(text=text):
+                code, output = self.run_cli("apply", self.write_file(name, text))
+                self.assert_not_saved(code, output, message)
+        code, output = self.run_cli("apply", self.write_file("missing.json", "") + ".nope")
+        self.assert_not_saved(code, output, "Error:")
+
+    def test_dry_run_saves_nothing(self):
+        path = self.write_file("changes.json", json.dumps([{"op": "remove", "code": "P4101"}]))
+        code, output = self.run_cli("apply", path, "--dry-run")
+        self.assertEqual(code, 0, output)
+        self.assertEqual(self.read_catalog(), self.original)
+
+
+class ApplyJournalTests(ApplyTests):
+    STORAGE = "journal"
+
+
+class ApplySQLiteTests(ApplyTests):
+    STORAGE = "sqlite"
+
+
+class AddNumberTests(CatalogTestCase):
+    def test_rejects_numbers_that_are_not_two_digits(self):
+        self.write_catalog([])
+        for number in ("abc", "123", "1x", "-1"):
+            with self.subTest(number=number):
+                code, output = self.run_cli("add", "--header", "P", "--category", "x41xx", "--number", number,
+                                             "--title", "T")
+                self.assertEqual(code, 1)
+                self.assertIn(f"Invalid number '{number}'", output)
+                self.assertEqual(self.read_catalog(), [])
+
+    def test_pads_one_digit(self):
+        self.write_catalog([])
+        code, output = self.run_cli("add", "--header", "P", "--category", "x41xx", "--number", "7", "--title", "T")
+        self.assertEqual(code, 0, output)
+        self.assertEqual([dtc["code"] for dtc in self.read_catalog()], ["P4107"])
+
+
+if __name__ == "__main__":
+    unittest.main()
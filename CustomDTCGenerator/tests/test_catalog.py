@@ -0,0 +1,83 @@
+import random
+import unittest
+
+from support import CatalogTestCase, builder, make_dtc
+
+import dtc_bench
+import dtc_codes
+
+
+class DTCCatalogTests(unittest.TestCase):
+    def assert_consistent(self, catalog):
+        # Everything the catalog keeps up to date matches what it would build from scratch
+        fresh = builder.DTCCatalog(list(catalog.dtcs))
+        self.assertEqual(catalog.sorted_dtcs(), sorted(catalog.dtcs, key=builder.dtc_sort_key))
+        for dtc in catalog.dtcs:
+            self.assertEqual(catalog.index_of(dtc["code"]), fresh.index_of(dtc["code"]))
+        self.assertEqual(catalog.allocator().fill(), dtc_codes.CodeAllocator(d["code"] for d in catalog.dtcs).fill())
+
+    def test_changes_keep_the_indexes_in_step(self):
+        rng = random.Random(9)
+        pool = list(dtc_bench.iter_synthetic(400, seed=4))
+        catalog = builder.DTCCatalog(pool[:100])
+        catalog.allocator()
+        catalog.search_index()
+        spare = pool[100:]
+        for _ in range(300):
+            op = rng.choice(["add", "replace", "remove"])
+            if op == "add" and spare:
+                dtc = spare.pop()
+                self.assertEqual(catalog.add(dtc), len(catalog) - 1)
+            elif op == "replace" and spare:
+                index = rng.randrange(len(catalog))
+                old = catalog.dtcs[index]
+                catalog.replace(index, spare.pop())
+                spare.append(old)
+            elif op == "remove" and len(catalog):
+                spare.append(catalog.remove(rng.randrange(len(catalog))))
+        self.assert_consistent(catalog)
+        for dtc in catalog.dtcs[:20]:
+            position = catalog.index_of(dtc["code"])
+            self.assertIn(position, catalog.search(dtc["code"]))
+
+    def test_rejects_duplicate_codes(self):
+        catalog = builder.DTCCatalog([make_dtc("P4101"), make_dtc("P4102")])
+        with self.assertRaisesRegex(ValueError, "P4101 already exists"):
+            catalog.add(make_dtc("P4101"))
+        with self.assertRaisesRegex(ValueError, "P4102 already exists"):
+            catalog.replace(0, make_dtc("P4102"))
+        catalog.replace(0, make_dtc("P4101", "Same code"))
+        self.assertEqual(catalog.get("P4101")["title"], "Same code")
+        self.assertEqual(len(catalog), 2)
+
+    def test_duplicates_in_an_old_file(self):
+        catalog = builder.DTCCatalog([make_dtc("P4101", "First"), make_dtc("P4101", "Second"), make_dtc("P4102")])
+        self.assertEqual(catalog.get("P4101")["title"], "First")
+        catalog.remove(0)
+        self.assertEqual(catalog.get("P4101")["title"], "Second")
+        self.assertEqual(catalog.index_of("P4102"), 1)
+
+    def test_renaming_the_first_of_two_duplicates(self):
+        catalog = builder.DTCCatalog([make_dtc("P4101", "First"), make_dtc("P4101", "Second")])
+        catalog.replace(0, make_dtc("P4105", "Renamed"))
+        self.assertEqual(catalog.get("P4101")["title"], "Second")
+        self.assertEqual(catalog.index_of("P4105"), 0)
+
+    def test_editing_the_second_of_two_duplicates(self):
+        catalog = builder.DTCCatalog([make_dtc("P4101", "First"), make_dtc("P4101", "Second")])
+        catalog.replace(1, make_dtc("P4101", "Second edited"))
+        self.assertEqual(catalog.get("P4101")["title"], "First")
+
+
+class SessionCatalogTests(CatalogTestCase):
+    def test_add_and_replace_go_through_to_the_file(self):
+        self.write_catalog([make_dtc("P4101", "A")])
+        catalog = builder.get_catalog(quiet=True)
+        builder.add_dtc(make_dtc("P4102", "B"), quiet=True)
+        builder.replace_dtc(catalog.dtcs, 0, make_dtc("P4101", "A2"), quiet=True)
+        self.assertEqual(builder.next_free_code("P", "x41xx"), "P4100")
+        self.assertEqual([(dtc["code"], dtc["title"]) for dtc in self.read_catalog()], [("P4101", "A2"), ("P4102", "B")])
+
+
+if __name__ == "__main__":
+    unittest.main()
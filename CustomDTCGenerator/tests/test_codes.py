@@ -0,0 +1,111 @@
+import random
+import unittest
+
+from support import builder, make_dtc
+
+import dtc_codes
+
+
+def block(numbers, header="P", digit="1"):
+    return [f"{header}4{digit}{number:02d}" for number in numbers]
+
+
+class CodeAllocatorTests(unittest.TestCase):
+    def test_parse_code(self):
+        self.assertEqual(dtc_codes.parse_code("p4107"), ("P", "x41xx", 7))
+        for code in ("P0301", "X4101", "P4801", "P41001", "P41", None):
+            with self.subTest(code=code):
+                self.assertIsNone(dtc_codes.parse_code(code))
+
+    def test_next_free_is_the_lowest_gap(self):
+        allocator = dtc_codes.CodeAllocator(block([0, 1, 2, 4, 5]) + ["P0301"])
+        self.assertEqual(allocator.next_free("P", "x41xx"), "P4103")
+        self.assertEqual(allocator.next_free("B", "x41xx"), "B4100")
+        self.assertEqual(allocator.outside, 1)
+
+    def test_matches_a_scan_over_random_changes(self):
+        rng = random.Random(7)
+        allocator, used = dtc_codes.CodeAllocator(), set()
+        for _ in range(2000):
+            number = rng.randrange(100)
+            code = block([number])[0]
+            if code in used:
+                allocator.release(code)
+                used.discard(code)
+            else:
+                allocator.mark(code)
+                used.add(code)
+            free = next((c for c in block(range(100)) if c not in used), None)
+            self.assertEqual(allocator.next_free("P", "x41xx"), free)
+
+    def test_duplicate_code_stays_used_until_the_last_copy_goes(self):
+        allocator = dtc_codes.CodeAllocator(["P4100", "P4100"])
+        allocator.release("P4100")
+        self.assertTrue(allocator.used("P4100"))
+        self.assertEqual(allocator.next_free("P", "x41xx"), "P4101")
+        allocator.release("P4100")
+        self.assertFalse(allocator.used("P4100"))
+        self.assertEqual(allocator.next_free("P", "x41xx"), "P4100")
+        allocator.release("P4100")  # releasing a free code changes nothing
+        self.assertEqual(allocator.next_free("P", "x41xx"), "P4100")
+
+    def test_full_block(self):
+        allocator = dtc_codes.CodeAllocator(block(range(99)))
+        self.assertEqual(allocator.allocate("P", "x41xx"), "P4199")
+        self.assertIsNone(allocator.next_free("P", "x41xx"))
+        with self.assertRaises(ValueError):
+            allocator.allocate("P", "x41xx")
+
+    def test_reserve(self):
+        allocator = dtc_codes.CodeAllocator(block([0, 2, 3, 5]))
+        self.assertEqual(allocator.reserve("P", "x41xx", 3), block([1, 4, 6]))
+        self.assertEqual(allocator.reserve("P", "x41xx", 3, contiguous=True), block([7, 8, 9]))
+        allocator = dtc_codes.CodeAllocator(block([0, 2, 3, 5]))
+        self.assertEqual(allocator.reserve("P", "x41xx", 2, contiguous=True), block([6, 7]))
+        self.assertEqual(allocator.reserve("P", "x41xx", 0), [])
+
+    def test_reserve_that_does_not_fit_reserves_nothing(self):
+        allocator = dtc_codes.CodeAllocator(block(range(0, 100, 2)))
+        with self.assertRaises(ValueError):
+            allocator.reserve("P", "x41xx", 2, contiguous=True)
+        with self.assertRaises(ValueError):
+            allocator.reserve("P", "x41xx", 51)
+        self.assertEqual(allocator.next_free("P", "x41xx"), "P4101")
+
+    def test_fill(self):
+        report = dtc_codes.CodeAllocator(block([0, 1]) + block([0], "U", "7")).fill()
+        self.assertEqual(len(report), len(builder.HEADERS) * len(builder.CATEGORIES))
+        self.assertIn(("P", "x41xx", 2, "P4102"), report)
+        self.assertIn(("U", "x47xx", 1, "U4701"), report)
+        self.assertIn(("B", "x40xx", 0, "B4000"), report)
+
+
+class NormalizeTests(unittest.TestCase):
+    def apply(self, dtcs):
+        renames = dtc_codes.normalize_codes(dtcs)
+        for i, old, new in renames:
+            # Applied in order, a rename never takes a code another entry still has
+            self.assertNotIn(new, [dtc["code"] for dtc in dtcs])
+            dtcs[i] = dict(dtcs[i], code=new)
+        return [dtc["code"] for dtc in dtcs]
+
+    def test_canonical_codes_are_kept(self):
+        dtcs = [make_dtc("P4101"), make_dtc("B4205", header="Body", category="Body Control Modules")]
+        self.assertEqual(dtc_codes.normalize_codes(dtcs), [])
+
+    def test_moves_codes_into_their_block(self):
+        dtcs = [make_dtc("P0301"), make_dtc("B4107"), make_dtc("P4101")]
+        self.assertEqual(self.apply(dtcs), ["P4100", "P4107", "P4101"])
+
+    def test_renames_around_codes_still_held(self):
+        # The first entry's number (01) is taken by the second, which is itself moving
+        dtcs = [make_dtc("B4101"), make_dtc("P4101", header="Body")]
+        self.assertEqual(self.apply(dtcs), ["P4100", "B4101"])
+
+    def test_duplicates_get_new_codes(self):
+        self.assertEqual(self.apply([make_dtc("P4101"), make_dtc("P4101"), make_dtc("P4101")]),
+                         ["P4101", "P4100", "P4102"])
+
+
+if __name__ == "__main__":
+    unittest.main()
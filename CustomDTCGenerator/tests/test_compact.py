@@ -0,0 +1,98 @@
+import json
+import random
+import unittest
+
+from support import make_dtc
+
+import dtc_bench
+import dtc_compact
+
+
+def odd_entries():
+    # Entries the columns can't hold exactly
+    return [
+        dict(reversed(list(make_dtc("P4190", "Keys in another order").items()))),
+        dict(make_dtc("P4191", "Extra key"), notes="kept"),
+        {"code": 4192, "header": "Powertrain"},
+        dict(make_dtc("P4193"), possible_fixes=["ok", 5]),
+        dict(make_dtc("P4194"), title=None),
+        "not an object",
+    ]
+
+
+class CompactDTCsTests(unittest.TestCase):
+    def setUp(self):
+        self.dtcs = list(dtc_bench.iter_synthetic(300, seed=2))
+        self.dtcs[10:10] = odd_entries()
+        self.dtcs.append(make_dtc("C4101", header="Chassis", category="A category of our own"))
+        self.table = dtc_compact.CompactDTCs(self.dtcs)
+
+    def check(self):
+        self.assertEqual(len(self.table), len(self.dtcs))
+        self.assertEqual(self.table.to_list(), self.dtcs)
+        self.assertEqual(json.dumps(list(self.table)), json.dumps(self.dtcs))
+
+    def test_round_trip(self):
+        self.check()
+        self.assertEqual(set(self.table._odd), set(range(10, 16)))
+
+    def test_entries_are_copies(self):
+        self.table[0]["possible_fixes"].append("Changed")
+        self.table[11]["notes"] = "changed"
+        self.check()
+
+    def test_indexing_and_slices(self):
+        self.assertEqual(self.table[-1], self.dtcs[-1])
+        self.assertEqual(self.table[5:20:3], self.dtcs[5:20:3])
+        self.assertEqual(self.table[::-50], self.dtcs[::-50])
+        for index in (len(self.dtcs), -len(self.dtcs) - 1):
+            with self.assertRaises(IndexError):
+                self.table[index]
+
+    def test_single_fields_match_the_entries(self):
+        for i in range(-len(self.dtcs), len(self.dtcs)):
+            dtc = self.dtcs[i]
+            fields = [dtc.get(field) if isinstance(dtc, dict) else None for field in ("code", "header", "category")]
+            self.assertEqual([self.table.code(i), self.table.header(i), self.table.category(i)], fields, i)
+        for accessor in (self.table.code, self.table.header, self.table.category):
+            with self.assertRaises(IndexError):
+                accessor(len(self.dtcs))
+
+    def test_changes_match_a_list(self):
+        rng = random.Random(5)
+        extra = list(dtc_bench.iter_synthetic(400, seed=3))[300:] + odd_entries()
+        for step in range(300):
+            op = rng.choice(["append", "set", "delete"])
+            dtc = rng.choice(extra)
+            if op == "append":
+                self.table.append(dtc)
+                self.dtcs.append(dtc)
+            elif op == "set":
+                index = rng.randrange(-len(self.dtcs), len(self.dtcs))
+                self.table[index] = dtc
+                self.dtcs[index] = dtc
+            else:
+                index = rng.randrange(-len(self.dtcs), len(self.dtcs))
+                del self.table[index]
+                del self.dtcs[index]
+        self.table.extend(extra[:5])
+        self.dtcs.extend(extra[:5])
+        self.check()
+        self.assertEqual([self.table.code(i) for i in range(len(self.dtcs))],
+                         [dtc.get("code") if isinstance(dtc, dict) else None for dtc in self.dtcs])
+
+    def test_replacing_an_odd_entry_with_a_plain_one(self):
+        self.table[12] = make_dtc("P4192", fixes=["A", "B", "C"])
+        self.dtcs[12] = make_dtc("P4192", fixes=["A", "B", "C"])
+        self.assertNotIn(12, self.table._odd)
+        self.check()
+
+    def test_empty_table(self):
+        table = dtc_compact.CompactDTCs()
+        self.assertEqual(table.to_list(), [])
+        table.append(make_dtc("P4101"))
+        self.assertEqual(table.to_list(), [make_dtc("P4101")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from support import make_dtc
+
+import dtc_bench
+import dtc_compile
+import dtc_table
+
+
+def synthetic(count):
+    return list(dtc_bench.iter_synthetic(count, seed=1))
+
+
+class PackCodeTests(unittest.TestCase):
+    def test_every_packed_value_round_trips(self):
+        for value in range(0x10000):
+            self.assertEqual(dtc_table.pack_code(dtc_table.unpack_code(value)), value)
+
+    def test_examples(self):
+        self.assertEqual(dtc_table.pack_code("P4101"), 0x0101)
+        self.assertEqual(dtc_table.pack_code(" u7fff "), 0xFFFF)
+        self.assertEqual(dtc_table.unpack_code(0x8A3C), "B4A3C")
+
+    def test_codes_that_do_not_pack(self):
+        for code in ("P0301", "P8101", "X4101", "P410", "P41011", "P41G1", ""):
+            with self.subTest(code=code):
+                with self.assertRaises(ValueError):
+                    dtc_table.pack_code(code)
+
+
+class CompileTests(unittest.TestCase):
+    def round_trip(self, dtcs, perfect_hash=True):
+        table = dtc_compile.compile_table(dtcs, perfect_hash)
+        return table, dtc_table.DTCTable(dtc_compile.table_bytes(table))
+
+    def test_round_trip(self):
+        dtcs = synthetic(dtc_bench.MAX_SYNTHETIC)
+        table, loaded = self.round_trip(dtcs)
+        self.assertEqual(table["skipped"], [])
+        self.assertEqual(list(loaded), sorted(dtcs, key=lambda dtc: dtc_table.pack_code(dtc["code"])))
+        # The .bin file is the C source's flash data behind a header
+        self.assertEqual(len(loaded.data), dtc_table.HEADER_FORMAT.size + dtc_compile.flash_size(table))
+
+    def test_perfect_hash_agrees_with_binary_search(self):
+        for count in (0, 1, 5, 1000):
+            with self.subTest(count=count):
+                _, loaded = self.round_trip(synthetic(count))
+                self.assertTrue(loaded.flags & dtc_table.TABLE_FLAG_HASH)
+                for value in range(0x10000):
+                    self.assertEqual(loaded.hash_index_of(value), loaded.index_of(value))
+
+    def test_perfect_hash_has_no_collisions(self):
+        keys = [dtc_table.pack_code(dtc["code"]) for dtc in synthetic(2000)]
+        seeds, slots = dtc_compile.build_perfect_hash(keys)
+        placed = [i for i in slots if i != dtc_table.HASH_EMPTY]
+        self.assertEqual(sorted(placed), list(range(len(keys))))
+        for i, key in enumerate(keys):
+            seed = seeds[dtc_table.table_hash(key, 0) % len(seeds)]
+            self.assertEqual(slots[dtc_table.table_hash(key, seed) % len(slots)], i)
+
+    def test_without_hash(self):
+        dtcs = synthetic(50)
+        _, loaded = self.round_trip(dtcs, perfect_hash=False)
+        self.assertFalse(loaded.flags & dtc_table.TABLE_FLAG_HASH)
+        self.assertEqual(loaded.find(dtcs[7]["code"]), dtcs[7])
+        self.assertIsNone(loaded.find("P4799"))
+
+    def test_skips_codes_it_cannot_compile(self):
+        dtcs = [make_dtc("P4101", "First"), make_dtc("P0301"), make_dtc("P4101", "Second"),
+                make_dtc("P4102", fixes=["Fix"] * 256), make_dtc("P4103", category="Made up")]
+        table, loaded = self.round_trip(dtcs)
+        self.assertEqual([code for code, _ in table["skipped"]], ["P0301", "P4101", "P4102"])
+        self.assertEqual(loaded.find("P4101")["title"], "First")
+        self.assertEqual(loaded.find("P4103")["category"], "Made up")
+        self.assertEqual(len(loaded), 2)
+
+    def test_rejects_broken_tables(self):
+        data = dtc_compile.table_bytes(dtc_compile.compile_table(synthetic(10)))
+        for broken in (b"XXXX" + data[4:], data[:-1], data + b"\0"):
+            with self.assertRaises(ValueError):
+                dtc_table.DTCTable(broken)
+
+
+C_LOOKUP = r"""
+#include <stdio.h>
+#include "dtc_table.h"
+
+int main(void)
+{
+    for (unsigned code = 0; code < 0x10000u; code++) {
+        const dtc_entry_t *hashed = dtc_find((uint16_t)code);
+        const dtc_entry_t *sorted = dtc_find_sorted((uint16_t)code);
+        if (hashed != sorted) {
+            return 1;
+        }
+        if (hashed) {
+            printf("%04X %s\n", code, DTC_STRING(hashed->title));
+        }
+    }
+    return 0;
+}
+"""
+
+
+@unittest.skipUnless(shutil.which("cc"), "needs a C compiler")
+class CSourceTests(unittest.TestCase):
+    def test_c_lookups_match_the_table(self):
+        dtcs = synthetic(300) + [make_dtc("P4399", 'Quote " and \\ and °C')]
+        with tempfile.TemporaryDirectory(prefix="dtc_test_") as tmp:
+            dtc_compile.write_compiled(dtcs, tmp, source_name="test.json")
+            with open(os.path.join(tmp, "main.c"), "w") as f:
+                f.write(C_LOOKUP)
+            program = os.path.join(tmp, "lookup")
+            subprocess.run(["cc", "-std=c99", "-Wall", "-Werror", "-o", program,
+                            os.path.join(tmp, "main.c"), os.path.join(tmp, "dtc_table.c")], check=True)
+            output = subprocess.run([program], capture_output=True, check=True).stdout.decode("utf-8")
+            loaded = dtc_table.DTCTable(os.path.join(tmp, "dtc_table.bin"))
+        expected = "".join(f"{code:04X} {loaded.entry(i)['title']}\n" for i, code in enumerate(loaded.codes))
+        self.assertEqual(output, expected)
+        self.assertEqual(len(loaded), len(dtcs))
+
+
+if __name__ == "__main__":
+    unittest.main()
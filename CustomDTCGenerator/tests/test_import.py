@@ -0,0 +1,160 @@
+import gzip
+import io
+import json
+import unittest
+
+from support import CatalogTestCase, make_dtc
+
+import dtc_import
+
+
+def parse(text, block_chars):
+    return list(dtc_import.iter_json_array(io.StringIO(text), block_chars))
+
+
+class JSONArrayParserTests(unittest.TestCase):
+    def test_every_block_size_gives_the_same_elements(self):
+        elements = [
+            {"code": "P4101", "title": "Brackets ] [ and , in text", "n": 2.5e-3},
+            {"code": "P4102", "description": "Escapes \" \\ °C 🚗", "possible_fixes": ["a", "b"]},
+            [], {}, 12345, -0.5, 1e10, True, None, "text", [[1, [2]], {"a": {"b": []}}],
+        ]
+        text = json.dumps(elements, indent=2, ensure_ascii=False)
+        for block_chars in range(1, 40):
+            with self.subTest(block_chars=block_chars):
+                self.assertEqual(parse(text, block_chars), elements)
+        self.assertEqual(parse(text, 1 << 20), elements)
+
+    def test_numbers_split_across_blocks(self):
+        # "12" then "345" must not come out as 12
+        for block_chars in range(1, 8):
+            with self.subTest(block_chars=block_chars):
+                self.assertEqual(parse("[12345, 6.75e2,7]", block_chars), [12345, 675.0, 7])
+
+    def test_empty_arrays_and_whitespace(self):
+        for text in ("[]", " \n[ \t]\n"):
+            self.assertEqual(parse(text, 2), [])
+        self.assertEqual(parse('\n [ 1 ,\n 2 ] \n', 3), [1, 2])
+
+    def test_elements_come_one_at_a_time(self):
+        reader = io.StringIO('[{"a": 1}, {"b": 2}, oops]')
+        elements = dtc_import.iter_json_array(reader, 4)
+        self.assertEqual(next(elements), {"a": 1})
+        self.assertEqual(next(elements), {"b": 2})
+        with self.assertRaisesRegex(ValueError, "Array element 3"):
+            next(elements)
+
+    def test_broken_arrays(self):
+        cases = [
+            ('{"code": "P4101"}', "Expected a JSON array"),
+            ("[1 2]", "Expected ',' or ']'"),
+            ('[{"code": "P4101"}', "ends before its closing"),
+            ('[{"code": "P41', "Array element 1"),
+            ("[1,]", "Array element 2"),
+            ("", "ends before its closing"),
+        ]
+        for text, message in cases:
+            for block_chars in (1, 5, 1 << 20):
+                with self.subTest(text=text, block_chars=block_chars):
+                    with self.assertRaisesRegex(ValueError, message):
+                        parse(text, block_chars)
+
+
+class ReaderTests(unittest.TestCase):
+    def test_csv_guesses_the_delimiter(self):
+        for delimiter in (",", ";", "\t"):
+            text = delimiter.join(["code", "title"]) + "\n" + delimiter.join(["P4101", '"A, B; C"']) + "\n\n"
+            with self.subTest(delimiter=delimiter):
+                self.assertEqual(list(dtc_import.iter_csv(io.StringIO(text))), [{"code": "P4101", "title": "A, B; C"}])
+        self.assertEqual(list(dtc_import.iter_csv(io.StringIO(""))), [])
+
+    def test_jsonl_reports_the_line(self):
+        rows = dtc_import.iter_jsonl(io.StringIO('{"code": "P4101"}\n\n{oops}\n'))
+        self.assertEqual(next(rows), {"code": "P4101"})
+        with self.assertRaisesRegex(ValueError, "Line 3"):
+            next(rows)
+
+    def test_guess_format(self):
+        self.assertEqual(dtc_import.guess_format("codes.TSV"), "csv")
+        self.assertEqual(dtc_import.guess_format("codes.ndjson.gz"), "jsonl")
+        self.assertEqual(dtc_import.guess_format("codes.json"), "json")
+        with self.assertRaises(ValueError):
+            dtc_import.guess_format("codes.xml")
+
+
+class ColumnMapTests(unittest.TestCase):
+    def test_maps_aliases_and_fills_in_from_the_code(self):
+        dtc = dtc_import.ColumnMap().to_dtc({"DTC": " b4201 ", "Short Text": "Door", "Fixes": "One | Two\nThree|"})
+        self.assertEqual(dtc, {"code": "B4201", "header": "Body", "category": "Body Control Modules", "title": "Door",
+                               "description": "", "possible_fixes": ["One", "Two", "Three"], "pinpoint_test": ""})
+
+    def test_explicit_columns_and_category(self):
+        column_map = dtc_import.ColumnMap({"title": "Name"}, category="x41xx")
+        dtc = column_map.to_dtc({"code": "P0301", "Name": "Misfire", "title": "ignored"})
+        self.assertEqual((dtc["title"], dtc["category"]), ("Misfire", "Sensor Networks"))
+
+    def test_rejected_rows(self):
+        cases = [
+            (["P4101"], "Not an object"),
+            ({"title": "No code"}, "No code"),
+            ({"code": "X4101"}, "Unknown header 'X'"),
+            ({"code": "P4101", "category": "Nowhere"}, "Unknown category"),
+            ({"code": "P0301"}, "pass --category"),
+        ]
+        for row, message in cases:
+            with self.subTest(row=row):
+                with self.assertRaisesRegex(ValueError, message):
+                    dtc_import.ColumnMap().to_dtc(row)
+        with self.assertRaises(ValueError):
+            dtc_import.ColumnMap({"colour": "Colour"})
+
+
+class ImportFileTests(CatalogTestCase):
+    STORAGE = "journal"
+
+    def setUp(self):
+        super().setUp()
+        self.write_catalog([make_dtc("P4101", "Old"), make_dtc("P4102", "Same")])
+
+    def write_rows(self, rows, name="rows.json.gz"):
+        path = self.write_file(name, "")
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(rows, f)
+        return path
+
+    def test_adds_skips_and_replaces(self):
+        path = self.write_rows([make_dtc("P4101", "New"), make_dtc("P4102", "Same"), {"code": "P4103"},
+                                {"code": "P4104"}, {"code": "P4103"}, {"title": "No code"}])
+        batches = []
+        report = dtc_import.import_file(path, on_existing="replace", batch_size=2,
+                                        progress=lambda report: batches.append(report["added"]))
+        self.assertEqual({key: report[key] for key in ("rows", "added", "unchanged", "changed", "replaced", "rejected")},
+                         {"rows": 6, "added": 2, "unchanged": 2, "changed": 1, "replaced": 1, "rejected": 1})
+        self.assertEqual(report["changed_codes"], ["P4101"])
+        self.assertEqual(report["rejections"], [{"row": 6, "message": "No code"}])
+        self.assertEqual(batches, [1, 2])
+        catalog = self.read_catalog()
+        self.assertEqual([(dtc["code"], dtc["title"]) for dtc in catalog],
+                         [("P4101", "New"), ("P4102", "Same"), ("P4103", ""), ("P4104", "")])
+
+    def test_dry_run_and_skip(self):
+        path = self.write_rows([make_dtc("P4101", "New"), {"code": "P4103"}])
+        report = dtc_import.import_file(path, dry_run=True)
+        self.assertEqual((report["added"], report["changed"], report["replaced"]), (1, 1, 0))
+        self.assertEqual([dtc["code"] for dtc in self.read_catalog()], ["P4101", "P4102"])
+        # Without --replace the changed P4101 is left as it is
+        dtc_import.import_file(path)
+        self.assertEqual([(dtc["code"], dtc["title"]) for dtc in self.read_catalog()],
+                         [("P4101", "Old"), ("P4102", "Same"), ("P4103", "")])
+
+
+class ImportFileSQLiteTests(ImportFileTests):
+    STORAGE = "sqlite"
+
+
+class ImportFileJSONTests(ImportFileTests):
+    STORAGE = "json"
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import contextlib
+import io
+import json
+import unittest
+
+from support import CatalogTestCase, builder, make_dtc
+
+import dtc_storage
+
+
+class JournalStoreTests(CatalogTestCase):
+    STORAGE = "journal"
+
+    def setUp(self):
+        super().setUp()
+        self.write_catalog([make_dtc("P4101", "A"), make_dtc("P4102", "B")])
+        self.store = dtc_storage.JournalStore(self.path)
+
+    def journal_lines(self):
+        with open(self.store.journal_path, "r", encoding="utf-8") as f:
+            return f.read().splitlines()
+
+    def test_replays_changes_over_the_snapshot(self):
+        self.store.append_many([
+            {"op": "append", "dtc": make_dtc("P4103", "C")},
+            {"op": "set", "index": 0, "dtc": make_dtc("P4101", "A2")},
+            {"op": "delete", "index": 1},
+        ])
+        self.assertEqual([(dtc["code"], dtc["title"]) for dtc in dtc_storage.JournalStore(self.path).load()],
+                         [("P4101", "A2"), ("P4103", "C")])
+        # Changes go to the journal, the snapshot is untouched until compaction
+        self.assertEqual(len(self.journal_lines()), 4)
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.assertEqual(len(json.load(f)), 2)
+
+    def test_torn_last_record_is_dropped(self):
+        self.store.append({"op": "delete", "index": 0})
+        with open(self.store.journal_path, "a", encoding="utf-8") as f:
+            f.write('{"op": "append", "dtc": {"co')
+        store = dtc_storage.JournalStore(self.path)
+        self.assertEqual([dtc["code"] for dtc in store.load()], ["P4102"])
+        # The next append starts on a clean line after cutting the torn one off
+        store.append({"op": "append", "dtc": make_dtc("P4104")})
+        self.assertEqual([dtc["code"] for dtc in dtc_storage.JournalStore(self.path).load()], ["P4102", "P4104"])
+
+    def test_journal_for_another_snapshot_is_ignored(self):
+        self.store.append({"op": "delete", "index": 0})
+        self.write_catalog([make_dtc("P4109", "Replaced by hand")])
+        self.assertEqual([dtc["code"] for dtc in dtc_storage.JournalStore(self.path).load()], ["P4109"])
+
+    def test_compact_folds_the_journal_into_the_snapshot(self):
+        self.store.append_many([{"op": "append", "dtc": make_dtc("P4103")}, {"op": "delete", "index": 0}])
+        before = self.store.load()
+        self.store.compact()
+        self.assertEqual(len(self.journal_lines()), 1)
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.assertEqual(json.load(f), before)
+        self.assertEqual(dtc_storage.JournalStore(self.path).load(), before)
+
+    def test_compacted_since_follows_only_own_compactions(self):
+        self.store.append({"op": "append", "dtc": make_dtc("P4103")})
+        version = self.store.signature()
+        self.store.compact()
+        self.store.compact()
+        self.assertEqual(self.store.compacted_since(version), self.store.signature())
+        dtc_storage.JournalStore(self.path).append({"op": "delete", "index": 0})
+        self.assertIsNone(self.store.compacted_since(version))
+        self.assertIsNone(self.store.compacted_since(self.store.signature()))
+
+
+class JournalSessionTests(CatalogTestCase):
+    STORAGE = "journal"
+
+    def setUp(self):
+        super().setUp()
+        self.write_catalog([make_dtc("P4101", "A"), make_dtc("P4102", "B")])
+        self.catalog = builder.get_catalog(quiet=True)
+
+    def add(self, code):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            builder.add_dtc(make_dtc(code), quiet=True)
+        return output.getvalue()
+
+    def test_merges_someone_elses_changes(self):
+        dtc_storage.JournalStore(self.path).append({"op": "set", "index": 1, "dtc": make_dtc("P4102", "Theirs")})
+        self.assertIn("Merged in changes", self.add("P4103"))
+        catalog = {dtc["code"]: dtc["title"] for dtc in self.read_catalog()}
+        self.assertEqual(catalog, {"P4101": "A", "P4102": "Theirs", "P4103": ""})
+
+    def test_own_compaction_is_not_someone_elses_save(self):
+        self.assertEqual(self.add("P4103"), "")
+        builder.get_store().compact()
+        self.assertEqual(self.add("P4104"), "")
+        self.assertEqual([dtc["code"] for dtc in self.read_catalog()], ["P4101", "P4102", "P4103", "P4104"])
+
+    def test_conflicting_edit_fails_without_saving(self):
+        dtc_storage.JournalStore(self.path).append({"op": "set", "index": 0, "dtc": make_dtc("P4101", "Theirs")})
+        index = self.catalog.index_of("P4101")
+        with self.assertRaises(dtc_storage.ConflictError):
+            builder.replace_dtc(self.catalog.dtcs, index, make_dtc("P4101", "Mine"), quiet=True)
+        self.assertEqual(self.read_catalog()[0]["title"], "Theirs")
+
+
+if __name__ == "__main__":
+    unittest.main()
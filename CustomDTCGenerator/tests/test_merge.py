@@ -0,0 +1,133 @@
+import unittest
+
+from support import make_dtc
+
+import dtc_diff
+import dtc_storage
+
+
+def codes(dtcs):
+    return [dtc["code"] for dtc in dtcs]
+
+
+class MergeCatalogsTests(unittest.TestCase):
+    def setUp(self):
+        self.base = [make_dtc("P4101", "A"), make_dtc("P4102", "B"), make_dtc("P4103", "C")]
+        self.calls = []
+
+    def resolve(self, code, ours, theirs):
+        self.calls.append(code)
+        return ours
+
+    def merge(self, ours, theirs):
+        return dtc_storage.merge_catalogs(self.base, ours, theirs, self.resolve)
+
+    def test_takes_the_side_that_changed(self):
+        ours = [self.base[0], make_dtc("P4102", "B ours"), self.base[2]]
+        theirs = [make_dtc("P4101", "A theirs"), self.base[1], self.base[2]]
+        merged = self.merge(ours, theirs)
+        self.assertEqual([dtc["title"] for dtc in merged], ["A theirs", "B ours", "C"])
+        self.assertEqual(self.calls, [])
+
+    def test_both_sides_made_the_same_change(self):
+        same = make_dtc("P4101", "Same")
+        merged = self.merge([same, *self.base[1:]], [dict(same), *self.base[1:]])
+        self.assertEqual(merged[0]["title"], "Same")
+        self.assertEqual(self.calls, [])
+
+    def test_deletes_and_adds_from_either_side(self):
+        ours = [self.base[0], self.base[2], make_dtc("P4105", "Ours new")]
+        theirs = [make_dtc("P4104", "Theirs new"), self.base[0], self.base[1]]
+        merged = self.merge(ours, theirs)
+        # Disk order first, new entries of ours at the end
+        self.assertEqual(codes(merged), ["P4104", "P4101", "P4105"])
+
+    def test_resolve_only_for_real_conflicts(self):
+        ours = [make_dtc("P4101", "Ours"), *self.base[1:]]
+        theirs = [make_dtc("P4101", "Theirs"), *self.base[1:]]
+        merged = self.merge(ours, theirs)
+        self.assertEqual(self.calls, ["P4101"])
+        self.assertEqual(merged[0]["title"], "Ours")
+
+    def test_resolve_none_deletes(self):
+        ours = [make_dtc("P4101", "Ours"), *self.base[1:]]
+        theirs = self.base[1:]
+        merged = dtc_storage.merge_catalogs(self.base, ours, theirs, lambda code, o, t: None)
+        self.assertEqual(codes(merged), ["P4102", "P4103"])
+
+    def test_duplicates_on_disk_are_left_alone(self):
+        theirs = [*self.base, make_dtc("P4101", "Duplicate")]
+        merged = self.merge(self.base, theirs)
+        self.assertEqual(codes(merged), ["P4101", "P4102", "P4103", "P4101"])
+        self.assertEqual(merged[3]["title"], "Duplicate")
+
+
+class Merge3Tests(unittest.TestCase):
+    def setUp(self):
+        self.base = [make_dtc("P4101", "Title", fixes=["One", "Two"], pinpoint="PP-1")]
+
+    def edited(self, **fields):
+        return [dict(self.base[0], **fields)]
+
+    def test_combines_fields_changed_on_one_side_each(self):
+        merged, conflicts = dtc_diff.merge3(self.base, self.edited(title="Ours"), self.edited(pinpoint_test="PP-2"))
+        self.assertEqual(conflicts, [])
+        self.assertEqual((merged[0]["title"], merged[0]["pinpoint_test"]), ("Ours", "PP-2"))
+
+    def test_merges_fix_lists(self):
+        ours = self.edited(possible_fixes=["One", "Two", "Ours"])
+        theirs = self.edited(possible_fixes=["Two", "Theirs"])
+        merged, conflicts = dtc_diff.merge3(self.base, ours, theirs)
+        self.assertEqual(conflicts, [])
+        self.assertEqual(merged[0]["possible_fixes"], ["Two", "Ours", "Theirs"])
+
+    def test_field_conflict_keeps_ours_by_default(self):
+        merged, conflicts = dtc_diff.merge3(self.base, self.edited(title="Ours", description="D"),
+                                            self.edited(title="Theirs"))
+        self.assertEqual(merged[0]["title"], "Ours")
+        self.assertEqual(merged[0]["description"], "D")
+        self.assertEqual(conflicts, [{"code": "P4101", "field": "title", "base": "Title", "ours": "Ours",
+                                      "theirs": "Theirs", "kept": "ours"}])
+
+    def test_resolver_can_pick_theirs(self):
+        asked = []
+
+        def resolve(code, ours, theirs):
+            asked.append(code)
+            return "T"
+        merged, conflicts = dtc_diff.merge3(self.base, self.edited(title="Ours", description="D"),
+                                            self.edited(title="Theirs"), resolve)
+        self.assertEqual(asked, ["P4101"])
+        # Only the clashing field comes from theirs, ours' other change stays
+        self.assertEqual((merged[0]["title"], merged[0]["description"]), ("Theirs", "D"))
+        self.assertEqual(conflicts[0]["kept"], "theirs")
+
+    def test_delete_against_edit_is_a_conflict(self):
+        merged, conflicts = dtc_diff.merge3(self.base, [], self.edited(title="Theirs"))
+        self.assertEqual(merged, [])
+        self.assertEqual((conflicts[0]["field"], conflicts[0]["ours"], conflicts[0]["kept"]), (None, None, "ours"))
+        merged, _ = dtc_diff.merge3(self.base, [], self.edited(title="Theirs"), lambda code, o, t: "T")
+        self.assertEqual(merged[0]["title"], "Theirs")
+
+
+class DiffTests(unittest.TestCase):
+    def test_diff_catalogs(self):
+        old = [make_dtc("P4101", "A", fixes=["One", "One"]), make_dtc("P4102", "B"), make_dtc("P4103", "C")]
+        new = [make_dtc("P4101", "A2", fixes=["One", "Two"]), make_dtc("P4103", "C"), make_dtc("P4104", "D"),
+               make_dtc("P4104", "D again")]
+        changes = dtc_diff.diff_catalogs(old, new)
+        self.assertEqual(codes(changes["added"]), ["P4104"])
+        self.assertEqual(codes(changes["removed"]), ["P4102"])
+        self.assertEqual(changes["unchanged"], 1)
+        self.assertEqual(changes["duplicates"], ["P4104"])
+        change = changes["changed"][0]
+        self.assertEqual(sorted(change["fields"]), ["possible_fixes", "title"])
+        self.assertEqual(change["fixes"], {"added": ["Two"], "removed": ["One"]})
+
+    def test_entry_hash_ignores_key_order(self):
+        dtc = make_dtc("P4101", "A")
+        self.assertEqual(dtc_diff.entry_hash(dtc), dtc_diff.entry_hash(dict(reversed(list(dtc.items())))))
+
+
+if __name__ == "__main__":
+    unittest.main()
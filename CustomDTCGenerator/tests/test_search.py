@@ -0,0 +1,85 @@
+import unittest
+
+from support import make_dtc
+
+import dtc_search
+
+
+def dtc(code, title="", description="", fixes=(), pinpoint=""):
+    return dict(make_dtc(code, title, fixes=fixes, pinpoint=pinpoint), description=description)
+
+
+class SearchIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.index = dtc_search.SearchIndex()
+        self.index.build([
+            ("title", dtc("P4101", "Oxygen sensor heater circuit")),
+            ("description", dtc("P4102", "Throttle position", description="Reads the oxygen sensor")),
+            ("fix", dtc("P4103", "Fuel pump", fixes=["Check oxygen sensor wiring"])),
+            ("other", dtc("B4201", "Door lock actuator", description="Wiring to the door module")),
+        ])
+
+    def ids(self, query, limit=25):
+        return [doc_id for doc_id, _ in self.index.search(query, limit)]
+
+    def test_ranks_by_field_weight(self):
+        self.assertEqual(self.ids("oxygen"), ["title", "fix", "description"])
+        self.assertEqual(self.ids("oxygen", limit=1), ["title"])
+
+    def test_code_match_ranks_first(self):
+        self.index.add("mention", dtc("P4104", "Replaces p4101"))
+        self.assertEqual(self.ids("P4101"), ["title", "mention"])
+
+    def test_rarer_word_counts_more(self):
+        index = dtc_search.SearchIndex()
+        index.build([("rare", dtc("C4101", "Common rare")), ("common", dtc("C4102", "Common common2")),
+                     ("common3", dtc("C4103", "Common"))])
+        self.assertEqual([doc_id for doc_id, _ in index.search("common rare")], ["rare"])
+        self.assertGreater(index.search("rare")[0][1], index.search("common")[0][1])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.ids("oxygen wiring"), ["fix"])
+        self.assertEqual(self.ids("oxygen door"), [])
+        self.assertEqual(self.ids(""), [])
+        self.assertEqual(self.ids("?!"), [])
+
+    def test_prefix_match(self):
+        self.assertEqual(set(self.ids("sens")), {"title", "description", "fix"})
+        self.assertEqual(self.ids("act"), ["other"])
+        # One letter is too short to expand
+        self.assertEqual(self.ids("o"), [])
+
+    def test_exact_beats_prefix(self):
+        index = dtc_search.SearchIndex()
+        index.build([("prefix", dtc("C4101", "Sensors")), ("exact", dtc("C4102", "Sensor"))])
+        self.assertEqual([doc_id for doc_id, _ in index.search("sensor")], ["exact", "prefix"])
+
+    def test_one_typo(self):
+        self.assertEqual(self.ids("wirng"), ["fix", "other"])     # deleted letter
+        self.assertEqual(self.ids("oxygem"), ["title", "fix", "description"])  # swapped letter
+        self.assertEqual(self.ids("doorr"), ["other"])            # extra letter
+        self.assertEqual(self.ids("oxgyem"), [])                   # two edits
+
+    def test_fuzzy_only_when_nothing_else_matches(self):
+        index = dtc_search.SearchIndex()
+        index.build([("exact", dtc("C4101", "Relay")), ("typo", dtc("C4102", "Delay"))])
+        self.assertEqual([doc_id for doc_id, _ in index.search("relay")], ["exact"])
+
+    def test_short_words_are_not_fuzzy(self):
+        self.assertEqual(self.ids("dor"), [])
+
+    def test_update_and_remove(self):
+        self.ids("sens")  # builds the prefix vocabulary, which must follow the changes
+        self.index.update("title", dtc("P4101", "Coolant temperature"))
+        self.assertEqual(self.ids("oxygen"), ["fix", "description"])
+        self.assertEqual(self.ids("coola"), ["title"])
+        self.index.remove("other")
+        self.assertNotIn("other", self.index)
+        self.assertEqual(self.ids("door"), [])
+        self.assertEqual(self.ids("wirng"), ["fix"])
+        self.assertEqual(len(self.index), 3)
+        self.index.remove("other")  # removing twice is fine
+
+
+if __name__ == "__main__":
+    unittest.main()
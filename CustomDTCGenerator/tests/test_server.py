@@ -0,0 +1,71 @@
+import asyncio
+import contextlib
+import io
+import json
+import os
+import unittest
+import urllib.error
+import urllib.request
+
+from support import CatalogTestCase, builder, make_dtc
+
+import dtc_server
+
+
+class ServerTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dtcs = [make_dtc("P4101", "A", fixes=["Fix"]), make_dtc("B4201", "B", header="Body",
+                                                                      category="Body Control Modules")]
+        self.write_catalog(self.dtcs)
+        cwd = os.getcwd()
+        os.chdir(self.dir)  # server_exports and the render cache go in the test folder
+        self.addCleanup(os.chdir, cwd)
+
+    def serve(self, client):
+        # Runs client(get) against a server on a free port, get(path, headers) -> (status, headers, body)
+        async def main():
+            server = dtc_server.DTCServer(workers=1)
+            listener = await server.start(port=0)
+            port = listener.sockets[0].getsockname()[1]
+
+            def get(path, headers=None):
+                request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", headers=headers or {})
+                try:
+                    with urllib.request.urlopen(request) as response:
+                        return response.status, response.headers, response.read()
+                except urllib.error.HTTPError as e:
+                    return e.code, e.headers, e.read()
+            try:
+                return await asyncio.get_running_loop().run_in_executor(None, client, get)
+            finally:
+                listener.close()
+                server.close()
+        with contextlib.redirect_stdout(io.StringIO()):
+            return asyncio.run(main())
+
+    def test_lookups_and_etags(self):
+        def client(get):
+            status, headers, body = get("/dtc/p4101")
+            self.assertEqual((status, json.loads(body)), (200, self.dtcs[0]))
+            self.assertEqual(get("/dtc/P4101", {"If-None-Match": headers["ETag"]})[0], 304)
+            self.assertEqual(get("/dtc/P4199")[0], 404)
+            listing = json.loads(get("/dtcs?header=Body")[2])
+            self.assertEqual([dtc["code"] for dtc in listing["dtcs"]], ["B4201"])
+            self.assertEqual(get("/dtcs?category=nowhere")[0], 400)
+            self.assertEqual(json.loads(get("/search?q=fix")[2])["results"][0]["code"], "P4101")
+        self.serve(client)
+
+    def test_export_renders_the_snapshot_being_served(self):
+        def client(get):
+            # Changed on disk but not reloaded yet: the export must match what /dtc serves
+            self.write_catalog(self.dtcs + [make_dtc("P4102", "Not loaded yet")])
+            status, headers, body = get("/export?format=jsonl&project=Test")
+            self.assertEqual(status, 200)
+            self.assertIn('filename="', headers["Content-Disposition"])
+            return [json.loads(line)["code"] for line in body.decode("utf-8").splitlines()]
+        self.assertEqual(self.serve(client), ["B4201", "P4101"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import random
+import unittest
+
+from support import CatalogTestCase, builder, make_dtc
+
+import dtc_storage
+
+
+class SQLiteStoreTests(CatalogTestCase):
+    STORAGE = "sqlite"
+
+    def setUp(self):
+        super().setUp()
+        self.db = os.path.join(self.dir, "custom_dtcs.db")
+        self.store = self.open_store()
+        self.dtcs = [make_dtc(f"P41{i:02d}", f"T{i}") for i in range(10)]
+        self.store.replace_all(self.dtcs)
+
+    def open_store(self):
+        store = dtc_storage.SQLiteStore(self.db, builder.dtc_sort_key)
+        self.addCleanup(store.close)
+        return store
+
+    def test_changes_by_position_match_a_list(self):
+        # Deletes leave gaps in the row ids, positions must still land on the right rows
+        rng = random.Random(3)
+        expected = list(self.dtcs)
+        for step in range(200):
+            op = rng.choice(["append", "set", "delete"] if expected else ["append"])
+            if op == "append":
+                dtc = make_dtc(f"B42{step % 100:02d}", f"Added {step}")
+                record = {"op": "append", "dtc": dtc}
+                expected.append(dtc)
+            elif op == "set":
+                index = rng.randrange(len(expected))
+                dtc = dict(expected[index], title=f"Set {step}")
+                record = {"op": "set", "index": index, "dtc": dtc}
+                expected[index] = dtc
+            else:
+                index = rng.randrange(len(expected))
+                record = {"op": "delete", "index": index}
+                del expected[index]
+            self.store.apply(record)
+        self.assertEqual(self.store.load(), expected)
+        self.assertEqual(self.open_store().load(), expected)
+
+    def test_batch_with_runs_of_appends(self):
+        self.store.apply_many([
+            {"op": "delete", "index": 0},
+            {"op": "append", "dtc": make_dtc("C4101")},
+            {"op": "append", "dtc": make_dtc("C4102")},
+            {"op": "set", "index": 9, "dtc": make_dtc("C4103")},
+            {"op": "delete", "index": 1},
+        ])
+        self.assertEqual([dtc["code"] for dtc in self.store.load()],
+                         [f"P41{i:02d}" for i in (1, 3, 4, 5, 6, 7, 8, 9)] + ["C4103", "C4102"])
+
+    def test_another_connection_moves_the_positions(self):
+        self.store.apply({"op": "set", "index": 0, "dtc": make_dtc("P4100", "Mine")})
+        other = self.open_store()
+        other.apply({"op": "delete", "index": 0})
+        self.store.apply({"op": "set", "index": 0, "dtc": make_dtc("P4101", "Mine")})
+        self.assertEqual([(dtc["code"], dtc["title"]) for dtc in self.store.load()[:2]],
+                         [("P4101", "Mine"), ("P4102", "T2")])
+
+    def test_failed_batch_changes_nothing(self):
+        with self.assertRaises(IndexError):
+            self.store.apply_many([{"op": "delete", "index": 0}, {"op": "append", "dtc": make_dtc("C4101")},
+                                   {"op": "set", "index": 50, "dtc": make_dtc("C4102")}])
+        self.assertEqual(self.store.load(), self.dtcs)
+        # The position array was rolled back with the table
+        self.store.apply({"op": "delete", "index": 0})
+        self.assertEqual(self.store.load(), self.dtcs[1:])
+
+    def test_unknown_operation(self):
+        with self.assertRaises(ValueError):
+            self.store.apply({"op": "rename", "index": 0})
+        self.assertEqual(self.store.load(), self.dtcs)
+
+    def test_replace_all_resets_positions(self):
+        self.store.apply({"op": "delete", "index": 0})
+        self.store.replace_all(self.dtcs[5:])
+        self.store.apply({"op": "delete", "index": 0})
+        self.assertEqual(self.store.load(), self.dtcs[6:])
+
+    def test_sorted_and_lazy_reads(self):
+        self.store.apply({"op": "append", "dtc": make_dtc("B4101", header="Body")})
+        self.assertEqual(self.store.load_sorted(), sorted(self.store.load(), key=builder.dtc_sort_key))
+        self.assertEqual(list(self.store.iter_sorted(batch_size=4)), self.store.load_sorted())
+        lazy = self.store.lazy_list(page_size=3)
+        self.assertEqual(len(lazy), 11)
+        self.assertEqual(lazy[-1]["code"], "B4101")
+        self.assertEqual([dtc["code"] for dtc in lazy[2:5]], ["P4102", "P4103", "P4104"])
+        self.assertEqual(list(lazy), self.store.load())
+
+
+if __name__ == "__main__":
+    unittest.main()